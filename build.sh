@@ -40,4 +40,10 @@ END
 echo "Setting poster paths..."
 python manage.py set_poster_paths
 
+echo "Building poster thumbnails..."
+python manage.py generate_thumbnails
+
+echo "Computing fallback rankings..."
+python manage.py compute_fallback_rankings
+
 echo "Build complete!"
@@ -2,30 +2,314 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <sys/stat.h>
 #include "movie.h"
 #include "user.h"
 #include "hash_table.h"
 #include "graph.h"
 #include "recommendation.h"
 #include "file_io.h"
+#include "snapshot.h"
 
-// Print recommendations in JSON format for Django to parse
-void print_recommendations_json(RecommendationList* rec_list, HashTable* movie_table) {
+#define MOVIES_FILE "movies.csv"
+#define USERS_FILE "users.csv"
+#define RATINGS_FILE "ratings.csv"
+#define NEIGHBOURS_FILE "neighbours.csv"
+#define RATINGS_SNAPSHOT_FILE "ratings.bin"
+#define DATA_FILE_COUNT 5
+#define MAX_REQUEST_LINE 4096
+
+// Everything loaded from the CSV files, kept together so serve mode can reload it
+typedef struct EngineData {
+    HashTable* movie_table;
+    HashTable* user_table;
+    Graph* graph;
+    HashTable* neighbour_table;
+    int has_neighbours;
+    RatingsSnapshot* snapshot;  // ratings come from here instead of graph when set
+    long long mtimes[DATA_FILE_COUNT];
+    long long sizes[DATA_FILE_COUNT];
+} EngineData;
+
+static const char* DATA_FILES[DATA_FILE_COUNT] = {MOVIES_FILE, USERS_FILE, RATINGS_FILE, NEIGHBOURS_FILE,
+                                                  RATINGS_SNAPSHOT_FILE};
+
+// Write a string as a JSON string literal, escaping quotes and control characters
+void print_json_string(const char* str) {
+    putchar('"');
+    for (const char* p = str; *p; p++) {
+        if (*p == '"' || *p == '\\') {
+            putchar('\\');
+            putchar(*p);
+        } else if ((unsigned char)*p < 0x20) {
+            printf("\\u%04x", (unsigned char)*p);
+        } else {
+            putchar(*p);
+        }
+    }
+    putchar('"');
+}
+
+// Print recommendations as a JSON array (no trailing newline)
+void write_recommendations_json(RecommendationList* rec_list, HashTable* movie_table) {
     printf("[");
-    for (int i = 0; i < rec_list->count; i++) {
+    int printed = 0;
+    for (int i = 0; rec_list != NULL && i < rec_list->count; i++) {
         Movie* movie = (Movie*)hash_search(movie_table, rec_list->movies[i].movie_id);
         if (movie != NULL) {
-            if (i > 0) printf(",");
-            printf("{\"movie_id\":%d,\"title\":\"%s\",\"genre\":\"%s\",\"year\":%d,\"predicted_rating\":%.2f,\"reason\":\"%s\"}",
-                   movie->movie_id,
-                   movie->title,
-                   movie->genre,
-                   movie->year,
-                   rec_list->movies[i].predicted_rating,
-                   rec_list->movies[i].reason);
+            if (printed > 0) printf(",");
+            printf("{\"movie_id\":%d,\"title\":", movie->movie_id);
+            print_json_string(movie->title);
+            printf(",\"genre\":");
+            print_json_string(movie->genre);
+            printf(",\"year\":%d,\"predicted_rating\":%.2f,\"reason\":",
+                   movie->year, rec_list->movies[i].predicted_rating);
+            print_json_string(rec_list->movies[i].reason);
+            printf("}");
+            printed++;
         }
     }
-    printf("]\n");
+    printf("]");
+}
+
+// Print recommendations in JSON format for Django to parse
+void print_recommendations_json(RecommendationList* rec_list, HashTable* movie_table) {
+    write_recommendations_json(rec_list, movie_table);
+    printf("\n");
+}
+
+// Modification time (nanoseconds where available) and size of a file, or -1
+static void file_stamp(const char* filename, long long* mtime, long long* size) {
+    struct stat st;
+    *mtime = -1;
+    *size = -1;
+    if (stat(filename, &st) != 0) return;
+#ifdef __linux__
+    *mtime = (long long)st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec;
+#else
+    *mtime = (long long)st.st_mtime;
+#endif
+    *size = (long long)st.st_size;
+}
+
+static void record_file_stamps(EngineData* data) {
+    for (int i = 0; i < DATA_FILE_COUNT; i++) {
+        file_stamp(DATA_FILES[i], &data->mtimes[i], &data->sizes[i]);
+    }
+}
+
+// True when any CSV file was rewritten since it was loaded
+static int data_files_changed(EngineData* data) {
+    for (int i = 0; i < DATA_FILE_COUNT; i++) {
+        long long mtime, size;
+        file_stamp(DATA_FILES[i], &mtime, &size);
+        if (mtime != data->mtimes[i] || size != data->sizes[i]) return 1;
+    }
+    return 0;
+}
+
+void load_engine_data(EngineData* data) {
+    data->movie_table = create_hash_table();
+    data->user_table = create_hash_table();
+    data->graph = create_graph();
+    data->neighbour_table = create_hash_table();
+
+    record_file_stamps(data);
+    load_movies(MOVIES_FILE, data->movie_table);
+    load_users(USERS_FILE, data->user_table);
+    // A current snapshot replaces parsing ratings.csv into the graph
+    data->snapshot = open_snapshot(RATINGS_SNAPSHOT_FILE, RATINGS_FILE);
+    if (data->snapshot == NULL) {
+        load_ratings(RATINGS_FILE, data->graph, data->movie_table, data->user_table);
+    }
+    data->has_neighbours = load_neighbours(NEIGHBOURS_FILE, data->neighbour_table);
+}
+
+// Use the precomputed neighbour lists when they were loaded
+RecommendationList* recommend(EngineData* data, int user_id, int count) {
+    if (data->snapshot != NULL) {
+        return generate_recommendations_from_snapshot(data->snapshot, data->user_table,
+                                                      data->has_neighbours ? data->neighbour_table : NULL,
+                                                      user_id, count);
+    }
+    if (data->has_neighbours) {
+        return generate_recommendations_from_store(data->graph, data->neighbour_table, user_id, count);
+    }
+    return generate_recommendations(data->graph, data->user_table, data->movie_table, user_id, count);
+}
+
+// Free hash table entries together with the Movie/User records they own
+static void free_table_with_data(HashTable* table) {
+    for (int i = 0; i < HASH_SIZE; i++) {
+        HashNode* current = table->buckets[i];
+        while (current != NULL) {
+            free(current->data);
+            current = current->next;
+        }
+    }
+    free_hash_table(table);
+}
+
+void free_engine_data(EngineData* data) {
+    free_graph(data->graph);
+    close_snapshot(data->snapshot);
+    free_similarities(data->neighbour_table);
+    free_table_with_data(data->movie_table);
+    free_table_with_data(data->user_table);
+}
+
+// Batch output: one {"user_id":..,"recommendations":[..]} object per line
+void recommend_one_json_line(EngineData* data, int user_id, int count) {
+    RecommendationList* rec_list = recommend(data, user_id, count);
+    printf("{\"user_id\":%d,\"recommendations\":", user_id);
+    write_recommendations_json(rec_list, data->movie_table);
+    printf("}\n");
+    free_recommendations(rec_list);
+}
+
+// Returns NULL on success, or an error message
+const char* apply_rating(EngineData* data, int user_id, int movie_id, float rating) {
+    if (rating < 1.0 || rating > 5.0) {
+        return "Invalid rating. Must be between 1.0 and 5.0";
+    }
+
+    User* user = (User*)hash_search(data->user_table, user_id);
+    Movie* movie = (Movie*)hash_search(data->movie_table, movie_id);
+
+    if (user == NULL || movie == NULL) {
+        return "User or movie not found";
+    }
+
+    if (data->snapshot != NULL) {
+        // The mapping is read-only and now out of date: switch to the CSV graph
+        save_rating(RATINGS_FILE, user_id, movie_id, rating);
+        close_snapshot(data->snapshot);
+        data->snapshot = NULL;
+        load_ratings(RATINGS_FILE, data->graph, data->movie_table, data->user_table);
+        return NULL;
+    }
+
+    add_edge(data->graph, user_id, movie_id, rating);
+    user->ratings_count++;
+    user->avg_rating_given = (user->avg_rating_given * (user->ratings_count - 1) + rating) / user->ratings_count;
+    movie->rating_count++;
+    movie->avg_rating = (movie->avg_rating * (movie->rating_count - 1) + rating) / movie->rating_count;
+
+    save_rating(RATINGS_FILE, user_id, movie_id, rating);
+    return NULL;
+}
+
+// Find the raw value that follows "key": in a flat JSON object
+static const char* json_find_value(const char* line, const char* key) {
+    char pattern[64];
+    snprintf(pattern, sizeof(pattern), "\"%s\"", key);
+    const char* pos = strstr(line, pattern);
+    if (pos == NULL) return NULL;
+    pos += strlen(pattern);
+    while (*pos == ' ' || *pos == '\t') pos++;
+    if (*pos != ':') return NULL;
+    pos++;
+    while (*pos == ' ' || *pos == '\t') pos++;
+    return pos;
+}
+
+static int json_get_string(const char* line, const char* key, char* out, size_t out_size) {
+    const char* pos = json_find_value(line, key);
+    if (pos == NULL || *pos != '"') return 0;
+    pos++;
+    size_t len = 0;
+    while (*pos && *pos != '"' && len < out_size - 1) {
+        out[len++] = *pos++;
+    }
+    out[len] = '\0';
+    return 1;
+}
+
+static int json_get_number(const char* line, const char* key, double* out) {
+    const char* pos = json_find_value(line, key);
+    if (pos == NULL) return 0;
+    char* end;
+    *out = strtod(pos, &end);
+    return end != pos;
+}
+
+static void print_error_response(long request_id, const char* message) {
+    printf("{\"id\":%ld,\"status\":\"error\",\"error\":", request_id);
+    print_json_string(message);
+    printf("}\n");
+}
+
+// Long-lived mode: answer one JSON request per stdin line until EOF or "quit".
+// Data is loaded once and reloaded only when the CSV files change on disk.
+int serve(void) {
+    EngineData data;
+    load_engine_data(&data);
+
+    char line[MAX_REQUEST_LINE];
+    while (fgets(line, sizeof(line), stdin) != NULL) {
+        char cmd[32] = "";
+        double value;
+        long request_id = 0;
+
+        if (json_get_number(line, "id", &value)) request_id = (long)value;
+
+        if (!json_get_string(line, "cmd", cmd, sizeof(cmd))) {
+            print_error_response(request_id, "Missing cmd");
+            fflush(stdout);
+            continue;
+        }
+
+        if (strcmp(cmd, "quit") == 0) {
+            printf("{\"id\":%ld,\"status\":\"ok\"}\n", request_id);
+            fflush(stdout);
+            break;
+        }
+
+        if (strcmp(cmd, "reload") == 0 || data_files_changed(&data)) {
+            free_engine_data(&data);
+            load_engine_data(&data);
+        }
+
+        if (strcmp(cmd, "ping") == 0 || strcmp(cmd, "reload") == 0) {
+            printf("{\"id\":%ld,\"status\":\"ok\"}\n", request_id);
+
+        } else if (strcmp(cmd, "recommend") == 0) {
+            double user_id, count;
+            if (!json_get_number(line, "user_id", &user_id) || !json_get_number(line, "count", &count)) {
+                print_error_response(request_id, "Usage: recommend requires user_id and count");
+            } else {
+                RecommendationList* rec_list = recommend(&data, (int)user_id, (int)count);
+                printf("{\"id\":%ld,\"status\":\"ok\",\"result\":", request_id);
+                write_recommendations_json(rec_list, data.movie_table);
+                printf("}\n");
+                free_recommendations(rec_list);
+            }
+
+        } else if (strcmp(cmd, "add_rating") == 0) {
+            double user_id, movie_id, rating;
+            if (!json_get_number(line, "user_id", &user_id) ||
+                !json_get_number(line, "movie_id", &movie_id) ||
+                !json_get_number(line, "rating", &rating)) {
+                print_error_response(request_id, "Usage: add_rating requires user_id, movie_id and rating");
+            } else {
+                const char* error = apply_rating(&data, (int)user_id, (int)movie_id, (float)rating);
+                if (error != NULL) {
+                    print_error_response(request_id, error);
+                } else {
+                    // Our own append should not trigger a full reload
+                    record_file_stamps(&data);
+                    printf("{\"id\":%ld,\"status\":\"success\"}\n", request_id);
+                }
+            }
+
+        } else {
+            print_error_response(request_id, "Unknown command");
+        }
+        fflush(stdout);
+    }
+
+    free_engine_data(&data);
+    return 0;
 }
 
 int main(int argc, char* argv[]) {
@@ -34,73 +318,76 @@ int main(int argc, char* argv[]) {
         fprintf(stderr, "Commands:\n");
         fprintf(stderr, "  recommend <user_id> <count> - Get recommendations for user\n");
         fprintf(stderr, "  add_rating <user_id> <movie_id> <rating> - Add a rating\n");
+        fprintf(stderr, "  recommend_batch <count> [user_id ...] - Recommendations for many users (ids from stdin if none given)\n");
+        fprintf(stderr, "  serve - Stay resident and answer JSON requests on stdin\n");
         return 1;
     }
-    
-    HashTable* movie_table = create_hash_table();
-    HashTable* user_table = create_hash_table();
-    Graph* graph = create_graph();
-    
+
+    if (strcmp(argv[1], "serve") == 0) {
+        return serve();
+    }
+
+    EngineData data;
+
     // Load data (suppress output by redirecting to /dev/null or just remove prints from file_io.c)
-    load_movies("movies.csv", movie_table);
-    load_users("users.csv", user_table);
-    load_ratings("ratings.csv", graph, movie_table, user_table);
-    
+    load_engine_data(&data);
+
     if (strcmp(argv[1], "recommend") == 0) {
         if (argc < 4) {
             fprintf(stderr, "Usage: recommend <user_id> <count>\n");
             return 1;
         }
-        
+
         int user_id = atoi(argv[2]);
         int count = atoi(argv[3]);
-        
-        RecommendationList* rec_list = generate_recommendations(
-            graph, user_table, movie_table, user_id, count);
-        
-        print_recommendations_json(rec_list, movie_table);
+
+        RecommendationList* rec_list = recommend(&data, user_id, count);
+
+        print_recommendations_json(rec_list, data.movie_table);
         free_recommendations(rec_list);
-        
+
+    } else if (strcmp(argv[1], "recommend_batch") == 0) {
+        if (argc < 3) {
+            fprintf(stderr, "Usage: recommend_batch <count> [user_id ...]\n");
+            return 1;
+        }
+
+        int count = atoi(argv[2]);
+        if (argc > 3) {
+            for (int i = 3; i < argc; i++) {
+                recommend_one_json_line(&data, atoi(argv[i]), count);
+            }
+        } else {
+            int user_id;
+            while (scanf("%d", &user_id) == 1) {
+                recommend_one_json_line(&data, user_id, count);
+            }
+        }
+
     } else if (strcmp(argv[1], "add_rating") == 0) {
         if (argc < 5) {
             fprintf(stderr, "Usage: add_rating <user_id> <movie_id> <rating>\n");
             return 1;
         }
-        
+
         int user_id = atoi(argv[2]);
         int movie_id = atoi(argv[3]);
         float rating = atof(argv[4]);
-        
-        if (rating < 1.0 || rating > 5.0) {
-            fprintf(stderr, "Invalid rating. Must be between 1.0 and 5.0\n");
-            return 1;
-        }
-        
-        User* user = (User*)hash_search(user_table, user_id);
-        Movie* movie = (Movie*)hash_search(movie_table, movie_id);
-        
-        if (user == NULL || movie == NULL) {
-            fprintf(stderr, "User or movie not found\n");
+
+        const char* error = apply_rating(&data, user_id, movie_id, rating);
+        if (error != NULL) {
+            fprintf(stderr, "%s\n", error);
             return 1;
         }
-        
-        add_edge(graph, user_id, movie_id, rating);
-        user->ratings_count++;
-        user->avg_rating_given = (user->avg_rating_given * (user->ratings_count - 1) + rating) / user->ratings_count;
-        movie->rating_count++;
-        movie->avg_rating = (movie->avg_rating * (movie->rating_count - 1) + rating) / movie->rating_count;
-        
-        save_rating("ratings.csv", user_id, movie_id, rating);
+
         printf("{\"status\":\"success\"}\n");
-        
+
     } else {
         fprintf(stderr, "Unknown command: %s\n", argv[1]);
         return 1;
     }
-    
-    free_graph(graph);
-    free_hash_table(movie_table);
-    free_hash_table(user_table);
-    
+
+    free_engine_data(&data);
+
     return 0;
 }
@@ -6,11 +6,12 @@
 #include "user.h"
 #include "hash_table.h"
 #include "graph.h"
+#include "recommendation.h"
 
 void load_movies(const char* filename, HashTable* movie_table) {
     FILE* file = fopen(filename, "r");
     if (file == NULL) {
-        printf("Creating sample movies data...\n");
+        fprintf(stderr, "Creating sample movies data...\n");
         return;
     }
     
@@ -34,7 +35,7 @@ void load_movies(const char* filename, HashTable* movie_table) {
 void load_users(const char* filename, HashTable* user_table) {
     FILE* file = fopen(filename, "r");
     if (file == NULL) {
-        printf("Creating sample users data...\n");
+        fprintf(stderr, "Creating sample users data...\n");
         return;
     }
     
@@ -58,7 +59,7 @@ void load_users(const char* filename, HashTable* user_table) {
 void load_ratings(const char* filename, Graph* graph, HashTable* movie_table, HashTable* user_table) {
     FILE* file = fopen(filename, "r");
     if (file == NULL) {
-        printf("Creating sample ratings data...\n");
+        fprintf(stderr, "Creating sample ratings data...\n");
         return;
     }
     
@@ -70,6 +71,11 @@ void load_ratings(const char* filename, Graph* graph, HashTable* movie_table, Ha
         float rating;
         
         if (sscanf(line, "%d,%d,%f", &user_id, &movie_id, &rating) == 3) {
+            // A negative rating is a tombstone appended for a deleted rating
+            if (rating < 0) {
+                remove_edge(graph, user_id, movie_id);
+                continue;
+            }
             add_edge(graph, user_id, movie_id, rating);
             
             User* user = (User*)hash_search(user_table, user_id);
@@ -92,6 +98,36 @@ void load_ratings(const char* filename, Graph* graph, HashTable* movie_table, Ha
     // printf("Ratings loaded successfully.\n");  // Commented for JSON output
 }
 
+// Load the precomputed top-K neighbour lists (user_id,neighbour_id,similarity,
+// one row per directed edge). A neighbour_id of -1 marks a list appended
+// after the export: the user's earlier rows are dropped and the rows that
+// follow replace them. Returns 0 when the file does not exist.
+int load_neighbours(const char* filename, HashTable* similarity_table) {
+    FILE* file = fopen(filename, "r");
+    if (file == NULL) {
+        return 0;
+    }
+    
+    char line[200];
+    fgets(line, sizeof(line), file);
+    
+    while (fgets(line, sizeof(line), file)) {
+        int user_id, neighbour_id;
+        float similarity;
+        
+        if (sscanf(line, "%d,%d,%f", &user_id, &neighbour_id, &similarity) == 3) {
+            if (neighbour_id < 0) {
+                clear_similarities(similarity_table, user_id);
+            } else {
+                add_similarity(similarity_table, user_id, neighbour_id, similarity);
+            }
+        }
+    }
+    
+    fclose(file);
+    return 1;
+}
+
 void save_rating(const char* filename, int user_id, int movie_id, float rating) {
     FILE* file = fopen(filename, "a");
     if (file == NULL) {
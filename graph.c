@@ -32,10 +32,19 @@ void add_edge(Graph* graph, int user_id, int movie_id, float rating) {
         movie_node = (GraphNode*)hash_search(graph->nodes, movie_id);
     }
     
+    // A repeated pair (a re-rating appended to ratings.csv) updates both
+    // edges. Edges are matched on type too: a user and a movie with the same
+    // id share one node.
     EdgeNode* existing = user_node->edges;
     while (existing != NULL) {
-        if (existing->target_id == movie_id) {
+        if (existing->target_id == movie_id && existing->target_type == 'M') {
             existing->rating = rating;
+            for (EdgeNode* reverse = movie_node->edges; reverse != NULL; reverse = reverse->next) {
+                if (reverse->target_id == user_id && reverse->target_type == 'U') {
+                    reverse->rating = rating;
+                    break;
+                }
+            }
             return;
         }
         existing = existing->next;
@@ -67,7 +76,7 @@ void remove_edge(Graph* graph, int user_id, int movie_id) {
     EdgeNode* current = user_node->edges;
     EdgeNode* prev = NULL;
     while (current != NULL) {
-        if (current->target_id == movie_id) {
+        if (current->target_id == movie_id && current->target_type == 'M') {
             if (prev == NULL) {
                 user_node->edges = current->next;
             } else {
@@ -84,7 +93,7 @@ void remove_edge(Graph* graph, int user_id, int movie_id) {
     current = movie_node->edges;
     prev = NULL;
     while (current != NULL) {
-        if (current->target_id == user_id) {
+        if (current->target_id == user_id && current->target_type == 'U') {
             if (prev == NULL) {
                 movie_node->edges = current->next;
             } else {
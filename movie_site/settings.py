@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'movies.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -66,7 +67,8 @@ ROOT_URLCONF = 'movie_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that records render time for movies.metrics
+        'BACKEND': 'movies.metrics.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -159,11 +161,117 @@ if USE_S3:
     # Media files storage
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
+# TMDB poster fetching (`manage.py fetch_posters`); point the bases at a
+# local stub server to test without the real API
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY', '')
+TMDB_API_BASE = os.environ.get('TMDB_API_BASE', 'https://api.themoviedb.org/3')
+TMDB_IMAGE_BASE = os.environ.get('TMDB_IMAGE_BASE', 'https://image.tmdb.org/t/p/w500')
+# TMDB allows about 40 requests per 10 seconds
+TMDB_REQUESTS_PER_SECOND = float(os.environ.get('TMDB_REQUESTS_PER_SECOND', '4'))
+POSTER_FETCH_WORKERS = int(os.environ.get('POSTER_FETCH_WORKERS', '8'))
+# Search cache and resume checkpoint
+POSTER_CACHE_DIR = Path(os.environ.get('POSTER_CACHE_DIR', BASE_DIR / '.cache' / 'posters'))
+# Build missing poster thumbnails while rendering a page. Off by default: a
+# grid of new posters would be resized inside one request. Thumbnails are
+# built on poster save, after fetch_posters / set_poster_paths and by
+# `manage.py generate_thumbnails`; until then pages use the original.
+POSTER_THUMBNAILS_ON_DEMAND = os.environ.get('POSTER_THUMBNAILS_ON_DEMAND', 'False') == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Recommendation backend: 'c' (c_interface binary), 'python' (NumPy/SciPy, in-process),
+# 'sharded' (the 'python' algorithm split over worker processes),
+# 'item' (item-item, from the index built by `manage.py compute_item_similarities`)
+# or 'mf' (matrix factorization, from the model saved by `manage.py train_model`)
+RECOMMENDATION_BACKEND = os.environ.get('RECOMMENDATION_BACKEND', 'c')
+
+# 'sharded' backend: user shards, each in its own worker process (0 = one per CPU).
+# Every web process starts its own set of shards.
+RECOMMENDATION_SHARDS = int(os.environ.get('RECOMMENDATION_SHARDS', '0'))
+
+# Python engine: compare only against the candidate neighbours proposed by the
+# LSH index (`manage.py build_ann_index`) instead of scanning every user.
+# More bits: fewer candidates, lower recall; more tables or probes: the reverse.
+# Users are hashed by their 'mf' factors (needs `manage.py train_model`) or raw 'ratings'.
+RECOMMENDATION_ANN_INDEX = os.environ.get('RECOMMENDATION_ANN_INDEX', 'False') == 'True'
+ANN_INDEX_PATH = Path(os.environ.get('ANN_INDEX_PATH', BASE_DIR / 'ann_index.npz'))
+ANN_VECTORS = os.environ.get('ANN_VECTORS', 'mf')
+ANN_BITS = int(os.environ.get('ANN_BITS', '12'))
+ANN_TABLES = int(os.environ.get('ANN_TABLES', '8'))
+ANN_PROBES = int(os.environ.get('ANN_PROBES', '2'))
+
+# Item-item index: each movie keeps its N most similar movies, counting only
+# pairs rated by at least ITEM_MIN_CORATERS common users
+ITEM_NEIGHBOURS_K = int(os.environ.get('ITEM_NEIGHBOURS_K', '20'))
+ITEM_MIN_CORATERS = int(os.environ.get('ITEM_MIN_CORATERS', '3'))
+
+# Matrix factorization (`manage.py train_model`): versioned .npz models in MF_MODEL_DIR
+MF_MODEL_DIR = Path(os.environ.get('MF_MODEL_DIR', BASE_DIR / 'mf_models'))
+MF_FACTORS = int(os.environ.get('MF_FACTORS', '32'))
+MF_REGULARIZATION = float(os.environ.get('MF_REGULARIZATION', '0.1'))
+MF_ITERATIONS = int(os.environ.get('MF_ITERATIONS', '15'))
+
+# Fallback rankings (`manage.py compute_fallback_rankings`) for users the engines
+# have no signal for: top N movies per scope, Bayesian-averaged with a prior
+# worth FALLBACK_PRIOR_RATINGS ratings at the scope's mean
+FALLBACK_RANKING_SIZE = int(os.environ.get('FALLBACK_RANKING_SIZE', '50'))
+FALLBACK_PRIOR_RATINGS = float(os.environ.get('FALLBACK_PRIOR_RATINGS', '10'))
+
+# Read neighbours from the precomputed similarity store (build it with
+# `manage.py compute_similarities`) instead of comparing against every user
+RECOMMENDATION_SIMILARITY_STORE = os.environ.get('RECOMMENDATION_SIMILARITY_STORE', 'False') == 'True'
+# Each user keeps at most K neighbours with similarity above the minimum
+RECOMMENDATION_NEIGHBOURS_K = int(os.environ.get('RECOMMENDATION_NEIGHBOURS_K', '50'))
+RECOMMENDATION_MIN_SIMILARITY = float(os.environ.get('RECOMMENDATION_MIN_SIMILARITY', '0.3'))
+
+# Recommendation cache: per-user entries, evicted LRU past MAX_ENTRIES or after TIMEOUT
+RECOMMENDATION_CACHE_ENABLED = os.environ.get('RECOMMENDATION_CACHE_ENABLED', 'True') == 'True'
+RECOMMENDATION_CACHE_ALIAS = 'recommendations'
+# Also drop entries of users whose neighbour list holds or now admits the
+# rater (needs RECOMMENDATION_SIMILARITY_STORE; otherwise they expire by TIMEOUT)
+RECOMMENDATION_CACHE_INVALIDATE_NEIGHBOURS = os.environ.get('RECOMMENDATION_CACHE_INVALIDATE_NEIGHBOURS', 'False') == 'True'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recommendations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recommendations',
+        'TIMEOUT': int(os.environ.get('RECOMMENDATION_CACHE_TTL', '3600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RECOMMENDATION_CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+}
+
+# C recommendation engine
+# 'subprocess' runs c_interface once per call; 'daemon' keeps a pool of
+# resident `c_interface serve` processes that reload only when the CSVs change
+C_ENGINE_MODE = os.environ.get('C_ENGINE_MODE', 'subprocess')
+C_ENGINE_POOL_SIZE = int(os.environ.get('C_ENGINE_POOL_SIZE', '2'))
+C_ENGINE_TIMEOUT = float(os.environ.get('C_ENGINE_TIMEOUT', '30'))
+C_ENGINE_HEALTH_CHECK_INTERVAL = float(os.environ.get('C_ENGINE_HEALTH_CHECK_INTERVAL', '60'))
+# Keep ratings.bin (a memory-mapped compiled ratings.csv) current: built by
+# full syncs and rebuilt in the background after incremental ones; the engine
+# falls back to parsing the CSV while the snapshot is stale
+C_ENGINE_RATINGS_SNAPSHOT = os.environ.get('C_ENGINE_RATINGS_SNAPSHOT', 'False') == 'True'
+
+# Rating submissions: with async ingestion the view only queues the rating
+# and `manage.py process_ratings` applies queued ratings in batches
+RATING_INGESTION_ASYNC = os.environ.get('RATING_INGESTION_ASYNC', 'False') == 'True'
+
+# Per-request stage timing, served at /metrics to staff and to scrapers that
+# send `Authorization: Bearer <METRICS_TOKEN>`. METRICS_ALLOWED_IPS matches
+# REMOTE_ADDR, so only list addresses when no reverse proxy sits in front
+# (behind one every request comes from the proxy's address).
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
 # Authentication
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
@@ -15,10 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib.auth import views as auth_views
 from django.conf import settings
 from django.conf.urls.static import static
+from movies.thumbnails import serve_thumbnail
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +28,10 @@ urlpatterns = [
     path('', include('movies.urls')),
 ]
 
+# Fingerprinted thumbnails, with far-future cache headers
+if not settings.USE_S3:
+    urlpatterns.append(re_path(rf"^{settings.MEDIA_URL.lstrip('/')}thumbs/(?P<path>.*)$", serve_thumbnail))
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
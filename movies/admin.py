@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Movie, UserProfile, Rating
+from . import thumbnails
 
 
 @admin.register(Movie)
@@ -12,7 +13,7 @@ class MovieAdmin(admin.ModelAdmin):
     
     def poster_preview(self, obj):
         if obj.poster:
-            return format_html('<img src="{}" width="50" height="75" />', obj.poster.url)
+            return format_html('<img src="{}" width="50" height="75" loading="lazy" />', thumbnails.url(obj, 'small'))
         return "No poster"
     poster_preview.short_description = 'Poster'
 
@@ -0,0 +1,66 @@
+"""
+Rating aggregates on Movie and UserProfile
+Each rating change adjusts a running sum and count with a single UPDATE
+(O(1), no re-aggregation); recompute_all() rebuilds every row from the
+ratings table to fix any drift, e.g. after bulk writes that skip signals.
+"""
+from django.db.models import Case, When, Value, F, FloatField, Count, Sum
+from .models import Movie, UserProfile, Rating
+
+
+def adjust(model, filters, count_field, sum_field, avg_field, count_delta, sum_delta):
+    """Add deltas to one row's count/sum and recompute its average in the same UPDATE"""
+    new_count = F(count_field) + count_delta
+    new_sum = F(sum_field) + sum_delta
+    model.objects.filter(**filters).update(**{
+        count_field: new_count,
+        sum_field: new_sum,
+        avg_field: Case(
+            When(**{f'{count_field}__gt': -count_delta}, then=new_sum / new_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    })
+
+
+def rating_changed(user_id, movie_id, count_delta, sum_delta):
+    """Apply one rating's contribution (count +1/0/-1, sum delta) to its movie and rater"""
+    adjust(Movie, {'pk': movie_id}, 'rating_count', 'rating_sum', 'avg_rating', count_delta, sum_delta)
+    adjust(UserProfile, {'user_id': user_id}, 'ratings_count', 'ratings_sum', 'avg_rating_given',
+           count_delta, sum_delta)
+
+
+def recompute(model, group_field, key_field, count_field, sum_field, avg_field, batch_size=1000):
+    """
+    One grouped COUNT/SUM pass over the ratings, then bulk_update of the rows
+    whose stored aggregates differ (rows without ratings go back to 0).
+    Returns the number of rows written.
+    """
+    stats = {
+        key: (n, float(total))
+        for key, n, total in Rating.objects.order_by().values_list(group_field).annotate(
+            n=Count('id'), total=Sum('rating')
+        ).iterator(chunk_size=10000)
+    }
+    fields = [count_field, sum_field, avg_field]
+    changed = []
+    written = 0
+    rows = model.objects.order_by().values_list('pk', key_field, *fields)
+    for pk, key, count, total, average in rows.iterator(chunk_size=10000):
+        n, new_total = stats.get(key, (0, 0.0))
+        new_average = new_total / n if n else 0.0
+        if (count, total, average) != (n, new_total, new_average):
+            changed.append(model(pk=pk, **dict(zip(fields, (n, new_total, new_average)))))
+        if len(changed) >= batch_size:
+            written += model.objects.bulk_update(changed, fields)
+            changed = []
+    if changed:
+        written += model.objects.bulk_update(changed, fields)
+    return written
+
+
+def recompute_all():
+    """Rebuild every aggregate from the ratings table. Returns (movies, profiles) corrected."""
+    movies = recompute(Movie, 'movie', 'pk', 'rating_count', 'rating_sum', 'avg_rating')
+    profiles = recompute(UserProfile, 'user', 'user', 'ratings_count', 'ratings_sum', 'avg_rating_given')
+    return movies, profiles
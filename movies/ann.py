@@ -0,0 +1,297 @@
+"""
+Approximate nearest-neighbour index over users
+Random-projection LSH for cosine similarity: each of ANN_TABLES tables
+hashes a user's vector to ANN_BITS bits, one per random hyperplane (the
+sign of the projection). Users whose vectors point the same way tend to
+share a bucket, so a query only compares against the users in its own
+buckets instead of scanning everyone.
+
+Users are hashed by their factors from the matrix-factorization model
+(ANN_VECTORS = 'mf', folded in from their current ratings at build time)
+or by their raw rating rows ('ratings'). Raw rows are so sparse that two
+similar users rarely share enough movies for their projections to agree,
+so 'ratings' mostly works as a baseline for the benchmark.
+
+Recall and latency are traded with three knobs: more bits make buckets
+smaller (faster, lower recall), more tables give a neighbour more chances
+to collide (higher recall, more candidates), and probes also look in the
+buckets one bit-flip away on the bits whose projection was closest to zero.
+
+`manage.py build_ann_index` writes the index next to the CSV files
+(ANN_INDEX_PATH); `manage.py benchmark_ann_index` reports recall@K against
+the exact cosine scan. With RECOMMENDATION_ANN_INDEX the Python engine
+computes its similarity only for the candidates.
+"""
+import json
+import os
+import threading
+import time
+import numpy as np
+from django.conf import settings
+
+
+class LSHIndex:
+    """Sign-of-projection hashes of user vectors, `tables` tables of `bits` bits each"""
+
+    def __init__(self, user_ids, hyperplanes, codes, bits, tables, movie_ids=(), params=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.hyperplanes = np.asarray(hyperplanes, dtype=np.float32)  # dimensions x (tables * bits)
+        self.codes = np.asarray(codes, dtype=np.int64)  # tables x users
+        self.bits = int(bits)
+        self.tables = int(tables)
+        # Columns of 'ratings' vectors; 'mf' vectors are the model's factors
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.movie_index = {int(m): j for j, m in enumerate(self.movie_ids)}
+        self.params = params or {}
+        self.space = self.params.get('space', 'ratings')
+        # Users of each table sorted by code, so a bucket is one searchsorted range
+        self.order = np.argsort(self.codes, axis=1, kind='stable')
+        self.sorted_codes = np.take_along_axis(self.codes, self.order, axis=1)
+        self.weights = np.left_shift(np.int64(1), np.arange(self.bits, dtype=np.int64))
+        self._rows_for = None
+        self._rows = None
+
+    @classmethod
+    def build(cls, vectors, user_ids, bits=None, tables=None, seed=0, movie_ids=(), params=None,
+              chunk_size=50000):
+        """Hash every row of `vectors` (users x dimensions, sparse or dense)"""
+        bits = bits or settings.ANN_BITS
+        tables = tables or settings.ANN_TABLES
+        if not 1 <= bits <= 62:
+            raise Exception(f"ANN bits must be between 1 and 62, got {bits}")
+        rng = np.random.default_rng(seed)
+        hyperplanes = rng.standard_normal((vectors.shape[1], tables * bits)).astype(np.float32)
+        weights = np.left_shift(np.int64(1), np.arange(bits, dtype=np.int64))
+
+        codes = np.zeros((tables, vectors.shape[0]), dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            projected = np.asarray(vectors[start:start + chunk_size] @ hyperplanes)
+            signs = (projected > 0).reshape(len(projected), tables, bits)
+            codes[:, start:start + chunk_size] = (signs @ weights).T
+        params = {**(params or {}), 'seed': seed, 'built_at': time.time()}
+        return cls(user_ids, hyperplanes, codes, bits, tables, movie_ids=movie_ids, params=params)
+
+    def save(self, path):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                user_ids=self.user_ids,
+                hyperplanes=self.hyperplanes,
+                codes=self.codes,
+                movie_ids=self.movie_ids,
+                shape=np.array([self.bits, self.tables]),
+                params=np.array(json.dumps(self.params)),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            bits, tables = (int(v) for v in data['shape'])
+            return cls(
+                data['user_ids'], data['hyperplanes'], data['codes'], bits, tables,
+                movie_ids=data['movie_ids'], params=json.loads(str(data['params'])),
+            )
+
+    def query_vector(self, ratings):
+        """A {movie_id: rating} vector in the index's space, or None if it has no known movies"""
+        if self.space == 'mf':
+            from .mf import get_model
+            model = get_model()
+            if model.version != self.params.get('model_version'):
+                raise Exception(
+                    f"ANN index was built for model {self.params.get('model_version')}, "
+                    f"current is {model.version}: run manage.py build_ann_index"
+                )
+            return model.fold_in(ratings)
+        vector = np.zeros(len(self.movie_ids))
+        for movie_id, rating in ratings.items():
+            j = self.movie_index.get(movie_id)
+            if j is not None:
+                vector[j] = rating
+        return vector if vector.any() else None
+
+    def probe_codes(self, projected, probes):
+        """Each table's bucket code, then the codes one flip away on the `probes` least certain bits"""
+        codes = (projected > 0) @ self.weights
+        if not probes:
+            return codes[:, None]
+        uncertain = np.argsort(np.abs(projected), axis=1)[:, :probes]
+        flipped = codes[:, None] ^ self.weights[uncertain]
+        return np.concatenate([codes[:, None], flipped], axis=1)
+
+    def candidates(self, vector, probes=None):
+        """Indexes (into user_ids) of the users sharing a probed bucket with a query vector"""
+        probes = min(settings.ANN_PROBES if probes is None else probes, self.bits)
+        if vector is None:
+            return np.zeros(0, dtype=np.int64)
+        projected = (np.asarray(vector, dtype=np.float32) @ self.hyperplanes).reshape(self.tables, self.bits)
+        found = []
+        for table, codes in enumerate(self.probe_codes(projected, probes)):
+            starts = np.searchsorted(self.sorted_codes[table], codes, side='left')
+            stops = np.searchsorted(self.sorted_codes[table], codes, side='right')
+            found.extend(self.order[table, start:stop] for start, stop in zip(starts, stops) if stop > start)
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def candidate_user_ids(self, ratings, probes=None):
+        """c_user_ids proposed as neighbours for a {movie_id: rating} vector"""
+        return self.user_ids[self.candidates(self.query_vector(ratings), probes)]
+
+    def matrix_rows(self, matrix):
+        """RatingMatrix row of each indexed user (-1 if gone), kept per matrix"""
+        if self._rows_for is not matrix:
+            self._rows = np.array([matrix.user_index.get(int(u), -1) for u in self.user_ids], dtype=np.int64)
+            self._rows_for = matrix
+        return self._rows
+
+
+def user_vectors(matrix, space=None):
+    """
+    (users x dimensions vectors, extra LSHIndex.build arguments) for every
+    user of a RatingMatrix: their rating rows, or their factors folded into
+    the current matrix-factorization model
+    """
+    space = space or settings.ANN_VECTORS
+    if space == 'ratings':
+        return matrix.ratings, {'movie_ids': matrix.movie_ids, 'params': {'space': 'ratings'}}
+    if space == 'mf':
+        from scipy import sparse
+        from .mf import get_model, solve_side
+        model = get_model()
+        # The matrix's columns in model order; movies added since training are left out
+        columns = [(j, model.movie_index[int(m)]) for j, m in enumerate(matrix.movie_ids)
+                   if int(m) in model.movie_index]
+        select = sparse.csr_matrix(
+            (np.ones(len(columns)), ([j for j, _ in columns], [k for _, k in columns])),
+            shape=(len(matrix.movie_ids), len(model.movie_ids)),
+        )
+        residuals = (matrix.ratings @ select).tocsr()
+        residuals.data -= model.global_mean
+        vectors = solve_side(residuals, model.movie_factors, model.params['regularization'])
+        return vectors, {'params': {'space': 'mf', 'model_version': model.version}}
+    raise Exception(f"Unknown ANN vector space: {space}")
+
+
+def build_index(matrix, bits=None, tables=None, seed=0, space=None):
+    vectors, extra = user_vectors(matrix, space)
+    return LSHIndex.build(vectors, matrix.user_ids, bits=bits, tables=tables, seed=seed, **extra)
+
+
+def vector_ratings(matrix, vector):
+    """{movie_id: rating} of a dense rating row along a RatingMatrix's movie axis"""
+    cols = np.flatnonzero(vector)
+    return dict(zip(matrix.movie_ids[cols].tolist(), vector[cols].tolist()))
+
+
+def candidate_rows(index, matrix, vector, probes=None):
+    """RatingMatrix user rows the index proposes as neighbours for a rating row"""
+    rows = index.matrix_rows(matrix)[index.candidates(index.query_vector(vector_ratings(matrix, vector)), probes)]
+    return rows[rows >= 0]
+
+
+_index_cache = {'key': None, 'index': None}
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide index, reloaded when build_ann_index rewrites the file"""
+    path = settings.ANN_INDEX_PATH
+    try:
+        key = (str(path), os.stat(path).st_mtime_ns)
+    except OSError:
+        raise Exception(f'No ANN index at {path}: run manage.py build_ann_index')
+    with _index_lock:
+        if _index_cache['key'] != key:
+            _index_cache['index'] = LSHIndex.load(path)
+            _index_cache['key'] = key
+        return _index_cache['index']
+
+
+def benchmark(index, matrix, k=10, queries=200, probes=None, seed=0, count=10):
+    """
+    Measure the index on `queries` random users of a RatingMatrix:
+
+    recall_at_k: share of each user's exact top-k neighbours by the
+    engine's co-rated similarity (matrix.similarities, the full scan) still
+    found after re-ranking only the candidates with the same similarity.
+    vector_recall_at_k: the same by cosine over the index's own vectors,
+    which is what the hash tables approximate.
+    recommendation_overlap: share of the Python engine's top-`count`
+    recommendations from the full similarity scan that it still makes when
+    only the candidates are compared.
+    exact_ms / ann_ms: the engine's similarity step, full scan vs candidates.
+    """
+    from scipy import sparse
+    from .py_engine import PyRecommendationEngine
+
+    # Kept sparse: rating rows are users x movies
+    vectors = sparse.csr_matrix(user_vectors(matrix, index.space)[0])
+    norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+    directions = (sparse.diags(1.0 / np.where(norms > 0, norms, 1.0)) @ vectors).tocsr()
+    rows_of = index.matrix_rows(matrix)
+    indexed = np.zeros(len(matrix.user_ids), dtype=bool)
+    indexed[rows_of[rows_of >= 0]] = True
+
+    rng = np.random.default_rng(seed)
+    usable = np.flatnonzero((norms > 0) & indexed)
+    sample = rng.choice(usable, size=min(queries, len(usable)), replace=False)
+    engine = PyRecommendationEngine()
+
+    recalls, vector_recalls, overlaps, candidate_counts, exact_times, ann_times = [], [], [], [], [], []
+    for row in sample:
+        vector = matrix.ratings.getrow(row).toarray().ravel()
+        started = time.perf_counter()
+        sims = matrix.similarities(vector, exclude=row)
+        exact_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        rows = candidate_rows(index, matrix, vector, probes)
+        rows = rows[rows != row]
+        partial = matrix.similarities(vector, exclude=row, rows=rows)
+        ann_times.append(time.perf_counter() - started)
+        candidate_counts.append(len(rows))
+
+        # Ties at the k-th similarity count as found
+        positive = np.flatnonzero(sims > 0)
+        top = min(k, len(positive))
+        if top > 0:
+            cutoff = np.partition(sims[positive], len(positive) - top)[len(positive) - top]
+            recalls.append(min(top, int(np.sum(partial[rows] >= cutoff))) / top)
+
+        cosine = (directions @ directions[row].T).toarray().ravel()
+        cosine[~indexed] = -np.inf
+        cosine[row] = -np.inf
+        top = min(k, int(indexed.sum()) - 1)
+        if top > 0:
+            cutoff = np.partition(cosine, len(cosine) - top)[len(cosine) - top]
+            vector_recalls.append(min(top, int(np.sum(cosine[rows] >= cutoff))) / top)
+
+        expected = {j for j, _, _ in engine.recommend_from_vector(matrix, vector, count, sims=sims)}
+        if expected:
+            got = {j for j, _, _ in engine.recommend_from_vector(matrix, vector, count, sims=partial)}
+            overlaps.append(len(expected & got) / len(expected))
+
+    def mean(values, digits=4, scale=1):
+        return round(scale * float(np.mean(values)), digits) if values else None
+
+    users = len(index.user_ids)
+    mean_candidates = mean(candidate_counts, 1)
+    return {
+        'k': k,
+        'queries': len(sample),
+        'users': users,
+        'space': index.space,
+        'bits': index.bits,
+        'tables': index.tables,
+        'probes': min(settings.ANN_PROBES if probes is None else probes, index.bits),
+        'recall_at_k': mean(recalls),
+        'vector_recall_at_k': mean(vector_recalls),
+        'recommendation_overlap': mean(overlaps),
+        'mean_candidates': mean_candidates,
+        'candidate_fraction': round(mean_candidates / max(1, users), 4) if candidate_counts else None,
+        'exact_ms': mean(exact_times, 3, 1000),
+        'ann_ms': mean(ann_times, 3, 1000),
+    }
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class MoviesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movies'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search_index, sender=self)
+
+
+def install_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .search import install
+    install(connections[using])
@@ -0,0 +1,41 @@
+"""
+Recommendation backend selection
+settings.RECOMMENDATION_BACKEND picks which engine the views talk to.
+"""
+from django.conf import settings
+
+# Backends whose engine reads the CSV files kept by CSVSync
+CSV_BACKENDS = {'c'}
+
+
+def uses_csv_files():
+    """Whether the configured backend reads the CSV files, so changes must be logged for them"""
+    return settings.RECOMMENDATION_BACKEND in CSV_BACKENDS
+
+
+def get_engine(cached=True):
+    """Return an engine instance for the configured backend"""
+    backend = settings.RECOMMENDATION_BACKEND
+
+    if backend == 'c':
+        from movies.c_engine import CRecommendationEngine
+        engine = CRecommendationEngine()
+    elif backend == 'python':
+        from movies.py_engine import PyRecommendationEngine
+        engine = PyRecommendationEngine()
+    elif backend == 'sharded':
+        from movies.shard_engine import ShardedRecommendationEngine
+        engine = ShardedRecommendationEngine()
+    elif backend == 'item':
+        from movies.item_engine import ItemRecommendationEngine
+        engine = ItemRecommendationEngine()
+    elif backend == 'mf':
+        from movies.mf_engine import MFRecommendationEngine
+        engine = MFRecommendationEngine()
+    else:
+        raise Exception(f"Unknown recommendation backend: {backend}")
+
+    if cached and settings.RECOMMENDATION_CACHE_ENABLED:
+        from movies.cache import CachedRecommendationEngine
+        engine = CachedRecommendationEngine(engine)
+    return engine
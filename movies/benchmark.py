@@ -0,0 +1,252 @@
+"""
+Engine and sync micro-benchmarks
+Builds a synthetic dataset of a chosen size, times each stage repeatedly and
+reports latency percentiles and throughput. Nothing touches the real
+database or CSV files: the C engine runs in a temporary directory and
+CSVSync runs against a throwaway test database.
+"""
+import csv
+import json
+import os
+import platform
+import re
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.test.utils import override_settings
+
+STAGES = ['sync_all', 'recommend', 'recommend_snapshot', 'add_rating']
+
+
+class SyntheticDataset:
+    """Random ratings for `users` x `movies` at the given density"""
+
+    def __init__(self, users, movies, density, seed=0):
+        self.users = users
+        self.movies = movies
+        self.density = density
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        self.movie_ids = np.arange(1, movies + 1)
+        # Above every movie id, so users never share a graph node with a movie
+        self.user_ids = np.arange(movies + 1, movies + 1 + users)
+
+        per_user = max(1, min(movies, int(round(density * movies))))
+        counts = np.clip(rng.poisson(per_user, size=users), 1, movies)
+        rows, cols = [], []
+        for i, count in enumerate(counts):
+            rows.append(np.full(count, i))
+            cols.append(rng.choice(movies, size=count, replace=False))
+        self.rating_users = self.user_ids[np.concatenate(rows)]
+        self.rating_movies = self.movie_ids[np.concatenate(cols)]
+        self.rating_values = rng.integers(2, 11, size=len(self.rating_users)) / 2.0
+
+    def describe(self):
+        return {
+            'users': self.users,
+            'movies': self.movies,
+            'density': self.density,
+            'ratings': int(len(self.rating_values)),
+            'seed': self.seed,
+        }
+
+    def write_csv(self, directory):
+        """The three files c_interface reads"""
+        directory = Path(directory)
+        with open(directory / 'movies.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['movie_id', 'title', 'genre', 'year'])
+            for movie_id in self.movie_ids:
+                writer.writerow([movie_id, f'Movie {movie_id}', 'Drama', 2000])
+        with open(directory / 'users.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'name', 'age'])
+            for user_id in self.user_ids:
+                writer.writerow([user_id, f'user{user_id}', 30])
+        with open(directory / 'ratings.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'movie_id', 'rating'])
+            writer.writerows(zip(self.rating_users.tolist(), self.rating_movies.tolist(),
+                                 self.rating_values.tolist()))
+
+    def load_database(self):
+        """Bulk-insert the dataset into the current (test) database"""
+        from django.contrib.auth.models import User
+        from movies.models import Movie, UserProfile, Rating
+
+        Movie.objects.bulk_create([
+            Movie(movie_id=int(m), title=f'Movie {m}', genre='Drama', year=2000) for m in self.movie_ids
+        ], batch_size=1000)
+        users = User.objects.bulk_create([
+            User(username=f'user{u}', password='!') for u in self.user_ids
+        ], batch_size=1000)
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith='user').order_by('id'))
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, c_user_id=int(u), age=30) for user, u in zip(users, self.user_ids)
+        ], batch_size=1000)
+
+        user_pks = {int(u): user.pk for user, u in zip(users, self.user_ids)}
+        movie_pks = dict(Movie.objects.values_list('movie_id', 'pk'))
+        Rating.objects.bulk_create([
+            Rating(user_id=user_pks[u], movie_id=movie_pks[m], rating=r)
+            for u, m, r in zip(self.rating_users.tolist(), self.rating_movies.tolist(),
+                               self.rating_values.tolist())
+        ], batch_size=5000)
+
+
+def summarize(timings):
+    """Latency percentiles (ms) and throughput for one stage"""
+    samples = np.asarray(timings) * 1000.0
+    total = float(np.sum(timings))
+    return {
+        'runs': len(samples),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'mean_ms': round(float(np.mean(samples)), 3),
+        'throughput_per_s': round(len(samples) / total, 2) if total > 0 else None,
+    }
+
+
+def time_runs(func, runs, warmup=1):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_c_engine(executable, directory, *args):
+    result = subprocess.run(
+        [str(executable), *[str(a) for a in args]],
+        cwd=str(directory), capture_output=True, text=True, timeout=300
+    )
+    if result.returncode != 0:
+        raise Exception(f"C engine error: {result.stderr}")
+    return result.stdout
+
+
+def bench_sync_all(dataset, runs):
+    """CSVSync.sync_all() against a throwaway test database"""
+    from django.db import connection
+    from movies.c_engine import CSVSync
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        dataset.load_database()
+        with tempfile.TemporaryDirectory(prefix='bench_sync_') as directory:
+            with override_settings(BASE_DIR=Path(directory), C_ENGINE_RATINGS_SNAPSHOT=False):
+                return time_runs(CSVSync.sync_all, runs)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def bench_recommend(dataset, executable, runs, rng, snapshot=False):
+    """One `c_interface recommend` process per call, as in subprocess mode"""
+    with tempfile.TemporaryDirectory(prefix='bench_engine_') as directory:
+        dataset.write_csv(directory)
+        if snapshot:
+            from movies.c_engine import CSVSync
+            with override_settings(BASE_DIR=Path(directory)):
+                CSVSync.export_ratings_snapshot()
+        user_ids = rng.choice(dataset.user_ids, size=runs + 1)
+        calls = iter(user_ids.tolist())
+        return time_runs(lambda: run_c_engine(executable, directory, 'recommend', next(calls), 10), runs)
+
+
+def bench_add_rating(dataset, executable, runs, rng):
+    with tempfile.TemporaryDirectory(prefix='bench_engine_') as directory:
+        dataset.write_csv(directory)
+        pairs = zip(rng.choice(dataset.user_ids, size=runs + 1).tolist(),
+                    rng.choice(dataset.movie_ids, size=runs + 1).tolist())
+        return time_runs(lambda: run_c_engine(executable, directory, 'add_rating', *next(pairs), 4.0), runs)
+
+
+def c_hash_size():
+    """HASH_SIZE the engine was built with, read from hash_table.h"""
+    try:
+        header = (Path(settings.BASE_DIR) / 'hash_table.h').read_text()
+    except OSError:
+        return None
+    match = re.search(r'#define\s+HASH_SIZE\s+(\d+)', header)
+    return int(match.group(1)) if match else None
+
+
+def run_benchmarks(dataset, stages, runs, executable=None):
+    """Run the selected stages and return the JSON-serialisable report"""
+    rng = np.random.default_rng(dataset.seed + 1)
+    report = {
+        'dataset': dataset.describe(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'hash_size': c_hash_size(),
+        },
+        'stages': {},
+        'skipped': {},
+    }
+
+    c_stages = {'recommend', 'recommend_snapshot', 'add_rating'}
+    c_available = executable is not None and Path(executable).exists()
+    for stage in stages:
+        if stage in c_stages and not c_available:
+            report['skipped'][stage] = f'{executable} not found; compile it with `make c_interface`'
+            continue
+
+        if stage == 'sync_all':
+            timings = bench_sync_all(dataset, runs)
+        elif stage == 'recommend':
+            timings = bench_recommend(dataset, executable, runs, rng)
+        elif stage == 'recommend_snapshot':
+            timings = bench_recommend(dataset, executable, runs, rng, snapshot=True)
+        elif stage == 'add_rating':
+            timings = bench_add_rating(dataset, executable, runs, rng)
+        else:
+            raise Exception(f"Unknown benchmark stage: {stage}")
+        report['stages'][stage] = summarize(timings)
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Stages whose p95 grew by more than `tolerance` (a fraction) over the
+    baseline: {stage: {'baseline_p95_ms', 'p95_ms', 'change'}}
+    """
+    regressions = {}
+    for stage, result in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous or not previous.get('p95_ms'):
+            continue
+        change = result['p95_ms'] / previous['p95_ms'] - 1.0
+        if change > tolerance:
+            regressions[stage] = {
+                'baseline_p95_ms': previous['p95_ms'],
+                'p95_ms': result['p95_ms'],
+                'change': round(change, 4),
+            }
+    return regressions
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
@@ -1,29 +1,213 @@
 """
 C Engine Integration - Minimal wrapper using subprocess
-Calls c_interface executable and parses JSON output
+Calls c_interface executable and parses JSON output.
+
+In daemon mode (settings.C_ENGINE_MODE = 'daemon') the executable is started
+once with `c_interface serve` and kept resident; requests are sent as one
+JSON object per line over stdin/stdout through a small process pool.
 """
 import subprocess
 import json
 import csv
+import gzip
 import os
+import queue
+import threading
+import itertools
+import time
+import tempfile
+import struct
+from contextlib import contextmanager
 from pathlib import Path
 from django.conf import settings
+from .metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock only serialises threads of one process
+    fcntl = None
+
+
+class CEngineTimeout(Exception):
+    """Raised when a resident engine process does not answer in time"""
+
+
+class EngineDaemon:
+    """One resident `c_interface serve` process speaking line-delimited JSON"""
+
+    def __init__(self, executable, cwd):
+        self.executable = executable
+        self.cwd = cwd
+        self.process = None
+        self.lines = None
+        self.last_used = 0.0
+        self._ids = itertools.count(1)
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [str(self.executable), 'serve'],
+            cwd=str(self.cwd),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        # Reader thread lets request() wait on a queue with a timeout
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=self._read_lines,
+            args=(self.process.stdout, self.lines),
+            daemon=True
+        ).start()
+        self.last_used = time.monotonic()
+
+    @staticmethod
+    def _read_lines(stream, lines):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)  # EOF: process exited
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+        self.process = None
+
+    def request(self, payload, timeout):
+        """Send one request and wait for its response line"""
+        if not self.is_alive():
+            self.start()
+
+        request_id = next(self._ids)
+        message = dict(payload, id=request_id)
+        try:
+            self.process.stdin.write(json.dumps(message) + '\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.stop()
+            raise Exception(f"C engine process died: {e}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                line = self.lines.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                # The stream is now out of step with our requests; start fresh
+                self.stop()
+                raise CEngineTimeout(f"C engine timed out after {timeout}s")
+            if line is None:
+                self.stop()
+                raise Exception("C engine process exited unexpectedly")
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Stray diagnostic output
+            if response.get('id') == request_id:
+                break
+
+        self.last_used = time.monotonic()
+        if response.get('status') == 'error':
+            raise Exception(f"C engine error: {response.get('error')}")
+        return response
+
+    def healthy(self, timeout):
+        try:
+            return self.request({'cmd': 'ping'}, timeout).get('status') == 'ok'
+        except Exception:
+            return False
+
+
+class EnginePool:
+    """Fixed-size pool of resident engine processes, shared per Django process"""
+
+    def __init__(self, executable, cwd, size):
+        self.size = size
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(EngineDaemon(executable, cwd))
+
+    def request(self, payload, timeout):
+        try:
+            daemon = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise Exception("No C engine process available")
+
+        try:
+            # Ping processes that have been idle a while before trusting them
+            idle_for = time.monotonic() - daemon.last_used
+            if daemon.is_alive() and idle_for > settings.C_ENGINE_HEALTH_CHECK_INTERVAL:
+                if not daemon.healthy(timeout):
+                    daemon.stop()
+
+            try:
+                return daemon.request(payload, timeout)
+            except CEngineTimeout:
+                raise
+            except Exception:
+                if daemon.is_alive():
+                    raise
+                # Crashed mid-request: restart once and retry
+                return daemon.request(payload, timeout)
+        finally:
+            self.idle.put(daemon)
+
+    def shutdown(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().stop()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_engine_pool(executable, cwd):
+    """Return the process-wide pool for this executable, creating it on first use"""
+    key = (str(executable), str(cwd))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = EnginePool(executable, cwd, settings.C_ENGINE_POOL_SIZE)
+        return _pools[key]
 
 
 class CRecommendationEngine:
     """Wrapper for C recommendation engine"""
     
+    uses_csv_files = True
+    
     def __init__(self):
         self.base_dir = Path(settings.BASE_DIR)
         self.executable = self.base_dir / 'c_interface'
         if os.name == 'nt':  # Windows
             self.executable = self.base_dir / 'c_interface.exe'
+        self.use_daemon = settings.C_ENGINE_MODE == 'daemon'
     
+    def _daemon_request(self, payload):
+        pool = get_engine_pool(self.executable, self.base_dir)
+        return pool.request(payload, settings.C_ENGINE_TIMEOUT)
+    
+    @timed('c_engine')
     def get_recommendations(self, user_id, count=10):
         """
         Get movie recommendations for a user
         Returns: list of dicts with movie info and predicted rating
         """
+        if self.use_daemon:
+            try:
+                response = self._daemon_request(
+                    {'cmd': 'recommend', 'user_id': int(user_id), 'count': int(count)}
+                )
+                return response['result']
+            except Exception as e:
+                raise Exception(f"Recommendation engine error: {e}")
+        
         try:
             result = subprocess.run(
                 [str(self.executable), 'recommend', str(user_id), str(count)],
@@ -42,11 +226,55 @@ class CRecommendationEngine:
         except Exception as e:
             raise Exception(f"Recommendation engine error: {e}")
     
+    @timed('c_engine')
+    def get_recommendations_batch(self, user_ids, count=10, timeout=None):
+        """
+        Recommendations for many users from a single engine run that loads
+        the data once. User ids are streamed on stdin.
+        Returns: {user_id: list of dicts}
+        """
+        try:
+            result = subprocess.run(
+                [str(self.executable), 'recommend_batch', str(count)],
+                cwd=str(self.base_dir),
+                input='\n'.join(str(int(u)) for u in user_ids) + '\n',
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            
+            if result.returncode != 0:
+                raise Exception(f"C engine error: {result.stderr}")
+            
+            batch = {}
+            for line in result.stdout.splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    batch[entry['user_id']] = entry['recommendations']
+            return batch
+        except json.JSONDecodeError as e:
+            raise Exception(f"Failed to parse C engine output: {e}")
+        except Exception as e:
+            raise Exception(f"Recommendation engine error: {e}")
+    
+    @timed('c_engine')
     def add_rating(self, user_id, movie_id, rating):
         """
         Add a rating via C engine (updates CSV)
         Returns: True on success
         """
+        if self.use_daemon:
+            try:
+                response = self._daemon_request({
+                    'cmd': 'add_rating',
+                    'user_id': int(user_id),
+                    'movie_id': int(movie_id),
+                    'rating': float(rating)
+                })
+                return response.get('status') == 'success'
+            except Exception as e:
+                raise Exception(f"Add rating error: {e}")
+        
         try:
             result = subprocess.run(
                 [str(self.executable), 'add_rating', str(user_id), str(movie_id), str(rating)],
@@ -71,77 +299,506 @@ class CRecommendationEngine:
             raise Exception(f"Add rating error: {e}")
 
 
+_snapshot_state = {'running': False, 'again': False}
+_snapshot_lock = threading.Lock()
+
+
+def _rebuild_ratings_snapshot():
+    while True:
+        try:
+            CSVSync.export_ratings_snapshot()
+        except Exception:
+            pass  # the engine keeps parsing ratings.csv; the next change retries
+        with _snapshot_lock:
+            if not _snapshot_state['again']:
+                _snapshot_state['running'] = False
+                return
+            _snapshot_state['again'] = False
+
+
+def schedule_ratings_snapshot():
+    """
+    Rebuild ratings.bin on a background thread, off the request that changed
+    ratings.csv. Calls made while a rebuild runs are folded into one more
+    rebuild after it, so a burst of ratings costs at most two. Until it
+    lands the engine sees a stale stamp and parses the CSV.
+    """
+    with _snapshot_lock:
+        if _snapshot_state['running']:
+            _snapshot_state['again'] = True
+            return
+        _snapshot_state['running'] = True
+    threading.Thread(target=_rebuild_ratings_snapshot, name='ratings-snapshot').start()
+
+
+_csv_lock_state = threading.local()
+_csv_thread_lock = threading.Lock()
+
+
+@contextmanager
+def csv_lock():
+    """
+    Exclusive lock over the engine's CSV files, held by every process that
+    writes them (an flock on the CSV_LOCK_FILE sidecar). Without it an
+    append landing while another process rewrites the same file goes to
+    the old inode and is lost when the rewrite is renamed into place.
+    Re-entrant within a thread.
+    """
+    if getattr(_csv_lock_state, 'held', False):
+        yield
+        return
+    with open(Path(settings.BASE_DIR) / CSVSync.CSV_LOCK_FILE, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            _csv_thread_lock.acquire()
+        _csv_lock_state.held = True
+        try:
+            yield
+        finally:
+            _csv_lock_state.held = False
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                _csv_thread_lock.release()
+
+
+@contextmanager
+def atomic_write(path, binary=False):
+    """
+    Write to a temp file beside `path` and rename it into place on success.
+    Paths ending in .gz are gzip-compressed.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{path.name}.', dir=str(path.parent))
+    os.chmod(tmp_path, 0o644)
+    try:
+        if path.suffix == '.gz':
+            os.close(fd)
+            f = gzip.open(tmp_path, 'wb' if binary else 'wt', compresslevel=6,
+                          **({} if binary else {'newline': '', 'encoding': 'utf-8'}))
+        elif binary:
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = os.fdopen(fd, 'w', newline='', encoding='utf-8')
+        with f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
 class CSVSync:
     """Sync Django models with C engine CSV files"""
     
+    FILES = {
+        'movies': ('movies.csv', ['movie_id', 'title', 'genre', 'year']),
+        'users': ('users.csv', ['user_id', 'name', 'age']),
+        'ratings': ('ratings.csv', ['user_id', 'movie_id', 'rating']),
+    }
+    
+    NEIGHBOURS_FILE = 'neighbours.csv'
+    # A re-rated or deleted rating is appended (deletes as a RATING_TOMBSTONE
+    # row; the last row of a pair wins) and ratings.csv is rewritten once it
+    # is this many times the size of its live rows plus the slack
+    RATING_TOMBSTONE = -1
+    RATINGS_COMPACT_RATIO = 2
+    RATING_ROW_BYTES = 16
+    RATINGS_COMPACT_SLACK = 1 << 20
+    
+    # Sidecar flocked by csv_lock() around every write to the files above
+    CSV_LOCK_FILE = 'ratings.csv.lock'
+    # neighbours.csv is rewritten once it is this many times the size of
+    # its live rows (estimated at NEIGHBOUR_ROW_BYTES each) plus the slack
+    NEIGHBOURS_COMPACT_RATIO = 2
+    NEIGHBOUR_ROW_BYTES = 32
+    NEIGHBOURS_COMPACT_SLACK = 1 << 20
+    
+    # Rows fetched per round trip by the streaming exports
+    EXPORT_CHUNK_SIZE = 10000
+    
+    # Compiled ratings.csv for the C engine; layout documented in snapshot.h
+    SNAPSHOT_FILE = 'ratings.bin'
+    SNAPSHOT_MAGIC = b'MRSNAP1\0'
+    SNAPSHOT_VERSION = 2
+    SNAPSHOT_HEADER = struct.Struct('<8sIIIIIIqqq')
+    
+    @staticmethod
+    def csv_path(name):
+        return Path(settings.BASE_DIR) / CSVSync.FILES[name][0]
+    
     @staticmethod
-    def export_movies():
+    def export_rows(path, header, rows):
+        """Stream `rows` (any iterable) into a CSV file at `path`"""
+        with atomic_write(path) as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    
+    @staticmethod
+    @timed('csv_sync')
+    def export_movies(path=None):
         """Export movies from Django to CSV"""
         from movies.models import Movie
         
-        csv_path = Path(settings.BASE_DIR) / 'movies.csv'
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['movie_id', 'title', 'genre', 'year'])
-            
-            for movie in Movie.objects.all():
-                writer.writerow([movie.movie_id, movie.title, movie.genre, movie.year])
+        rows = Movie.objects.order_by('movie_id').values_list('movie_id', 'title', 'genre', 'year')
+        CSVSync.export_rows(
+            path or CSVSync.csv_path('movies'), CSVSync.FILES['movies'][1],
+            rows.iterator(chunk_size=CSVSync.EXPORT_CHUNK_SIZE)
+        )
     
     @staticmethod
-    def export_users():
+    @timed('csv_sync')
+    def export_users(path=None):
         """Export users from Django to CSV"""
         from movies.models import UserProfile
         
-        csv_path = Path(settings.BASE_DIR) / 'users.csv'
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['user_id', 'name', 'age'])
+        rows = UserProfile.objects.order_by('c_user_id').values_list('c_user_id', 'user__username', 'age')
+        CSVSync.export_rows(
+            path or CSVSync.csv_path('users'), CSVSync.FILES['users'][1],
+            rows.iterator(chunk_size=CSVSync.EXPORT_CHUNK_SIZE)
+        )
+    
+    @staticmethod
+    @timed('csv_sync')
+    def export_ratings(path=None):
+        """
+        Export ratings from Django to CSV, streamed as plain tuples. The
+        profile join is an inner join, so raters without a profile drop out.
+        """
+        from movies.models import Rating
+        
+        rows = Rating.objects.filter(user__profile__isnull=False).order_by('id').values_list(
+            'user__profile__c_user_id', 'movie__movie_id', 'rating'
+        )
+        CSVSync.export_rows(
+            path or CSVSync.csv_path('ratings'), CSVSync.FILES['ratings'][1],
+            rows.iterator(chunk_size=CSVSync.EXPORT_CHUNK_SIZE)
+        )
+    
+    @staticmethod
+    @timed('csv_sync')
+    def export_neighbours():
+        """Export the top-K neighbour lists for the C engine"""
+        from movies.models import UserNeighbour
+        
+        rows = UserNeighbour.objects.order_by('user_id', 'rank').values_list(
+            'user_id', 'neighbour_id', 'similarity'
+        )
+        with csv_lock():
+            CSVSync.export_rows(
+                Path(settings.BASE_DIR) / CSVSync.NEIGHBOURS_FILE, ['user_id', 'neighbour_id', 'similarity'],
+                ([user_id, neighbour_id, f"{similarity:.6f}"]
+                 for user_id, neighbour_id, similarity in rows.iterator(chunk_size=CSVSync.EXPORT_CHUNK_SIZE))
+            )
+    
+    @staticmethod
+    def export_to(directory, compress=False):
+        """
+        Write movies, users and ratings CSVs into another directory (a dump
+        or backup; the engine's own files are untouched). With `compress`
+        they are written as .csv.gz, which import_dataset reads back.
+        Returns the paths written.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name, export in (('movies', CSVSync.export_movies), ('users', CSVSync.export_users),
+                             ('ratings', CSVSync.export_ratings)):
+            path = directory / (CSVSync.FILES[name][0] + ('.gz' if compress else ''))
+            export(path)
+            paths.append(path)
+        return paths
+    
+    @staticmethod
+    def snapshot_stamp(stat):
+        """
+        (size, mtime in ns, inode) of ratings.csv as snapshot.c compares
+        them. A rewrite is renamed into place, so it always has a new inode
+        even at the same size and within the mtime's resolution. Windows'
+        C stat() has neither nanoseconds nor inodes: seconds only there.
+        """
+        if os.name == 'nt':
+            return stat.st_size, int(stat.st_mtime) * 1_000_000_000, 0
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+    
+    @staticmethod
+    @timed('csv_sync')
+    def export_ratings_snapshot():
+        """
+        Compile ratings.csv into the fixed-width snapshot the C engine maps
+        instead of parsing. Built from the CSV itself (not the database) and
+        stamped with its size, mtime and inode, so the engine only ever uses
+        a snapshot of the exact file on disk. Raises if the file changed
+        while it was read; that change schedules another build.
+        """
+        import numpy as np
+        
+        source = CSVSync.csv_path('ratings')
+        stamp = CSVSync.snapshot_stamp(source.stat())
+        users, movies, values = [], [], []
+        with open(source, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                try:
+                    user_id, movie_id, rating = int(row[0]), int(row[1]), float(row[2])
+                except (ValueError, IndexError):
+                    continue  # the engine's sscanf skips these too
+                users.append(user_id)
+                movies.append(movie_id)
+                values.append(rating)
+        if CSVSync.snapshot_stamp(source.stat()) != stamp:
+            raise Exception(f"{source} changed while the ratings snapshot was being built")
+        
+        users = np.asarray(users, dtype='<i4')
+        movies = np.asarray(movies, dtype='<i4')
+        values = np.asarray(values, dtype='<f4')
+        
+        # Sort by (user, movie); for repeated pairs the last row wins, as in
+        # load_ratings(), and a pair whose last row is a tombstone is dropped
+        order = np.lexsort((movies, users))
+        users, movies, values = users[order], movies[order], values[order]
+        last = np.ones(len(users), dtype=bool)
+        last[:-1] = (users[1:] != users[:-1]) | (movies[1:] != movies[:-1])
+        last &= values >= 0
+        users, movies, values = users[last], movies[last], values[last]
+        
+        record = np.dtype([('id', '<i4'), ('rating', '<f4')])
+        by_user = np.empty(len(users), dtype=record)
+        by_user['id'] = movies
+        by_user['rating'] = values
+        
+        order = np.lexsort((users, movies))
+        by_movie = np.empty(len(users), dtype=record)
+        by_movie['id'] = users[order]
+        by_movie['rating'] = values[order]
+        
+        user_ids, user_counts = np.unique(users, return_counts=True)
+        movie_ids, movie_counts = np.unique(movies, return_counts=True)
+        user_offsets = np.concatenate(([0], np.cumsum(user_counts))).astype('<u4')
+        movie_offsets = np.concatenate(([0], np.cumsum(movie_counts))).astype('<u4')
+        
+        header = CSVSync.SNAPSHOT_HEADER.pack(
+            CSVSync.SNAPSHOT_MAGIC, CSVSync.SNAPSHOT_VERSION, 0x01020304,
+            len(user_ids), len(movie_ids), len(by_user), 0, *stamp,
+        )
+        with atomic_write(Path(settings.BASE_DIR) / CSVSync.SNAPSHOT_FILE, binary=True) as f:
+            f.write(header)
+            for array in (user_ids.astype('<i4'), user_offsets, by_user,
+                          movie_ids.astype('<i4'), movie_offsets, by_movie):
+                f.write(array.tobytes())
+        return len(by_user)
+    
+    @staticmethod
+    @timed('csv_sync')
+    def replace_neighbour_rows(user_ids, rows):
+        """
+        Swap the lists of the given users in neighbours.csv for `rows` by
+        appending them, each after a `user_id,-1` marker that tells the
+        engine to drop the user's earlier rows. Only the changed lists are
+        written; the file is compacted by a full export once the appended
+        lists outgrow the live ones.
+        """
+        from movies.models import UserNeighbour
+        
+        path = Path(settings.BASE_DIR) / CSVSync.NEIGHBOURS_FILE
+        by_user = {int(u): [] for u in user_ids}
+        for user_id, neighbour_id, similarity in rows:
+            by_user.setdefault(int(user_id), []).append((neighbour_id, similarity))
+        
+        with csv_lock():
+            if not path.exists():
+                return
+            with open(path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                for user_id, neighbours in by_user.items():
+                    writer.writerow([user_id, -1, '0'])
+                    for neighbour_id, similarity in neighbours:
+                        writer.writerow([user_id, neighbour_id, f"{similarity:.6f}"])
             
-            for profile in UserProfile.objects.select_related('user').all():
-                writer.writerow([profile.c_user_id, profile.user.username, profile.age])
+            live_size = UserNeighbour.objects.count() * CSVSync.NEIGHBOUR_ROW_BYTES
+            if path.stat().st_size > CSVSync.NEIGHBOURS_COMPACT_RATIO * live_size + CSVSync.NEIGHBOURS_COMPACT_SLACK:
+                CSVSync.export_neighbours()
+    
+    @staticmethod
+    def current_rows(name, keys):
+        """Current CSV rows from the database for the given keys: {key: row}"""
+        from movies.models import Movie, UserProfile, Rating
+        
+        rows = {}
+        if name == 'movies':
+            for movie in Movie.objects.filter(movie_id__in=[int(k) for k in keys]):
+                rows[str(movie.movie_id)] = [movie.movie_id, movie.title, movie.genre, movie.year]
+        elif name == 'users':
+            profiles = UserProfile.objects.select_related('user').filter(c_user_id__in=[int(k) for k in keys])
+            for profile in profiles:
+                rows[str(profile.c_user_id)] = [profile.c_user_id, profile.user.username, profile.age]
+        else:
+            pairs = [tuple(int(part) for part in k.split(',')) for k in keys]
+            triples = Rating.objects.filter(
+                user__profile__c_user_id__in={u for u, _ in pairs},
+                movie__movie_id__in={m for _, m in pairs},
+            ).values_list('user__profile__c_user_id', 'movie__movie_id', 'rating')
+            for user_id, movie_id, rating in triples:
+                key = f"{user_id},{movie_id}"
+                if key in keys:
+                    rows[key] = [user_id, movie_id, rating]
+        return rows
+    
+    @staticmethod
+    def row_key(name, row):
+        return f"{row[0]},{row[1]}" if name == 'ratings' else row[0]
+    
+    @staticmethod
+    def apply_changes(name, changes):
+        """
+        Bring one CSV file up to date with a batch of CSVChange rows.
+        Pure inserts are appended, and so is every rating change (see
+        append_ratings); updates and deletes of movies and users stream the
+        file once through a temp file and rename it into place.
+        """
+        first_created = {}
+        final_deleted = {}
+        for change in changes:
+            first_created.setdefault(change.key, change.created)
+            final_deleted[change.key] = change.deleted
+        
+        live_keys = {k for k, deleted in final_deleted.items() if not deleted}
+        rows = CSVSync.current_rows(name, live_keys)
+        
+        # Inserted and removed again before this sync: never reached the file
+        touched = {k for k in final_deleted if k in rows or not first_created[k]}
+        if not touched:
+            return
+        
+        path = CSVSync.csv_path(name)
+        if name == 'ratings':
+            CSVSync.append_ratings(
+                [rows[k] for k in touched if k in rows],
+                [k for k in touched if k not in rows],
+                superseding=any(not first_created[k] or k not in rows for k in touched),
+            )
+            return
+        if all(first_created[k] and k in rows for k in touched):
+            with open(path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                for key in touched:
+                    writer.writerow(rows[key])
+            return
+        
+        pending = {k: rows.get(k) for k in touched}
+        with atomic_write(path) as dst, open(path, 'r', newline='', encoding='utf-8') as src:
+            reader = csv.reader(src)
+            writer = csv.writer(dst)
+            writer.writerow(next(reader, CSVSync.FILES[name][1]))
+            for row in reader:
+                if not row:
+                    continue
+                key = CSVSync.row_key(name, row)
+                if key not in touched:
+                    writer.writerow(row)
+                elif key in pending:
+                    # First occurrence takes the new value, duplicates are dropped
+                    new_row = pending.pop(key)
+                    if new_row is not None:
+                        writer.writerow(new_row)
+            for new_row in pending.values():
+                if new_row is not None:
+                    writer.writerow(new_row)
     
     @staticmethod
-    def export_ratings():
-        """Export ratings from Django to CSV"""
+    def append_ratings(rows, deleted_keys, superseding):
+        """
+        Append rating rows and a tombstone row for each deleted "user,movie"
+        key to ratings.csv. The engine and the snapshot keep the last row of
+        each pair and drop tombstoned pairs, so a re-rating or delete costs
+        one row instead of a rewrite. When rows were `superseding` earlier
+        ones, the file is compacted by a full export once it outgrows the
+        live ratings.
+        """
         from movies.models import Rating
         
-        csv_path = Path(settings.BASE_DIR) / 'ratings.csv'
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        path = CSVSync.csv_path('ratings')
+        with open(path, 'a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow(['user_id', 'movie_id', 'rating'])
+            writer.writerows(rows)
+            for key in deleted_keys:
+                writer.writerow([*key.split(','), CSVSync.RATING_TOMBSTONE])
+        
+        if superseding:
+            live_size = Rating.objects.count() * CSVSync.RATING_ROW_BYTES
+            if path.stat().st_size > CSVSync.RATINGS_COMPACT_RATIO * live_size + CSVSync.RATINGS_COMPACT_SLACK:
+                CSVSync.export_ratings()
+    
+    @staticmethod
+    @timed('csv_sync')
+    def sync_changes():
+        """
+        Incremental sync: apply only the rows recorded in CSVChange since the
+        last sync. Falls back to a full export when a CSV file is missing.
+        The CSV lock is held from the claim until the batch is on disk.
+        """
+        from django.db import transaction
+        from movies.models import CSVChange
+        
+        with csv_lock():
+            if not all(CSVSync.csv_path(name).exists() for name in CSVSync.FILES):
+                CSVSync.sync_all()
+                return
             
-            for rating in Rating.objects.select_related('user__profile', 'movie').all():
-                try:
-                    user_id = rating.user.profile.c_user_id
-                    movie_id = rating.movie.movie_id
-                    writer.writerow([user_id, movie_id, rating.rating])
-                except:
-                    pass  # Skip if profile doesn't exist
+            # Claim the batch so concurrent workers never apply it twice
+            with transaction.atomic():
+                changes = list(CSVChange.objects.order_by('id'))
+                if not changes:
+                    return
+                claimed, _ = CSVChange.objects.filter(id__in=[c.id for c in changes]).delete()
+                if claimed != len(changes):
+                    transaction.set_rollback(True)
+                    return
+            
+            try:
+                for name in CSVSync.FILES:
+                    batch = [c for c in changes if c.file == name]
+                    if batch:
+                        CSVSync.apply_changes(name, batch)
+            except Exception:
+                # The claimed changes are gone; rebuild everything from the database
+                CSVSync.sync_all()
+                raise
+        if settings.C_ENGINE_RATINGS_SNAPSHOT and any(c.file == 'ratings' for c in changes):
+            schedule_ratings_snapshot()
     
     @staticmethod
     def import_movies():
-        """Import movies from CSV to Django"""
-        from movies.models import Movie
+        """Import movies from CSV to Django (batched upserts, see movies.importer)"""
+        from movies import importer, facets
         
         csv_path = Path(settings.BASE_DIR) / 'movies.csv'
         if not csv_path.exists():
             return
         
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                Movie.objects.update_or_create(
-                    movie_id=int(row['movie_id']),
-                    defaults={
-                        'title': row['title'],
-                        'genre': row['genre'],
-                        'year': int(row['year'])
-                    }
-                )
+        importer.import_movies(csv_path)
+        facets.rebuild()
     
     @staticmethod
+    @timed('csv_sync')
     def sync_all():
-        """Full bidirectional sync"""
-        CSVSync.export_movies()
-        CSVSync.export_users()
-        CSVSync.export_ratings()
+        """Full bidirectional sync, under the CSV lock"""
+        from movies.models import CSVChange
+        
+        with csv_lock():
+            last_change = CSVChange.objects.order_by('-id').values_list('id', flat=True).first()
+            CSVSync.export_movies()
+            CSVSync.export_users()
+            CSVSync.export_ratings()
+            if settings.C_ENGINE_RATINGS_SNAPSHOT:
+                CSVSync.export_ratings_snapshot()
+            # The C engine prefers neighbours.csv when present; never leave a stale one
+            neighbours_path = Path(settings.BASE_DIR) / CSVSync.NEIGHBOURS_FILE
+            if not settings.RECOMMENDATION_SIMILARITY_STORE and neighbours_path.exists():
+                neighbours_path.unlink()
+            # Everything logged before the export started is now on disk
+            if last_change is not None:
+                CSVChange.objects.filter(id__lte=last_change).delete()
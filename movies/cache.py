@@ -0,0 +1,100 @@
+"""
+Recommendation cache
+Per-user entries in Django's cache framework with versioned keys: bumping a
+user's version makes every older entry unreachable, and the backend's own
+LRU/TTL eviction cleans them up.
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+STAT_NAMES = ('hits', 'misses', 'invalidations')
+
+
+class RecommendationCache:
+    """Versioned per-user cache for recommendation lists"""
+
+    def __init__(self):
+        self.cache = caches[settings.RECOMMENDATION_CACHE_ALIAS]
+
+    def version(self, user_id):
+        key = f'recs:version:{user_id}'
+        version = self.cache.get(key)
+        if version is None:
+            # Never restart at a fixed number: if the version key was evicted,
+            # entries written under the old version must stay unreachable
+            version = time.time_ns()
+            if not self.cache.add(key, version, None):
+                version = self.cache.get(key, version)
+        return version
+
+    def entry_key(self, user_id, count):
+        return f'recs:{user_id}:{self.version(user_id)}:{count}'
+
+    def count(self, stat):
+        key = f'recs:stats:{stat}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, None):
+                self.cache.incr(key)
+
+    def get(self, user_id, count):
+        recommendations = self.cache.get(self.entry_key(user_id, count))
+        self.count('hits' if recommendations is not None else 'misses')
+        return recommendations
+
+    def set(self, user_id, count, recommendations):
+        self.cache.set(self.entry_key(user_id, count), recommendations)
+
+    def invalidate(self, user_id):
+        key = f'recs:version:{user_id}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns(), None)
+        self.count('invalidations')
+
+    def invalidate_many(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def stats(self):
+        """Counters for this cache (per process for the local-memory backend)"""
+        values = self.cache.get_many([f'recs:stats:{stat}' for stat in STAT_NAMES])
+        stats = {stat: values.get(f'recs:stats:{stat}', 0) for stat in STAT_NAMES}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def drop_recommendations(c_user_ids):
+    """Delete the users' precomputed rows and, once committed, their cache entries"""
+    from django.db import transaction
+    from .models import PrecomputedRecommendation
+
+    c_user_ids = list(c_user_ids)
+    PrecomputedRecommendation.objects.filter(user_id__in=c_user_ids).delete()
+    transaction.on_commit(lambda: RecommendationCache().invalidate_many(c_user_ids))
+
+
+class CachedRecommendationEngine:
+    """Wraps any engine and serves repeat requests from RecommendationCache"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.cache = RecommendationCache()
+        self.uses_csv_files = engine.uses_csv_files
+
+    def get_recommendations(self, user_id, count=10):
+        recommendations = self.cache.get(user_id, count)
+        if recommendations is None:
+            recommendations = self.engine.get_recommendations(user_id, count)
+            self.cache.set(user_id, count, recommendations)
+        return recommendations
+
+    def get_recommendations_batch(self, user_ids, count=10):
+        return self.engine.get_recommendations_batch(user_ids, count)
+
+    def add_rating(self, user_id, movie_id, rating):
+        return self.engine.add_rating(user_id, movie_id, rating)
@@ -0,0 +1,82 @@
+"""
+Genre facets for the movie browser
+Genre counts come from the GenreFacet table, which the Movie signals keep
+current, so the sidebar never scans the movie table. Facet counts for a
+search query are computed once through the search index and cached under a
+version that any movie change bumps.
+"""
+import hashlib
+import time
+from django.core.cache import cache
+from django.db.models import Count, F
+from .models import Movie, GenreFacet
+
+VERSION_KEY = 'facets:version'
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        current = time.time_ns()
+        cache.add(VERSION_KEY, current, None)
+        current = cache.get(VERSION_KEY, current)
+    return current
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def adjust(genre, delta):
+    """Add `delta` movies to a genre's count"""
+    genre = (genre or '').strip()
+    if not genre:
+        return
+    facet, created = GenreFacet.objects.get_or_create(genre=genre, defaults={'movie_count': max(delta, 0)})
+    if not created:
+        GenreFacet.objects.filter(pk=facet.pk).update(movie_count=F('movie_count') + delta)
+    GenreFacet.objects.filter(pk=facet.pk, movie_count__lte=0).delete()
+
+
+def rebuild():
+    """Recount every genre from the movie table (after bulk imports)"""
+    counts = {}
+    for row in Movie.objects.values('genre').annotate(count=Count('id')):
+        genre = row['genre'].strip()
+        if genre:
+            counts[genre] = counts.get(genre, 0) + row['count']
+    GenreFacet.objects.all().delete()
+    GenreFacet.objects.bulk_create([GenreFacet(genre=g, movie_count=c) for g, c in counts.items()])
+    invalidate()
+
+
+def genre_facets():
+    """[(genre, movie count)] for every genre, alphabetically"""
+    key = f'facets:{version()}:all'
+    facets = cache.get(key)
+    if facets is None:
+        facets = list(GenreFacet.objects.filter(movie_count__gt=0).values_list('genre', 'movie_count'))
+        cache.set(key, facets)
+    return facets
+
+
+def query_facets(query):
+    """[(genre, matching movie count)] for a search query, alphabetically"""
+    from .search import search_movies
+
+    digest = hashlib.sha1(' '.join(query.lower().split()).encode('utf-8')).hexdigest()
+    key = f'facets:{version()}:q:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        results = search_movies(query)
+        if results is None:
+            return genre_facets()
+        if hasattr(results, 'genre_counts'):
+            facets = results.genre_counts()
+        else:
+            facets = list(results.order_by('genre').values_list('genre').annotate(count=Count('id')))
+        cache.set(key, facets)
+    return facets
@@ -0,0 +1,174 @@
+"""
+Fallback rankings
+Top movies for users the collaborative engines have nothing for: new users
+with no ratings, and users with no similar neighbours yet. Rankings are
+precomputed overall, per genre and per age bucket (UserProfile.age) by
+`manage.py compute_fallback_rankings`, scored with a Bayesian average:
+
+    score = (C * mean + sum of ratings) / (C + number of ratings)
+
+where `mean` is the scope's mean rating and C is FALLBACK_PRIOR_RATINGS, so
+a movie needs many ratings before it can outrank the scope's typical movie.
+Each ranking is cached as ready-made recommendation dicts under a version
+that every rebuild bumps.
+"""
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from .models import Movie, Rating, FallbackRanking
+
+VERSION_KEY = 'fallback:version'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# (label, lowest age, highest age)
+AGE_BUCKETS = [
+    ('under 18', 1, 17),
+    ('18-24', 18, 24),
+    ('25-34', 25, 34),
+    ('35-44', 35, 44),
+    ('45-54', 45, 54),
+    ('55+', 55, 120),
+]
+
+# Liked genres drawn on for users who have rated something
+LIKED_RATING = 4.0
+LIKED_GENRES = 3
+
+
+def age_bucket(age):
+    for label, low, high in AGE_BUCKETS:
+        if low <= age <= high:
+            return label
+    return None
+
+
+def bayesian_top(stats, size):
+    """
+    Rank {movie pk: (count, sum)} by Bayesian average against the pool's
+    own mean. Returns [(movie pk, score, count)], best first.
+    """
+    total_count = sum(count for count, _ in stats.values())
+    if not total_count:
+        return []
+    mean = sum(total for _, total in stats.values()) / total_count
+    prior = settings.FALLBACK_PRIOR_RATINGS
+    scored = [
+        (pk, (prior * mean + total) / (prior + count), count)
+        for pk, (count, total) in stats.items() if count
+    ]
+    scored.sort(key=lambda entry: (-entry[1], -entry[2], entry[0]))
+    return scored[:size]
+
+
+def rebuild(size=None):
+    """Recompute every ranking. Returns the number of rankings stored."""
+    size = size or settings.FALLBACK_RANKING_SIZE
+    pools = defaultdict(dict)
+
+    # Overall and per genre from the running aggregates on Movie
+    for pk, genre, count, total in Movie.objects.filter(rating_count__gt=0).values_list(
+        'pk', 'genre', 'rating_count', 'rating_sum'
+    ):
+        pools[('overall', '')][pk] = (count, total)
+        if genre.strip():
+            pools[('genre', genre.strip())][pk] = (count, total)
+
+    # Per age bucket from the ratings, grouped by movie and rater age
+    by_age = Rating.objects.filter(user__profile__isnull=False).values_list(
+        'movie_id', 'user__profile__age'
+    ).annotate(count=Count('id'), total=Sum('rating')).order_by()
+    for pk, age, count, total in by_age.iterator(chunk_size=10000):
+        label = age_bucket(age)
+        if label is None:
+            continue
+        pool = pools[('age', label)]
+        previous_count, previous_total = pool.get(pk, (0, 0.0))
+        pool[pk] = (previous_count + count, previous_total + total)
+
+    rows = [
+        FallbackRanking(scope=scope, key=key, rank=rank, movie_id=pk, score=round(score, 4), rating_count=count)
+        for (scope, key), stats in pools.items()
+        for rank, (pk, score, count) in enumerate(bayesian_top(stats, size), 1)
+    ]
+    with transaction.atomic():
+        FallbackRanking.objects.all().delete()
+        FallbackRanking.objects.bulk_create(rows, batch_size=1000)
+        transaction.on_commit(invalidate)
+    return len(pools)
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        current = time.time_ns()
+        cache.add(VERSION_KEY, current, None)
+        current = cache.get(VERSION_KEY, current)
+    return current
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def ranking(scope, key=''):
+    """Cached ranking as recommendation dicts (without 'reason'), best first"""
+    cache_key = f'fallback:{version()}:{scope}:{key}'
+    entries = cache.get(cache_key)
+    if entries is None:
+        entries = [
+            {
+                'movie_id': movie_id,
+                'title': title,
+                'genre': genre,
+                'year': year,
+                'predicted_rating': round(score, 2),
+            }
+            for movie_id, title, genre, year, score in FallbackRanking.objects.filter(
+                scope=scope, key=key
+            ).values_list('movie__movie_id', 'movie__title', 'movie__genre', 'movie__year', 'score')
+        ]
+        cache.set(cache_key, entries, CACHE_TIMEOUT)
+    return entries
+
+
+def recommend(user, count=10):
+    """
+    Recommendations for a user from the fallback rankings, in the engines'
+    dict format: the top movies of the genres they rated highly, of their
+    age group and overall, taken in turn and skipping anything they rated
+    """
+    rated = set(Rating.objects.filter(user=user).values_list('movie__movie_id', flat=True))
+    liked = Rating.objects.filter(user=user, rating__gte=LIKED_RATING).values(
+        'movie__genre'
+    ).annotate(n=Count('id')).order_by('-n', 'movie__genre')[:LIKED_GENRES]
+    sources = [
+        (('genre', row['movie__genre'].strip()), f"Top rated in {row['movie__genre'].strip()}")
+        for row in liked if row['movie__genre'].strip()
+    ]
+    profile = getattr(user, 'profile', None)
+    bucket = age_bucket(profile.age) if profile is not None else None
+    if bucket is not None:
+        sources.append((('age', bucket), f'Top rated by viewers aged {bucket}'))
+    sources.append((('overall', ''), 'Top rated overall'))
+
+    rankings = [(iter(ranking(*source)), reason) for source, reason in sources]
+    recommendations = []
+    seen = set(rated)
+    while rankings and len(recommendations) < count:
+        for entry_iter, reason in list(rankings):
+            for entry in entry_iter:
+                if entry['movie_id'] not in seen:
+                    seen.add(entry['movie_id'])
+                    recommendations.append({**entry, 'reason': reason})
+                    break
+            else:
+                rankings.remove((entry_iter, reason))
+            if len(recommendations) >= count:
+                break
+    return recommendations
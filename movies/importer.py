@@ -0,0 +1,262 @@
+"""
+Bulk dataset importer
+Streams movies, users and ratings files in chunks and upserts each chunk
+with one bulk_create(update_conflicts=True) per batch, so memory stays flat
+and a 25M-rating file costs thousands of statements rather than millions.
+
+Reads this project's own CSV layout and both MovieLens layouts:
+  - native:       movies.csv (movie_id,title,genre,year), users.csv
+                  (user_id,name,age), ratings.csv (user_id,movie_id,rating)
+  - MovieLens:    movies.csv (movieId,title,genres), ratings.csv
+                  (userId,movieId,rating,timestamp) - ml-latest, ml-25m ...
+  - MovieLens .dat: movies.dat / users.dat / ratings.dat with '::' separators (ml-1m, ml-10m)
+Files may be gzip-compressed (.gz).
+
+bulk_create skips model signals: call finish() afterwards to rebuild the
+rating aggregates and genre facets, then export the CSVs for the C engine.
+"""
+import csv
+import gzip
+import itertools
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from .models import Movie, UserProfile, Rating, PrecomputedRecommendation
+
+YEAR_IN_TITLE = re.compile(r'\s*\((\d{4})\)\s*$')
+TITLE_LENGTH = Movie._meta.get_field('title').max_length
+GENRE_LENGTH = Movie._meta.get_field('genre').max_length
+MIN_RATING, MAX_RATING = 1.0, 5.0
+DEFAULT_AGE = 30
+
+
+def open_text(path):
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    # .dat files from older MovieLens releases are Latin-1
+    encoding = 'latin-1' if path.name.endswith('.dat') else 'utf-8'
+    return open(path, 'r', encoding=encoding, errors='replace', newline='')
+
+
+@contextmanager
+def read_rows(path):
+    """(header, rows) for a CSV with a header line or a headerless '::' .dat file"""
+    with open_text(path) as f:
+        if '.dat' in Path(path).suffixes:
+            yield None, (line.rstrip('\r\n').split('::') for line in f if line.strip())
+        else:
+            reader = csv.reader(f)
+            header = [name.strip().lower() for name in next(reader, [])]
+            yield header, reader
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_movie(row, header):
+    """(movie_id, title, genre, year); MovieLens titles carry the year, genres are '|'-separated"""
+    movie_id = int(row[0])
+    if header is not None and 'year' in header:
+        title, genre, year = row[1], row[2], int(row[3] or 0)
+    else:
+        title, genres = row[1], row[2]
+        match = YEAR_IN_TITLE.search(title)
+        year = int(match.group(1)) if match else 0
+        if match:
+            title = title[:match.start()]
+        genre = '' if genres.startswith('(') else genres.split('|')[0]
+    return movie_id, title.strip()[:TITLE_LENGTH], genre.strip()[:GENRE_LENGTH], year
+
+
+def parse_user(row, header):
+    """(user_id, age); MovieLens users.dat stores an age bracket (1, 18, 25, ...)"""
+    if header is not None and 'age' in header:
+        return int(row[0]), int(row[header.index('age')])
+    return int(row[0]), int(row[2])
+
+
+def parse_rating(row):
+    """(user_id, movie_id, rating) clamped to the model's 1-5 range (MovieLens allows 0.5)"""
+    rating = min(max(float(row[2]), MIN_RATING), MAX_RATING)
+    return int(row[0]), int(row[1]), rating
+
+
+class Progress:
+    """Rows done and rows per second, reported every `every` rows"""
+
+    def __init__(self, name, report=None, every=100000):
+        self.name = name
+        self.report = report
+        self.every = every
+        self.rows = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self.next_report = every
+
+    @property
+    def rate(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def done(self):
+        self.finished = time.monotonic()
+        return self
+
+    def add(self, rows, skipped=0):
+        self.rows += rows
+        self.skipped += skipped
+        if self.report and self.rows >= self.next_report:
+            self.report(f'  {self.name}: {self.rows:,} rows ({self.rate:,.0f} rows/s)')
+            self.next_report = (self.rows // self.every + 1) * self.every
+
+    def summary(self):
+        skipped = f', {self.skipped:,} skipped' if self.skipped else ''
+        return f'{self.name}: {self.rows:,} rows at {self.rate:,.0f} rows/s{skipped}'
+
+
+def import_movies(path, batch_size=5000, report=None):
+    """Upsert every movie in the file by movie_id"""
+    progress = Progress('movies', report)
+    with read_rows(path) as (header, rows):
+        for chunk in chunked(rows, batch_size):
+            movies = {}
+            skipped = 0
+            for row in chunk:
+                try:
+                    movie_id, title, genre, year = parse_movie(row, header)
+                except (ValueError, IndexError):
+                    skipped += 1
+                    continue
+                movies[movie_id] = Movie(movie_id=movie_id, title=title, genre=genre, year=year)
+            with transaction.atomic():
+                Movie.objects.bulk_create(
+                    list(movies.values()),
+                    update_conflicts=True,
+                    unique_fields=['movie_id'],
+                    update_fields=['title', 'genre', 'year'],
+                )
+            progress.add(len(movies), skipped)
+    return progress.done()
+
+
+def create_users(ages, username_prefix='user'):
+    """
+    Users and profiles for c_user_ids that have no profile yet, and the ages
+    of existing ones. `ages` maps c_user_id -> age. Returns {c_user_id: User pk}.
+    """
+    existing = dict(UserProfile.objects.filter(c_user_id__in=list(ages)).values_list('c_user_id', 'user_id'))
+    missing = [c_user_id for c_user_id in ages if c_user_id not in existing]
+    if missing:
+        # Imported accounts cannot log in until a password is set
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=f'{username_prefix}{c_user_id}', password=password) for c_user_id in missing],
+            ignore_conflicts=True,
+        )
+        user_pks = dict(User.objects.filter(
+            username__in=[f'{username_prefix}{c_user_id}' for c_user_id in missing]
+        ).values_list('username', 'pk'))
+        for c_user_id in missing:
+            existing[c_user_id] = user_pks[f'{username_prefix}{c_user_id}']
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=existing[c_user_id], c_user_id=c_user_id, age=age) for c_user_id, age in ages.items()],
+        update_conflicts=True,
+        unique_fields=['c_user_id'],
+        update_fields=['age'],
+    )
+    return {c_user_id: existing[c_user_id] for c_user_id in ages}
+
+
+def import_users(path, batch_size=5000, user_id_offset=0, username_prefix='user', report=None):
+    """Create or update a user and profile for every row in the file"""
+    progress = Progress('users', report)
+    with read_rows(path) as (header, rows):
+        for chunk in chunked(rows, batch_size):
+            ages = {}
+            skipped = 0
+            for row in chunk:
+                try:
+                    user_id, age = parse_user(row, header)
+                except (ValueError, IndexError):
+                    skipped += 1
+                    continue
+                ages[user_id + user_id_offset] = min(max(age, 1), 120)
+            with transaction.atomic():
+                create_users(ages, username_prefix)
+            progress.add(len(ages), skipped)
+    return progress.done()
+
+
+def import_ratings(path, batch_size=10000, user_id_offset=0, username_prefix='user',
+                   default_age=DEFAULT_AGE, report=None):
+    """
+    Upsert every rating by (user, movie). Raters without a profile get one
+    with `default_age`; ratings for unknown movies are skipped.
+    Returns (progress, set of c_user_ids rated).
+    """
+    progress = Progress('ratings', report)
+    movie_pks = dict(Movie.objects.values_list('movie_id', 'pk'))
+    user_pks = dict(UserProfile.objects.values_list('c_user_id', 'user_id'))
+    rated = set()
+
+    with read_rows(path) as (header, rows):
+        for chunk in chunked(rows, batch_size):
+            ratings = {}
+            skipped = 0
+            for row in chunk:
+                try:
+                    user_id, movie_id, rating = parse_rating(row)
+                except (ValueError, IndexError):
+                    skipped += 1
+                    continue
+                movie_pk = movie_pks.get(movie_id)
+                if movie_pk is None:
+                    skipped += 1
+                    continue
+                # Last row wins for repeated pairs; PostgreSQL rejects them in one upsert
+                ratings[(user_id + user_id_offset, movie_pk)] = rating
+
+            with transaction.atomic():
+                new_users = {u: default_age for u, _ in ratings if u not in user_pks}
+                if new_users:
+                    user_pks.update(create_users(new_users, username_prefix))
+                Rating.objects.bulk_create(
+                    [Rating(user_id=user_pks[u], movie_id=m, rating=r) for (u, m), r in ratings.items()],
+                    update_conflicts=True,
+                    unique_fields=['user', 'movie'],
+                    update_fields=['rating', 'updated_at'],
+                )
+            rated.update(u for u, _ in ratings)
+            progress.add(len(ratings), skipped)
+    return progress.done(), rated
+
+
+def finish(rated_user_ids=()):
+    """
+    Bring everything bulk_create bypassed up to date: rating aggregates,
+    genre facets, fallback rankings, item neighbour lists and any
+    recommendations computed before the import
+    """
+    from . import aggregates, facets, fallback
+    from .cache import RecommendationCache
+
+    aggregates.recompute_all()
+    facets.rebuild()
+    fallback.rebuild()
+    if rated_user_ids:
+        # Too many item neighbour lists move to patch: the next refresh recomputes them all
+        Movie.objects.update(neighbours_stale=True)
+        PrecomputedRecommendation.objects.all().delete()
+        RecommendationCache().invalidate_many(rated_user_ids)
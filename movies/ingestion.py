@@ -0,0 +1,91 @@
+"""
+Asynchronous rating ingestion
+With RATING_INGESTION_ASYNC the rating view only inserts a RatingOutbox row;
+the process_ratings worker applies queued ratings in batches, one
+transaction per batch (the Rating signals keep the aggregates current), then
+brings the similarity store, item neighbour lists and CSV files up to date
+once per batch instead of once per rating. Users whose refresh has not
+succeeded yet are kept in PendingRefresh and retried on every pass.
+"""
+from django.db import transaction
+from django.db.models import F
+from .models import UserProfile, Rating, RatingOutbox, PendingRefresh
+from .c_engine import CSVSync
+from .backends import get_engine
+from . import similarity, item_similarity
+
+
+def enqueue_rating(user, movie, rating):
+    return RatingOutbox.objects.create(user=user, movie=movie, rating=rating)
+
+
+def pending_rating(user, movie):
+    """The user's most recent queued rating for a movie, or None"""
+    return RatingOutbox.objects.filter(user=user, movie=movie).order_by('-id').first()
+
+
+def process_batch(batch_size=500):
+    """
+    Apply up to `batch_size` queued ratings, then refresh the derived state
+    of every user still waiting for it. Returns how many queue entries were
+    consumed (0 when the queue is empty).
+    """
+    with transaction.atomic():
+        # skip_locked lets several workers share the queue where supported
+        entries = list(
+            RatingOutbox.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+        )
+        if entries:
+            # Later submissions for the same movie replace earlier ones
+            latest = {}
+            for entry in entries:
+                latest[(entry.user_id, entry.movie_id)] = entry.rating
+            for (user_id, movie_id), rating in latest.items():
+                Rating.objects.update_or_create(user_id=user_id, movie_id=movie_id, defaults={'rating': rating})
+            
+            RatingOutbox.objects.filter(id__in=[entry.id for entry in entries]).delete()
+            # Committed with the ratings, so a failed refresh below is retried
+            PendingRefresh.objects.bulk_create(
+                [PendingRefresh(user_id=user_id) for user_id in {user_id for user_id, _ in latest}],
+                ignore_conflicts=True
+            )
+    
+    refresh_pending()
+    return len(entries)
+
+
+def refresh_pending():
+    """
+    Bring the similarity store, item neighbour lists and CSV files up to
+    date for the users in PendingRefresh, once for all of them. The rows
+    are only removed when every step succeeded; on failure their attempt
+    count goes up and the next call runs the steps again (with a full CSV
+    export, since a failed sync_changes has already claimed its changes).
+    Returns how many users were refreshed.
+    """
+    pending = list(PendingRefresh.objects.values_list('id', 'user_id', 'attempts'))
+    if not pending:
+        return 0
+    ids = [pk for pk, _, _ in pending]
+    retry = any(attempts for _, _, attempts in pending)
+    
+    try:
+        if similarity.store_enabled():
+            user_ids = [user_id for _, user_id, _ in pending]
+            for c_user_id in UserProfile.objects.filter(user_id__in=user_ids).values_list('c_user_id', flat=True):
+                similarity.update_user(c_user_id)
+        if item_similarity.index_built():
+            item_similarity.refresh_stale()
+        
+        # Resident engines reload from the files on their next request
+        if get_engine(cached=False).uses_csv_files:
+            if retry:
+                CSVSync.sync_all()
+            else:
+                CSVSync.sync_changes()
+    except Exception:
+        PendingRefresh.objects.filter(id__in=ids).update(attempts=F('attempts') + 1)
+        raise
+    
+    PendingRefresh.objects.filter(id__in=ids).delete()
+    return len(ids)
@@ -0,0 +1,103 @@
+"""
+Item Engine - item-based recommendations from the MovieNeighbour index
+A movie is scored from the user's own ratings of the movies it is a stored
+neighbour of, so a request reads the user's ratings and their neighbour
+lists: O(ratings x N) rows, independent of how many users there are.
+"""
+from .metrics import timed
+from .models import Movie, MovieNeighbour, Rating
+
+# Pulls predictions with little similarity behind them towards the user's mean
+SHRINKAGE = 1.0
+
+
+class ItemRecommendationEngine:
+    """Item-item engine with the same interface as CRecommendationEngine"""
+
+    uses_csv_files = False
+
+    def recommend(self, own, count):
+        """
+        Top-N (movie_id, predicted rating, (rated movie_id, rating) behind it)
+        for a user's {movie_id: rating}
+        """
+        if not own:
+            return []
+        mean = sum(own.values()) / len(own)
+        scores = {}
+        neighbours = MovieNeighbour.objects.filter(movie_id__in=own.keys()).exclude(
+            neighbour_id__in=own.keys()
+        ).values_list('movie_id', 'neighbour_id', 'similarity')
+        for rated_id, movie_id, similarity in neighbours.iterator(chunk_size=10000):
+            weighted, total, best = scores.get(movie_id, (0.0, 0.0, None))
+            if best is None or similarity > best[0]:
+                best = (similarity, rated_id)
+            scores[movie_id] = (weighted + similarity * own[rated_id], total + similarity, best)
+
+        predictions = [
+            ((weighted + SHRINKAGE * mean) / (total + SHRINKAGE), movie_id, best[1])
+            for movie_id, (weighted, total, best) in scores.items()
+        ]
+        predictions.sort(key=lambda p: (-p[0], p[1]))
+        return [(movie_id, score, (rated_id, own[rated_id])) for score, movie_id, rated_id in predictions[:count]]
+
+    def format_results(self, results):
+        """Turn recommend() tuples into the C engine's dict format"""
+        ids = {movie_id for movie_id, _, _ in results} | {because[0] for _, _, because in results}
+        movies = Movie.objects.in_bulk(ids, field_name='movie_id')
+        recommendations = []
+        for movie_id, score, (rated_id, rating) in results:
+            movie = movies.get(movie_id)
+            if movie is None:
+                continue
+            because = movies.get(rated_id)
+            recommendations.append({
+                'movie_id': movie.movie_id,
+                'title': movie.title,
+                'genre': movie.genre,
+                'year': movie.year,
+                'predicted_rating': round(score, 2),
+                'reason': f"You rated {because.title} {rating:.1f}/5" if because else 'Similar to movies you rated',
+            })
+        return recommendations
+
+    def user_ratings(self, user_ids):
+        """{c_user_id: {movie_id: rating}}"""
+        ratings = {int(user_id): {} for user_id in user_ids}
+        rows = Rating.objects.filter(user__profile__c_user_id__in=ratings.keys()).values_list(
+            'user__profile__c_user_id', 'movie__movie_id', 'rating'
+        )
+        for c_user_id, movie_id, rating in rows.iterator(chunk_size=10000):
+            ratings[c_user_id][movie_id] = rating
+        return ratings
+
+    def check_index(self):
+        if not MovieNeighbour.objects.exists():
+            raise Exception('The item similarity index is empty: run manage.py compute_item_similarities')
+
+    @timed('item_engine')
+    def get_recommendations(self, user_id, count=10):
+        """
+        Get movie recommendations for a user
+        Returns: list of dicts with movie info and predicted rating
+        """
+        self.check_index()
+        own = self.user_ratings([user_id])[int(user_id)]
+        return self.format_results(self.recommend(own, count))
+
+    @timed('item_engine')
+    def get_recommendations_batch(self, user_ids, count=10):
+        """
+        Recommendations for many users
+        Returns: {user_id: list of dicts}
+        """
+        self.check_index()
+        ratings = self.user_ratings(user_ids)
+        return {
+            user_id: self.format_results(self.recommend(own, count))
+            for user_id, own in ratings.items()
+        }
+
+    def add_rating(self, user_id, movie_id, rating):
+        """Ratings are read straight from the database; the movie is flagged stale by the signals"""
+        return True
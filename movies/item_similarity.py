@@ -0,0 +1,238 @@
+"""
+Item-item similarity index
+Each movie keeps its top-N most similar movies (MovieNeighbour), by cosine
+similarity between the movies' rating columns: the movie-to-user edges the
+C engine's graph holds, read here from the RatingMatrix. Pairs with fewer
+than ITEM_MIN_CORATERS common raters are ignored, so one shared rating
+cannot make two movies look identical.
+
+Item neighbourhoods move slowly, so the lists are computed ahead of time by
+`manage.py compute_item_similarities` and only refreshed for movies whose
+ratings changed (Movie.neighbours_stale, set by the Rating signals). Lists
+read by pages are cached for a day.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Movie, MovieNeighbour
+
+PRECISION = 6
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class ItemMatrix:
+    """Movie x user view of a RatingMatrix with the column norms needed for cosine"""
+
+    def __init__(self, matrix):
+        self.movie_ids = matrix.movie_ids
+        self.movie_index = matrix.movie_index
+        self.ratings = matrix.ratings.T.tocsr()
+        self.rated = matrix.rated.T.tocsr()
+        self.norms = np.sqrt(np.asarray(matrix.squared.sum(axis=0)).ravel())
+
+    def similarities(self, rows):
+        """
+        Yield (row, neighbour indexes, similarities, co-raters) for each movie
+        index in `rows`, over every movie it shares enough raters with
+        """
+        min_coraters = settings.ITEM_MIN_CORATERS
+        rows = np.asarray(rows, dtype=np.int64)
+        # Ratings are positive, so both products share one sparsity pattern
+        dot = (self.ratings[rows] @ self.ratings.T).tocsr()
+        coraters = (self.rated[rows] @ self.rated.T).tocsr()
+        dot.sort_indices()
+        coraters.sort_indices()
+
+        for n, i in enumerate(rows):
+            start, stop = dot.indptr[n], dot.indptr[n + 1]
+            cols = dot.indices[start:stop]
+            sims = dot.data[start:stop] / (self.norms[i] * self.norms[cols])
+            counts = coraters.data[start:stop].astype(np.int64)
+            keep = (cols != i) & (counts >= min_coraters)
+            yield int(i), cols[keep], np.round(sims[keep], PRECISION), counts[keep]
+
+    def neighbour_lists(self, rows):
+        """Top-N [(neighbour index, similarity, co-raters)] for each movie index: {row: [...]}"""
+        k = settings.ITEM_NEIGHBOURS_K
+        lists = {}
+        for i, cols, sims, counts in self.similarities(rows):
+            # Higher similarity first, then lower movie_id (as top_neighbours does for users)
+            order = np.lexsort((self.movie_ids[cols], -sims))[:k]
+            lists[i] = [(int(cols[j]), float(sims[j]), int(counts[j])) for j in order]
+        return lists
+
+    def neighbour_rows(self, rows, block_size=500):
+        """MovieNeighbour objects for the given movie indexes, computed a block at a time"""
+        for start in range(0, len(rows), block_size):
+            for i, ranked in self.neighbour_lists(rows[start:start + block_size]).items():
+                movie_id = int(self.movie_ids[i])
+                for rank, (j, similarity, count) in enumerate(ranked, 1):
+                    yield MovieNeighbour(
+                        movie_id=movie_id, neighbour_id=int(self.movie_ids[j]),
+                        similarity=similarity, co_raters=count, rank=rank,
+                    )
+
+
+def load_matrix():
+    from .py_engine import get_rating_matrix
+    return ItemMatrix(get_rating_matrix())
+
+
+def write_lists(item_matrix, rows, batch_size):
+    """Replace the lists of the given movie indexes. Returns neighbour rows stored."""
+    movie_ids = [int(item_matrix.movie_ids[i]) for i in rows]
+    total = 0
+    batch = []
+    for start in range(0, len(movie_ids), 500):
+        MovieNeighbour.objects.filter(movie_id__in=movie_ids[start:start + 500]).delete()
+    for row in item_matrix.neighbour_rows(rows):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            MovieNeighbour.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    MovieNeighbour.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def invalidate(movie_ids):
+    movie_ids = list(movie_ids)
+    transaction.on_commit(lambda: cache.delete_many([f'similar:{m}' for m in movie_ids]))
+
+
+def claim_stale():
+    """
+    Clear the stale flags and return the movie_ids that had one. Called
+    before the matrix is loaded, so a rating saved while the lists are
+    computed flags its movie again for the next refresh.
+    """
+    with transaction.atomic():
+        stale = list(Movie.objects.select_for_update().filter(
+            neighbours_stale=True
+        ).values_list('movie_id', flat=True))
+        for start in range(0, len(stale), 500):
+            Movie.objects.filter(movie_id__in=stale[start:start + 500]).update(neighbours_stale=False)
+    return stale
+
+
+def restore_stale(movie_ids):
+    """Flag claimed movies again after a failed refresh"""
+    for start in range(0, len(movie_ids), 500):
+        Movie.objects.filter(movie_id__in=movie_ids[start:start + 500]).update(neighbours_stale=True)
+
+
+def rebuild_index(batch_size=5000):
+    """Recompute every movie's list. Returns (movies, neighbour rows stored)."""
+    stale = claim_stale()
+    try:
+        item_matrix = load_matrix()
+        rows = list(range(len(item_matrix.movie_ids)))
+        with transaction.atomic():
+            MovieNeighbour.objects.all().delete()
+            total = write_lists(item_matrix, rows, batch_size)
+            invalidate(int(m) for m in item_matrix.movie_ids)
+    except Exception:
+        restore_stale(stale)
+        raise
+    return len(rows), total
+
+
+def refresh_stale(batch_size=5000):
+    """
+    Recompute the lists that ratings since the last refresh can have changed:
+    those of the stale movies themselves, lists that contain a stale movie,
+    and lists a stale movie may now enter. Returns (movies, rows stored).
+    """
+    stale = claim_stale()
+    if not stale:
+        return 0, 0
+    try:
+        return refresh_lists(stale, batch_size)
+    except Exception:
+        restore_stale(stale)
+        raise
+
+
+def refresh_lists(stale, batch_size):
+    """refresh_stale() for the claimed movie_ids"""
+    item_matrix = load_matrix()
+    if 2 * len(stale) >= len(item_matrix.movie_ids):
+        # Most lists would be recomputed anyway (e.g. after a bulk import)
+        return rebuild_index(batch_size)
+    k = settings.ITEM_NEIGHBOURS_K
+    stale_rows = [item_matrix.movie_index[m] for m in stale if m in item_matrix.movie_index]
+    affected = set(stale)
+    for start in range(0, len(stale), 500):
+        affected.update(MovieNeighbour.objects.filter(
+            neighbour_id__in=stale[start:start + 500]
+        ).values_list('movie_id', flat=True))
+
+    # Movies a stale movie is now similar to, with the best such similarity
+    candidates = {}
+    for start in range(0, len(stale_rows), 500):
+        for _, cols, sims, _ in item_matrix.similarities(stale_rows[start:start + 500]):
+            for j, similarity in zip(cols, sims):
+                movie_id = int(item_matrix.movie_ids[j])
+                if movie_id not in affected:
+                    candidates[movie_id] = max(candidates.get(movie_id, 0.0), float(similarity))
+    # Enter a list that is not full, or beat its weakest entry
+    lengths = {}
+    weakest = {}
+    movie_ids = list(candidates)
+    for start in range(0, len(movie_ids), 500):
+        for movie_id, similarity in MovieNeighbour.objects.filter(
+            movie_id__in=movie_ids[start:start + 500]
+        ).values_list('movie_id', 'similarity'):
+            lengths[movie_id] = lengths.get(movie_id, 0) + 1
+            weakest[movie_id] = min(weakest.get(movie_id, similarity), similarity)
+    for movie_id, similarity in candidates.items():
+        if lengths.get(movie_id, 0) < k or similarity >= weakest[movie_id]:
+            affected.add(movie_id)
+
+    rows = sorted(item_matrix.movie_index[m] for m in affected if m in item_matrix.movie_index)
+    with transaction.atomic():
+        total = write_lists(item_matrix, rows, batch_size)
+        invalidate(affected)
+    return len(rows), total
+
+
+def mark_stale(*movie_pks):
+    """Flag movies whose ratings changed (by primary key)"""
+    Movie.objects.filter(pk__in=movie_pks, neighbours_stale=False).update(neighbours_stale=True)
+
+
+def movie_removed(movie_id):
+    """Drop a deleted movie's list and its entries in other movies' lists"""
+    holders = list(MovieNeighbour.objects.filter(neighbour_id=movie_id).values_list('movie_id', flat=True))
+    MovieNeighbour.objects.filter(movie_id=movie_id).delete()
+    MovieNeighbour.objects.filter(neighbour_id=movie_id).delete()
+    # The holders are one entry short until their next refresh
+    Movie.objects.filter(movie_id__in=holders).update(neighbours_stale=True)
+    invalidate(holders + [movie_id])
+
+
+def index_built():
+    return MovieNeighbour.objects.exists()
+
+
+def neighbour_ids(movie_id):
+    """Cached [(neighbour movie_id, similarity)] of one movie, best first"""
+    key = f'similar:{movie_id}'
+    neighbours = cache.get(key)
+    if neighbours is None:
+        neighbours = list(MovieNeighbour.objects.filter(movie_id=movie_id).values_list('neighbour_id', 'similarity'))
+        cache.set(key, neighbours, CACHE_TIMEOUT)
+    return neighbours
+
+
+def similar_movies(movie, count=6):
+    """The movie's most similar movies, each with a `similarity` attribute"""
+    neighbours = neighbour_ids(movie.movie_id)[:count]
+    movies = Movie.objects.in_bulk([m for m, _ in neighbours], field_name='movie_id')
+    similar = []
+    for movie_id, similarity in neighbours:
+        if movie_id in movies:
+            movies[movie_id].similarity = similarity
+            similar.append(movies[movie_id])
+    return similar
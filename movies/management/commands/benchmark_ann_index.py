@@ -0,0 +1,60 @@
+"""
+Management command to measure the LSH index against the exact similarity scan
+
+Usage:
+    python manage.py benchmark_ann_index
+    python manage.py benchmark_ann_index --bits 10 --tables 12 --probes 3 --k 20
+"""
+import json
+from django.core.management.base import BaseCommand, CommandError
+from movies.ann import benchmark, build_index, get_index
+from movies.py_engine import RatingMatrix
+
+
+class Command(BaseCommand):
+    help = 'Report recall@K, candidate counts and latency of the ANN index vs the exact cosine scan as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10, help='Neighbours compared per query (default: 10)')
+        parser.add_argument('--queries', type=int, default=200, help='Random users queried (default: 200)')
+        parser.add_argument('--probes', type=int, help='Extra buckets probed per table (default: ANN_PROBES)')
+        parser.add_argument(
+            '--bits',
+            type=int,
+            help='Build a fresh index in memory with this many bits instead of loading ANN_INDEX_PATH'
+        )
+        parser.add_argument('--tables', type=int, help='Tables of the in-memory index (default: ANN_TABLES)')
+        parser.add_argument(
+            '--vectors',
+            choices=['mf', 'ratings'],
+            help='Vectors of the in-memory index (default: ANN_VECTORS)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--output', help='Also write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['k'] < 1 or options['queries'] < 1:
+            raise CommandError('--k and --queries must be at least 1')
+
+        matrix = RatingMatrix.from_database()
+        if matrix.ratings.nnz == 0:
+            raise CommandError('There are no ratings to benchmark on')
+        try:
+            if options['bits'] or options['tables'] or options['vectors']:
+                index = build_index(
+                    matrix, bits=options['bits'], tables=options['tables'],
+                    seed=options['seed'], space=options['vectors'],
+                )
+            else:
+                index = get_index()
+            report = benchmark(
+                index, matrix, k=options['k'], queries=options['queries'],
+                probes=options['probes'], seed=options['seed'],
+            )
+        except Exception as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(json.dumps(report, indent=2))
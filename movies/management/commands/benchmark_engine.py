@@ -0,0 +1,65 @@
+"""
+Management command to benchmark CSV sync and the C engine on synthetic data
+"""
+import json
+from django.core.management.base import BaseCommand, CommandError
+from movies import benchmark
+from movies.c_engine import CRecommendationEngine
+
+
+class Command(BaseCommand):
+    help = 'Time CSVSync.sync_all and c_interface recommend/add_rating on a synthetic dataset; reports JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Synthetic users (default: 1000)')
+        parser.add_argument('--movies', type=int, default=500, help='Synthetic movies (default: 500)')
+        parser.add_argument(
+            '--density',
+            type=float,
+            default=0.02,
+            help='Fraction of movies each user rates on average (default: 0.02)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per stage (default: 20)')
+        parser.add_argument(
+            '--stages',
+            default=','.join(benchmark.STAGES),
+            help=f'Comma-separated stages (default: {",".join(benchmark.STAGES)})'
+        )
+        parser.add_argument('--output', help='Also write the report to this JSON file')
+        parser.add_argument('--baseline', help='Compare against a report saved earlier')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed p95 increase over the baseline before flagging a regression (default: 0.2)'
+        )
+
+    def handle(self, *args, **options):
+        stages = [stage.strip() for stage in options['stages'].split(',') if stage.strip()]
+        unknown = set(stages) - set(benchmark.STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(sorted(unknown))}")
+        
+        dataset = benchmark.SyntheticDataset(
+            options['users'], options['movies'], options['density'], seed=options['seed']
+        )
+        self.stderr.write(f"Benchmarking {', '.join(stages)} on {json.dumps(dataset.describe())}...")
+        report = benchmark.run_benchmarks(
+            dataset, stages, options['runs'], executable=CRecommendationEngine().executable
+        )
+        
+        regressions = {}
+        if options['baseline']:
+            baseline = benchmark.load_report(options['baseline'])
+            if baseline.get('dataset') != report['dataset']:
+                self.stderr.write(self.style.WARNING('Baseline was recorded on a different dataset'))
+            regressions = benchmark.compare_to_baseline(report, baseline, options['tolerance'])
+            report['regressions'] = regressions
+        
+        if options['output']:
+            benchmark.save_report(report, options['output'])
+        self.stdout.write(json.dumps(report, indent=2))
+        
+        if regressions:
+            raise CommandError(f"p95 regressions beyond {options['tolerance']:.0%}: {', '.join(regressions)}")
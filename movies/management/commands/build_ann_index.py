@@ -0,0 +1,49 @@
+"""
+Management command to build the LSH candidate index used with RECOMMENDATION_ANN_INDEX
+
+Usage:
+    python manage.py build_ann_index
+    python manage.py build_ann_index --bits 10 --tables 12 --vectors ratings
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from movies.ann import build_index
+from movies.py_engine import RatingMatrix
+
+
+class Command(BaseCommand):
+    help = 'Hash every user into random-projection LSH tables and save the index to ANN_INDEX_PATH'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bits', type=int, help='Hash bits per table (default: ANN_BITS)')
+        parser.add_argument('--tables', type=int, help='Hash tables (default: ANN_TABLES)')
+        parser.add_argument(
+            '--vectors',
+            choices=['mf', 'ratings'],
+            help='Hash users by model factors or raw rating rows (default: ANN_VECTORS)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--output', help='Index file (default: ANN_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Loading ratings...')
+        matrix = RatingMatrix.from_database()
+        if len(matrix.user_ids) == 0:
+            raise CommandError('There are no users to index')
+
+        started = time.monotonic()
+        try:
+            index = build_index(
+                matrix, bits=options['bits'], tables=options['tables'],
+                seed=options['seed'], space=options['vectors'],
+            )
+        except Exception as e:
+            raise CommandError(str(e))
+        path = options['output'] or settings.ANN_INDEX_PATH
+        index.save(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.user_ids)} users by {index.space} vectors in {index.tables} tables '
+            f'of {index.bits} bits to {path} in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,25 @@
+"""
+Management command to compile ratings.csv into the C engine's binary snapshot
+"""
+import time
+from django.core.management.base import BaseCommand
+from movies.c_engine import CSVSync
+
+
+class Command(BaseCommand):
+    help = 'Write ratings.bin, the memory-mapped ratings snapshot read by the C engine'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Building ratings snapshot...')
+        
+        try:
+            # The snapshot is compiled from ratings.csv, so bring it up to date first
+            CSVSync.sync_changes()
+            started = time.monotonic()
+            ratings = CSVSync.export_ratings_snapshot()
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {CSVSync.SNAPSHOT_FILE} with {ratings} ratings in {elapsed:.1f}s'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error building snapshot: {e}'))
@@ -0,0 +1,34 @@
+"""
+Management command to precompute the fallback rankings served to users the
+recommendation engines have no collaborative signal for
+
+Usage:
+    python manage.py compute_fallback_rankings
+    python manage.py compute_fallback_rankings --size 100
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from movies import fallback
+
+
+class Command(BaseCommand):
+    help = 'Compute Bayesian-averaged top movies overall, per genre and per age bucket'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            help='Movies kept per ranking (default: FALLBACK_RANKING_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Computing fallback rankings...')
+        started = time.monotonic()
+        rankings = fallback.rebuild(size=options['size'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {rankings} rankings of up to {options["size"] or settings.FALLBACK_RANKING_SIZE} movies '
+            f'(prior of {settings.FALLBACK_PRIOR_RATINGS:g} ratings) in {elapsed:.1f}s'
+        ))
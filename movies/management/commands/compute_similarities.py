@@ -0,0 +1,37 @@
+"""
+Management command to precompute the user-user similarity store
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from movies.similarity import rebuild_store
+
+
+class Command(BaseCommand):
+    help = 'Compute pairwise user similarities and top-K neighbour lists for the recommendation engines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.RECOMMENDATION_SIMILARITY_STORE:
+            self.stdout.write(self.style.WARNING(
+                'RECOMMENDATION_SIMILARITY_STORE is off: the store will be built '
+                'but the engines will not read it and neighbours.csv is not written'
+            ))
+        
+        self.stdout.write('Computing user similarities...')
+        started = time.monotonic()
+        pairs, neighbours = rebuild_store(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {pairs} similarity pairs and {neighbours} neighbour links '
+            f'(K={settings.RECOMMENDATION_NEIGHBOURS_K}, '
+            f'min similarity {settings.RECOMMENDATION_MIN_SIMILARITY}) in {elapsed:.1f}s'
+        ))
@@ -5,27 +5,26 @@ Usage:
     python manage.py fetch_posters --api-key YOUR_TMDB_API_KEY
     python manage.py fetch_posters --api-key YOUR_KEY --limit 10  # Test with 10 movies
     python manage.py fetch_posters --api-key YOUR_KEY --force     # Re-download all
+    python manage.py fetch_posters --api-key test --api-base http://localhost:8001/3  # Stub server
+
+Interrupted runs resume from the checkpoint in POSTER_CACHE_DIR; --restart
+forgets it (search results stay cached).
 """
 
-import time
-import requests
-from pathlib import Path
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from movies.models import Movie
+from movies.posters import PosterFetcher, DOWNLOADED, MISSING, FAILED
 
 
 class Command(BaseCommand):
     help = 'Fetch movie posters from TMDB API'
-    
-    TMDB_API_BASE = "https://api.themoviedb.org/3"
-    TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
-    
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--api-key',
-            required=True,
-            help='TMDB API key (get free at themoviedb.org/settings/api)'
+            default=settings.TMDB_API_KEY,
+            help='TMDB API key (get free at themoviedb.org/settings/api; default: TMDB_API_KEY)'
         )
         parser.add_argument(
             '--limit',
@@ -37,81 +36,54 @@ class Command(BaseCommand):
             action='store_true',
             help='Re-download existing posters'
         )
-    
-    def search_movie(self, api_key, title, year):
-        """Search TMDB for a movie"""
-        url = f"{self.TMDB_API_BASE}/search/movie"
-        params = {"api_key": api_key, "query": title, "year": year}
-        
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data["results"][0] if data.get("results") else None
-        except Exception as e:
-            self.stdout.write(f"  Error: {e}")
-            return None
-    
-    def download_poster(self, poster_path, save_path):
-        """Download poster image"""
-        url = f"{self.TMDB_IMAGE_BASE}{poster_path}"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            with open(save_path, 'wb') as f:
-                f.write(response.content)
-            return True
-        except Exception as e:
-            self.stdout.write(f"  Error: {e}")
-            return False
-    
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint of an earlier run'
+        )
+        parser.add_argument('--workers', type=int, help='Concurrent requests (default: POSTER_FETCH_WORKERS)')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='TMDB API requests per second (default: TMDB_REQUESTS_PER_SECOND)'
+        )
+        parser.add_argument('--api-base', help='TMDB API base URL (default: TMDB_API_BASE)')
+        parser.add_argument('--image-base', help='TMDB image base URL (default: TMDB_IMAGE_BASE)')
+        parser.add_argument('--cache-dir', help='Search cache and checkpoint directory (default: POSTER_CACHE_DIR)')
+
     def handle(self, *args, **options):
-        api_key = options['api_key']
-        limit = options.get('limit')
-        force = options.get('force', False)
-        
-        # Create posters directory
-        posters_dir = Path(settings.BASE_DIR) / 'media' / 'posters'
-        posters_dir.mkdir(parents=True, exist_ok=True)
-        
-        movies = Movie.objects.all()
-        if limit:
-            movies = movies[:limit]
-        
-        total = movies.count()
-        success = skipped = failed = 0
-        
-        self.stdout.write(f"\nFetching posters for {total} movies...\n")
-        
-        for i, movie in enumerate(movies, 1):
-            self.stdout.write(f"[{i}/{total}] {movie.title} ({movie.year})")
-            
-            if not force and movie.poster:
-                self.stdout.write("  Skipped (exists)")
-                skipped += 1
-                continue
-            
-            tmdb_movie = self.search_movie(api_key, movie.title, movie.year)
-            
-            if not tmdb_movie or not tmdb_movie.get("poster_path"):
-                self.stdout.write("  No poster found")
-                failed += 1
-                continue
-            
-            poster_filename = f"{movie.movie_id}.jpg"
-            save_path = posters_dir / poster_filename
-            
-            if self.download_poster(tmdb_movie["poster_path"], save_path):
-                movie.poster = f"posters/{poster_filename}"
-                movie.save()
-                self.stdout.write(self.style.SUCCESS("  ✓ Downloaded"))
-                success += 1
-            else:
-                failed += 1
-            
-            time.sleep(0.3)  # Rate limiting
-        
+        if not options['api_key']:
+            raise CommandError('Pass --api-key or set TMDB_API_KEY')
+
+        fetcher = PosterFetcher(
+            options['api_key'],
+            api_base=options['api_base'],
+            image_base=options['image_base'],
+            workers=options['workers'],
+            rate=options['rate'],
+            cache_dir=options['cache_dir'],
+            report=self.stdout.write,
+        )
+        if options['restart']:
+            fetcher.checkpoint.entries = {}
+
+        movies = Movie.objects.order_by('movie_id')
+        if not options['force']:
+            movies = movies.filter(poster='') | movies.filter(poster__isnull=True)
+        if options['limit']:
+            movies = movies[:options['limit']]
+        rows = list(movies.values_list('movie_id', 'title', 'year'))
+
+        try:
+            counts = fetcher.run(rows, force=options['force'])
+        finally:
+            # Whatever finished, including after Ctrl+C, reaches the database
+            updated = fetcher.save_posters()
+            self.stdout.write(f"Saved poster paths for {updated} movies")
+
         self.stdout.write(self.style.SUCCESS(
-            f"\nDone: {success} downloaded, {skipped} skipped, {failed} failed"
+            f"\nDone: {counts[DOWNLOADED]} downloaded, {counts[MISSING]} not on TMDB, "
+            f"{counts[FAILED]} failed, {counts['resumed']} already done"
         ))
+        if counts[FAILED]:
+            self.stdout.write('Run the command again to retry the failed movies')
@@ -94,7 +94,7 @@ class Command(BaseCommand):
             
             # Create profile
             age = random.randint(18, 65)
-            profile = UserProfile.objects.create(
+            UserProfile.objects.create(
                 user=user,
                 c_user_id=next_user_id,
                 age=age
@@ -120,21 +120,6 @@ class Command(BaseCommand):
                 )
                 rating_count += 1
             
-            # Update profile stats
-            user_ratings = Rating.objects.filter(user=user)
-            profile.ratings_count = user_ratings.count()
-            if profile.ratings_count > 0:
-                profile.avg_rating_given = sum(r.rating for r in user_ratings) / profile.ratings_count
-            profile.save()
-            
-            # Update movie stats
-            for movie in rated_movies:
-                movie_ratings = Rating.objects.filter(movie=movie)
-                movie.rating_count = movie_ratings.count()
-                if movie.rating_count > 0:
-                    movie.avg_rating = sum(r.rating for r in movie_ratings) / movie.rating_count
-                movie.save()
-            
             if (i + 1) % 10 == 0:
                 self.stdout.write(f'Created {i + 1}/{num_users} users...')
         
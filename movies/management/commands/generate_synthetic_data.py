@@ -0,0 +1,130 @@
+"""
+Management command to generate large, skewed synthetic rating data for load tests
+"""
+import csv
+import os
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from movies import importer, synthetic
+from movies.c_engine import CSVSync, atomic_write
+from movies.models import Movie, UserProfile, Rating
+
+
+class Command(BaseCommand):
+    help = 'Generate users and power-law distributed ratings with a process pool and bulk writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Users to generate (default: 10000)')
+        parser.add_argument('--min-ratings', type=int, default=5, help='Fewest ratings per user (default: 5)')
+        parser.add_argument('--max-ratings', type=int, default=500, help='Most ratings per user (default: 500)')
+        parser.add_argument(
+            '--popularity-exponent',
+            type=float,
+            default=1.0,
+            help='Zipf exponent of movie popularity; higher means hotter top movies (default: 1.0)'
+        )
+        parser.add_argument(
+            '--activity-exponent',
+            type=float,
+            default=1.5,
+            help='Power-law exponent of ratings per user; higher means fewer heavy raters (default: 1.5)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Generator processes (default: CPU count)'
+        )
+        parser.add_argument('--block-size', type=int, default=5000, help='Users per generated block (default: 5000)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per bulk insert (default: 10000)')
+        parser.add_argument('--username-prefix', default='synth', help='Usernames are this prefix plus the user id')
+        parser.add_argument(
+            '--output-dir',
+            help='Write movies/users/ratings CSVs here instead of the database (load import_dataset or the engine)'
+        )
+        parser.add_argument(
+            '--skip-sync',
+            action='store_true',
+            help='Do not export the CSV files for the C engine afterwards'
+        )
+
+    def handle(self, *args, **options):
+        movies = list(Movie.objects.order_by('movie_id').values_list('pk', 'movie_id'))
+        if not movies:
+            raise CommandError('No movies found! Import movies first.')
+        movie_pks = [pk for pk, _ in movies]
+        movie_ids = [movie_id for _, movie_id in movies]
+
+        # Above every movie id too: the C engine keeps users and movies in one graph
+        highest = max(UserProfile.objects.aggregate(m=Max('c_user_id'))['m'] or 0, movie_ids[-1])
+        first_id = highest + 1
+
+        model = synthetic.PopularityModel(
+            len(movies), options['popularity_exponent'], options['activity_exponent'],
+            options['min_ratings'], options['max_ratings'], seed=options['seed']
+        )
+        blocks = synthetic.generate(
+            model, options['users'], options['block_size'], options['workers'], seed=options['seed']
+        )
+        self.stdout.write(
+            f"Generating {options['users']:,} users over {len(movies):,} movies "
+            f"with {options['workers']} workers (seed {options['seed']})..."
+        )
+
+        if options['output_dir']:
+            progress = self.write_csv(Path(options['output_dir']), blocks, first_id, movie_ids, options)
+            self.stdout.write(self.style.SUCCESS(progress.summary()))
+            return
+
+        progress = importer.Progress('ratings', self.stdout.write)
+        rated = set()
+        for start, ages, users, block_movies, ratings in blocks:
+            c_user_ids = [first_id + start + i for i in range(len(ages))]
+            with transaction.atomic():
+                user_pks = importer.create_users(dict(zip(c_user_ids, ages.tolist())), options['username_prefix'])
+                block_user_pks = [user_pks[c_user_id] for c_user_id in c_user_ids]
+                Rating.objects.bulk_create(
+                    [
+                        Rating(user_id=block_user_pks[u], movie_id=movie_pks[m], rating=r)
+                        for u, m, r in zip(users.tolist(), block_movies.tolist(), ratings.tolist())
+                    ],
+                    batch_size=options['batch_size'],
+                )
+            rated.update(c_user_ids)
+            progress.add(len(ratings))
+        progress.done()
+
+        self.stdout.write('Rebuilding rating aggregates and genre facets...')
+        importer.finish(rated)
+        if not options['skip_sync']:
+            self.stdout.write('Exporting CSV files for the C engine...')
+            CSVSync.sync_all()
+        self.stdout.write(self.style.SUCCESS(f'{len(rated):,} users, {progress.summary()}'))
+
+    def write_csv(self, directory, blocks, first_id, movie_ids, options):
+        """The engine's three CSV files, streamed block by block"""
+        directory.mkdir(parents=True, exist_ok=True)
+        CSVSync.export_movies(directory / CSVSync.FILES['movies'][0])
+
+        progress = importer.Progress('ratings', self.stdout.write)
+        with atomic_write(directory / CSVSync.FILES['users'][0]) as users_file, \
+                atomic_write(directory / CSVSync.FILES['ratings'][0]) as ratings_file:
+            users_writer = csv.writer(users_file)
+            ratings_writer = csv.writer(ratings_file)
+            users_writer.writerow(CSVSync.FILES['users'][1])
+            ratings_writer.writerow(CSVSync.FILES['ratings'][1])
+            for start, ages, users, block_movies, ratings in blocks:
+                block_first = first_id + start
+                users_writer.writerows(
+                    (block_first + i, f"{options['username_prefix']}{block_first + i}", age)
+                    for i, age in enumerate(ages.tolist())
+                )
+                ratings_writer.writerows(
+                    (block_first + u, movie_ids[m], r)
+                    for u, m, r in zip(users.tolist(), block_movies.tolist(), ratings.tolist())
+                )
+                progress.add(len(ratings))
+        return progress.done()
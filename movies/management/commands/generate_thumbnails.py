@@ -0,0 +1,35 @@
+"""
+Management command to build poster thumbnails ahead of time
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from movies import thumbnails
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Build the WebP poster thumbnails for every movie whose thumbnails are missing or stale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild thumbnails that are already current')
+        parser.add_argument('--workers', type=int, default=4, help='Posters resized in parallel (default: 4)')
+
+    def handle(self, *args, **options):
+        movies = [
+            movie for movie in Movie.objects.exclude(poster='').exclude(poster__isnull=True).order_by('movie_id')
+            if options['force'] or not thumbnails.is_current(movie)
+        ]
+        self.stdout.write(f'Building thumbnails for {len(movies)} posters...')
+
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for movie, ok in zip(movies, pool.map(thumbnails.refresh, movies)):
+                if ok:
+                    built += 1
+                else:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'  Could not read poster for {movie.title}'))
+                if (built + failed) % 100 == 0:
+                    self.stdout.write(f'  {built + failed}/{len(movies)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Built thumbnails for {built} posters ({failed} failed)'))
@@ -0,0 +1,104 @@
+"""
+Management command to bulk-import movies, users and ratings (native or MovieLens files)
+"""
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from movies import importer
+from movies.c_engine import CSVSync
+
+KINDS = ('movies', 'users', 'ratings')
+EXTENSIONS = ('.csv', '.csv.gz', '.dat', '.dat.gz')
+
+
+class Command(BaseCommand):
+    help = 'Stream movies/users/ratings files into the database with batched upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            nargs='?',
+            help='Dataset directory holding movies/users/ratings .csv or .dat files (e.g. an unpacked ml-25m)'
+        )
+        for kind in KINDS:
+            parser.add_argument(f'--{kind}', help=f'Path to the {kind} file (overrides the directory)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows per upsert and transaction (default: 10000)'
+        )
+        parser.add_argument(
+            '--user-id-offset',
+            type=int,
+            default=0,
+            help='Added to every user id; the C engine needs user ids distinct from movie ids (default: 0)'
+        )
+        parser.add_argument(
+            '--username-prefix',
+            default='user',
+            help='Username for imported users is this prefix plus their id (default: user)'
+        )
+        parser.add_argument(
+            '--default-age',
+            type=int,
+            default=importer.DEFAULT_AGE,
+            help=f'Age for raters missing from the users file (default: {importer.DEFAULT_AGE})'
+        )
+        parser.add_argument(
+            '--skip-sync',
+            action='store_true',
+            help='Do not export the CSV files for the C engine afterwards'
+        )
+
+    def find(self, options, kind):
+        if options[kind]:
+            path = Path(options[kind])
+            if not path.exists():
+                raise CommandError(f'{path} does not exist')
+            return path
+        if options['directory']:
+            for extension in EXTENSIONS:
+                path = Path(options['directory']) / f'{kind}{extension}'
+                if path.exists():
+                    return path
+        return None
+
+    def handle(self, *args, **options):
+        paths = {kind: self.find(options, kind) for kind in KINDS}
+        if not any(paths.values()):
+            raise CommandError('Nothing to import: give a dataset directory or --movies/--users/--ratings')
+
+        batch_size = options['batch_size']
+        report = self.stdout.write
+        results = []
+        rated = set()
+
+        if paths['movies']:
+            self.stdout.write(f"Importing movies from {paths['movies']}...")
+            results.append(importer.import_movies(paths['movies'], batch_size, report=report))
+        if paths['users']:
+            self.stdout.write(f"Importing users from {paths['users']}...")
+            results.append(importer.import_users(
+                paths['users'], batch_size, options['user_id_offset'], options['username_prefix'], report=report
+            ))
+        if paths['ratings']:
+            self.stdout.write(f"Importing ratings from {paths['ratings']}...")
+            progress, rated = importer.import_ratings(
+                paths['ratings'], batch_size, options['user_id_offset'], options['username_prefix'],
+                options['default_age'], report=report
+            )
+            results.append(progress)
+
+        self.stdout.write('Rebuilding rating aggregates and genre facets...')
+        importer.finish(rated)
+        if not options['skip_sync']:
+            self.stdout.write('Exporting CSV files for the C engine...')
+            CSVSync.sync_all()
+
+        for progress in results:
+            self.stdout.write(self.style.SUCCESS(progress.summary()))
+        if rated:
+            self.stdout.write(
+                'Run compute_similarities and precompute_recommendations if you use the similarity store '
+                'or precomputed recommendations'
+            )
@@ -0,0 +1,80 @@
+"""
+Management command to precompute recommendations for every user
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from movies.models import Movie, UserProfile, PrecomputedRecommendation
+from movies.c_engine import CSVSync
+from movies.backends import get_engine
+from movies import metrics
+
+
+class Command(BaseCommand):
+    help = 'Fill the PrecomputedRecommendation table for every user profile in one engine pass per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=10,
+            help='Recommendations per user (default: 10)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Users per engine call and per transaction (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        batch_size = options['batch_size']
+        
+        engine = get_engine(cached=False)
+        if engine.uses_csv_files:
+            CSVSync.sync_changes()
+        
+        user_ids = list(UserProfile.objects.order_by('c_user_id').values_list('c_user_id', flat=True))
+        movie_pks = dict(Movie.objects.values_list('movie_id', 'pk'))
+        self.stdout.write(f'Precomputing {count} recommendations for {len(user_ids)} users...')
+        
+        started = time.monotonic()
+        stored = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch_ids = user_ids[start:start + batch_size]
+            batch = engine.get_recommendations_batch(batch_ids, count)
+            
+            rows = []
+            for user_id in batch_ids:
+                rank = 0
+                for rec in batch.get(user_id, []):
+                    movie_pk = movie_pks.get(rec['movie_id'])
+                    if movie_pk is None:
+                        continue
+                    rank += 1
+                    rows.append(PrecomputedRecommendation(
+                        user_id=user_id,
+                        rank=rank,
+                        movie_id=movie_pk,
+                        predicted_rating=rec['predicted_rating'],
+                        reason=rec.get('reason', '')[:200],
+                    ))
+            
+            with transaction.atomic():
+                PrecomputedRecommendation.objects.filter(user_id__in=batch_ids).delete()
+                PrecomputedRecommendation.objects.bulk_create(rows)
+            stored += len(rows)
+            self.stdout.write(f'  {min(start + batch_size, len(user_ids))}/{len(user_ids)} users')
+        
+        # Profiles removed since the last run
+        PrecomputedRecommendation.objects.exclude(
+            user_id__in=UserProfile.objects.values('c_user_id')
+        ).delete()
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} recommendations for {len(user_ids)} users in {elapsed:.1f}s'
+        ))
+        for line in metrics.stage_summary():
+            self.stdout.write(f'  {line}')
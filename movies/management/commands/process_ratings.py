@@ -0,0 +1,61 @@
+"""
+Management command to run the rating ingestion worker
+"""
+import time
+from django.core.management.base import BaseCommand
+from movies.ingestion import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply queued ratings (RatingOutbox) in batches; runs until interrupted unless --once is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Ratings applied per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty (default: 1.0)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write('Processing queued ratings...')
+        
+        total = 0
+        try:
+            while True:
+                try:
+                    started = time.monotonic()
+                    processed = process_batch(batch_size)
+                except Exception as e:
+                    # A failed batch rolls back and stays queued; if the ratings were
+                    # committed and a refresh step failed, the users stay in
+                    # PendingRefresh. Either way the next pass retries after a pause
+                    self.stdout.write(self.style.ERROR(f'Error applying ratings: {e}'))
+                    processed = 0
+                    if options['once']:
+                        break
+                else:
+                    if processed:
+                        total += processed
+                        elapsed = time.monotonic() - started
+                        self.stdout.write(f'  applied {processed} ratings in {elapsed:.2f}s')
+                    elif options['once']:
+                        break
+                if not processed:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS(f'Applied {total} queued ratings'))
@@ -0,0 +1,14 @@
+"""
+Management command to rebuild the rating aggregates on movies and profiles
+"""
+from django.core.management.base import BaseCommand
+from movies.aggregates import recompute_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating count/sum/average for every movie and user profile from the ratings table'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recomputing rating aggregates...')
+        movies, profiles = recompute_all()
+        self.stdout.write(self.style.SUCCESS(f'Corrected {movies} movies and {profiles} user profiles'))
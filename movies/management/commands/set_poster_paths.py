@@ -4,46 +4,42 @@ Use this on production (Render) after deploying the poster files.
 
 Usage:
     python manage.py set_poster_paths
+    python manage.py set_poster_paths --dry-run        # Report without writing to movies
+    python manage.py set_poster_paths --clear-missing  # Also unset posters whose file is gone
+
+Poster files are listed from MEDIA_ROOT/posters, or from the bucket when
+USE_S3 is set, into the PosterManifest table; only new or changed local
+files are hashed. Movies are then updated from the manifest in one bulk_update.
 """
 
-import os
-from pathlib import Path
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from movies.models import Movie
+from movies import manifest
 
 
 class Command(BaseCommand):
-    help = 'Set poster paths for movies that have poster files on disk'
-    
+    help = 'Set poster paths for movies that have poster files in storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing anything'
+        )
+        parser.add_argument(
+            '--clear-missing',
+            action='store_true',
+            help='Clear the poster of movies whose poster file no longer exists'
+        )
+
     def handle(self, *args, **options):
-        posters_dir = Path(settings.MEDIA_ROOT) / 'posters'
-        
-        if not posters_dir.exists():
-            self.stdout.write(self.style.ERROR(f"Posters directory not found: {posters_dir}"))
-            return
-        
-        # Get all poster files
-        poster_files = set()
-        for f in posters_dir.iterdir():
-            if f.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp']:
-                # Extract movie_id from filename (e.g., "28.jpg" -> 28)
-                try:
-                    movie_id = int(f.stem)
-                    poster_files.add(movie_id)
-                except ValueError:
-                    pass
-        
-        self.stdout.write(f"Found {len(poster_files)} poster files on disk")
-        
-        updated = 0
-        for movie in Movie.objects.all():
-            if movie.movie_id in poster_files:
-                poster_path = f"posters/{movie.movie_id}.jpg"
-                if not movie.poster or str(movie.poster) != poster_path:
-                    movie.poster = poster_path
-                    movie.save()
-                    updated += 1
-                    self.stdout.write(f"  Set poster for: {movie.title}")
-        
-        self.stdout.write(self.style.SUCCESS(f"\nUpdated {updated} movies with poster paths"))
+        counts = manifest.reconcile(clear_missing=options['clear_missing'], dry_run=options['dry_run'])
+
+        self.stdout.write(f"Found {counts['files']} poster files in storage")
+        prefix = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{prefix} {counts['set']} movies with poster paths, "
+            f"{counts['refreshed']} with changed poster files, "
+            f"{counts['cleared']} with missing poster files cleared"
+        ))
+        if not options['dry_run']:
+            self.stdout.write(f"Built thumbnails for {counts['thumbnails']} posters")
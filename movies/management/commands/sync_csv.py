@@ -3,16 +3,45 @@ Management command to sync Django data to CSV files for C engine
 """
 from django.core.management.base import BaseCommand
 from movies.c_engine import CSVSync
+from movies import metrics
 
 
 class Command(BaseCommand):
     help = 'Sync Django models to CSV files for C recommendation engine'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--changes-only',
+            action='store_true',
+            help='Apply only rows changed since the last sync instead of a full export'
+        )
+        parser.add_argument(
+            '--output-dir',
+            help='Write movies/users/ratings CSVs to this directory instead of the engine files'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='With --output-dir, write gzip-compressed .csv.gz files'
+        )
+
     def handle(self, *args, **options):
+        if options['output_dir']:
+            paths = CSVSync.export_to(options['output_dir'], compress=options['gzip'])
+            for path in paths:
+                self.stdout.write(f'  {path} ({path.stat().st_size:,} bytes)')
+            self.stdout.write(self.style.SUCCESS(f"Exported {len(paths)} files to {options['output_dir']}"))
+            return
+        
         self.stdout.write('Syncing data to CSV files...')
         
         try:
-            CSVSync.sync_all()
+            if options['changes_only']:
+                CSVSync.sync_changes()
+            else:
+                CSVSync.sync_all()
             self.stdout.write(self.style.SUCCESS('Successfully synced all data to CSV files'))
+            for line in metrics.stage_summary():
+                self.stdout.write(f'  {line}')
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error syncing data: {e}'))
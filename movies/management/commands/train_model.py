@@ -0,0 +1,81 @@
+"""
+Management command to train the matrix-factorization model for the 'mf' backend
+
+Usage:
+    python manage.py train_model
+    python manage.py train_model --factors 64 --iterations 20 --validation 0.1
+"""
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from movies.ann import LSHIndex, build_index
+from movies.mf import train
+from movies.py_engine import RatingMatrix
+
+
+class Command(BaseCommand):
+    help = 'Learn user and movie latent factors from the ratings with ALS and save a new model version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, help='Latent factors (default: MF_FACTORS)')
+        parser.add_argument(
+            '--regularization',
+            type=float,
+            help='L2 weight, scaled by each user\'s or movie\'s rating count (default: MF_REGULARIZATION)'
+        )
+        parser.add_argument('--iterations', type=int, help='ALS sweeps (default: MF_ITERATIONS)')
+        parser.add_argument(
+            '--validation',
+            type=float,
+            default=0.0,
+            help='Fraction of ratings held out to report validation RMSE (default: 0)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--output-dir', help='Model directory (default: MF_MODEL_DIR)')
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=3,
+            help='Model versions to keep, including the new one (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        if not 0.0 <= options['validation'] < 1.0:
+            raise CommandError('--validation must be in [0, 1)')
+        if options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+
+        self.stdout.write('Loading ratings...')
+        matrix = RatingMatrix.from_database()
+        if matrix.ratings.nnz == 0:
+            raise CommandError('There are no ratings to train on')
+        self.stdout.write(
+            f'Training on {matrix.ratings.nnz} ratings from {len(matrix.user_ids)} users '
+            f'and {len(matrix.movie_ids)} movies...'
+        )
+        started = time.monotonic()
+        model = train(
+            matrix,
+            factors=options['factors'],
+            regularization=options['regularization'],
+            iterations=options['iterations'],
+            validation=options['validation'],
+            seed=options['seed'],
+            report=self.stdout.write,
+        )
+        elapsed = time.monotonic() - started
+        path = model.save(options['output_dir'] or settings.MF_MODEL_DIR, keep=options['keep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved model {model.version} ({model.params["factors"]} factors) to {path} in {elapsed:.1f}s'
+        ))
+
+        # An ANN index hashed by the previous model's factors no longer matches
+        if not options['output_dir'] and os.path.exists(settings.ANN_INDEX_PATH):
+            index = LSHIndex.load(settings.ANN_INDEX_PATH)
+            if index.space == 'mf':
+                build_index(
+                    matrix, bits=index.bits, tables=index.tables, seed=index.params.get('seed', 0), space='mf'
+                ).save(settings.ANN_INDEX_PATH)
+                self.stdout.write(self.style.SUCCESS(f'Rebuilt ANN index {settings.ANN_INDEX_PATH}'))
@@ -0,0 +1,152 @@
+"""
+Poster manifest
+PosterManifest mirrors the poster files in media storage: one row per movie
+with the file's actual name, size and content hash. scan() lists the
+storage (MEDIA_ROOT/posters locally, the bucket prefix on S3 when USE_S3)
+and only hashes local files whose size or mtime changed. reconcile() diffs
+the manifest against the Movie table, writes every difference with one
+bulk_update and rebuilds the thumbnails of the movies it changed.
+"""
+import hashlib
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from . import thumbnails
+from .models import Movie, PosterManifest
+
+POSTER_DIR = 'posters'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# "28.png", or "28_AbC12xY.jpg" when Django renamed an upload to avoid a clash
+POSTER_NAME = re.compile(r'^(\d+)(?:_[A-Za-z0-9]+)?$')
+
+
+def poster_movie_id(name):
+    """movie_id a poster file belongs to, or None"""
+    path = Path(name)
+    if path.suffix.lower() not in IMAGE_EXTENSIONS:
+        return None
+    match = POSTER_NAME.match(path.stem)
+    return int(match.group(1)) if match else None
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_local(known):
+    """(name, size, content hash, modified) for each poster under MEDIA_ROOT"""
+    directory = Path(settings.MEDIA_ROOT) / POSTER_DIR
+    if not directory.exists():
+        return
+    for path in directory.iterdir():
+        if not path.is_file() or poster_movie_id(path.name) is None:
+            continue
+        stat = path.stat()
+        name = f'{POSTER_DIR}/{path.name}'
+        modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        entry = known.get(name)
+        if entry is not None and entry.size == stat.st_size and entry.modified == modified:
+            content_hash = entry.content_hash  # unchanged: skip re-reading it
+        else:
+            content_hash = file_hash(path)
+        yield name, stat.st_size, content_hash, modified
+
+
+def list_s3(known):
+    """(name, size, ETag, modified) for each poster in the bucket, from the listing alone"""
+    from storages.backends.s3boto3 import S3Boto3Storage
+
+    storage = S3Boto3Storage()
+    prefix = f"{storage.location.strip('/')}/" if storage.location else ''
+    for obj in storage.bucket.objects.filter(Prefix=f'{prefix}{POSTER_DIR}/'):
+        name = obj.key[len(prefix):]
+        if poster_movie_id(name) is None:
+            continue
+        yield name, obj.size, obj.e_tag.strip('"'), obj.last_modified
+
+
+def scan(dry_run=False):
+    """
+    Refresh PosterManifest from storage. When a movie has several files
+    the newest wins; with `dry_run` the table is left alone. Returns
+    ({movie_id: entry} now, {movie_id: entry} before).
+    """
+    existing = {entry.movie_id: entry for entry in PosterManifest.objects.all()}
+    known = {entry.path: entry for entry in existing.values()}
+    listing = list_s3(known) if settings.USE_S3 else list_local(known)
+
+    found = {}
+    for name, size, content_hash, modified in listing:
+        movie_id = poster_movie_id(name)
+        current = found.get(movie_id)
+        if current is None or (modified, name) > (current.modified, current.path):
+            found[movie_id] = PosterManifest(
+                movie_id=movie_id, path=name, size=size, content_hash=content_hash, modified=modified
+            )
+
+    def fields(entry):
+        return entry.path, entry.size, entry.content_hash, entry.modified
+
+    changed = [
+        entry for movie_id, entry in found.items()
+        if movie_id not in existing or fields(existing[movie_id]) != fields(entry)
+    ]
+    if dry_run:
+        return found, existing
+    with transaction.atomic():
+        PosterManifest.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['movie_id'],
+            update_fields=['path', 'size', 'content_hash', 'modified'],
+            batch_size=1000,
+        )
+        gone = [movie_id for movie_id in existing if movie_id not in found]
+        for start in range(0, len(gone), 500):
+            PosterManifest.objects.filter(movie_id__in=gone[start:start + 500]).delete()
+    return found, existing
+
+
+def reconcile(clear_missing=False, dry_run=False):
+    """
+    Point every Movie at the poster file the manifest found for it. A poster
+    whose content changed under the same name has its thumbnails marked
+    stale. The thumbnails of every changed movie are then rebuilt (and the
+    old files deleted), since bulk_update sends no post_save.
+    With `clear_missing`, movies whose poster file is gone lose it. With
+    `dry_run` nothing is written. Returns
+    {'set': n, 'refreshed': n, 'cleared': n, 'files': n, 'thumbnails': n}.
+    """
+    found, previous = scan(dry_run)
+    counts = {'set': 0, 'refreshed': 0, 'cleared': 0, 'files': len(found), 'thumbnails': 0}
+    movies = []
+    for movie in Movie.objects.only('id', 'movie_id', 'poster', 'poster_thumbnails').iterator(chunk_size=2000):
+        entry = found.get(movie.movie_id)
+        current = movie.poster.name or ''
+        if entry is not None and current != entry.path:
+            movie.poster = entry.path
+            counts['set'] += 1
+        elif entry is not None:
+            before = previous.get(movie.movie_id)
+            recorded = movie.poster_thumbnails or {}
+            if before is None or before.content_hash == entry.content_hash or not recorded.get('source'):
+                continue
+            movie.poster_thumbnails = {**recorded, 'source': ''}
+            counts['refreshed'] += 1
+        elif clear_missing and current.startswith(f'{POSTER_DIR}/'):
+            movie.poster = ''
+            counts['cleared'] += 1
+        else:
+            continue
+        movies.append(movie)
+
+    if movies and not dry_run:
+        Movie.objects.bulk_update(movies, ['poster', 'poster_thumbnails'], batch_size=500)
+        counts['thumbnails'] = thumbnails.refresh_many(movies)
+    return counts
@@ -0,0 +1,249 @@
+"""
+Performance metrics
+Process-local latency histograms and counters, fed by:
+  - MetricsMiddleware: per-view request latency, DB query count and time
+  - timed(stage): blocks in CSVSync, the recommendation engines and template
+    rendering (InstrumentedDjangoTemplates)
+
+Stages are recorded whether or not a request is active, so management
+commands measure the same code paths. Each request also gets a
+Server-Timing header with its own breakdown. Exposed by views.metrics in
+Prometheus text format (or JSON with ?format=json); every worker process
+keeps its own numbers.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request = ContextVar('metrics_request', default=None)
+_active_stages = ContextVar('metrics_active_stages', default=frozenset())
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """(le, cumulative count) pairs ending with +Inf"""
+        running = 0
+        pairs = []
+        for bound, count in zip(list(BUCKETS) + ['+Inf'], self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th observation (None when empty)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, running in self.cumulative():
+            if running >= target:
+                return bound
+        return '+Inf'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(Histogram)   # view -> latency
+        self.stages = defaultdict(Histogram)     # stage -> latency per call
+        self.responses = defaultdict(int)        # (view, status) -> count
+        self.queries = defaultdict(int)          # view -> DB queries
+
+    def observe_stage(self, stage, seconds):
+        with self.lock:
+            self.stages[stage].observe(seconds)
+
+    def observe_request(self, view, status, seconds, queries):
+        with self.lock:
+            self.requests[view].observe(seconds)
+            self.responses[(view, status)] += 1
+            self.queries[view] += queries
+
+
+registry = Registry()
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def record(stage, seconds):
+    """Add time spent in a stage to the registry and the current request"""
+    registry.observe_stage(stage, seconds)
+    current = _request.get()
+    if current is not None:
+        current['stages'][stage] += seconds
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block (or, as a decorator, a function) as `stage`. Nested blocks
+    of the same stage count once, e.g. sync_changes() falling back to sync_all().
+    """
+    active = _active_stages.get()
+    if stage in active or not metrics_enabled():
+        yield
+        return
+    token = _active_stages.set(active | {stage})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+        _active_stages.reset(token)
+
+
+def count_queries(execute, sql, params, many, context):
+    """connection.execute_wrapper hook: count and time each DB query"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe_stage('db', elapsed)
+        current = _request.get()
+        if current is not None:
+            current['stages']['db'] += elapsed
+            current['queries'] += 1
+
+
+class MetricsMiddleware:
+    """Per-view latency, query count and stage breakdown for every request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_enabled():
+            return self.get_response(request)
+
+        current = {'stages': defaultdict(float), 'queries': 0}
+        token = _request.set(current)
+        started = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(count_queries):
+                response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        registry.observe_request(view, response.status_code, elapsed, current['queries'])
+
+        timings = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in current['stages'].items()]
+        timings.append(f'total;dur={elapsed * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+class TimedTemplate:
+    """Backend template whose render() is recorded as the 'template' stage"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def snapshot():
+    """Everything recorded so far in this process, as plain data"""
+    def histogram(h):
+        return {
+            'count': h.count,
+            'sum_seconds': round(h.total, 6),
+            'p50_le': h.quantile(0.5),
+            'p95_le': h.quantile(0.95),
+            'p99_le': h.quantile(0.99),
+            'buckets': {str(le): n for le, n in h.cumulative()},
+        }
+
+    with registry.lock:
+        return {
+            'views': {
+                view: dict(histogram(h), queries=registry.queries[view], responses={
+                    str(status): n for (v, status), n in registry.responses.items() if v == view
+                })
+                for view, h in registry.requests.items()
+            },
+            'stages': {stage: histogram(h) for stage, h in registry.stages.items()},
+        }
+
+
+def prometheus_text():
+    """Prometheus text exposition format"""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def histogram_lines(name, label, histograms):
+        for key, h in sorted(histograms.items()):
+            for le, running in h.cumulative():
+                yield f'{name}_bucket{{{label}="{escape(key)}",le="{le}"}} {running}'
+            yield f'{name}_sum{{{label}="{escape(key)}"}} {h.total:.6f}'
+            yield f'{name}_count{{{label}="{escape(key)}"}} {h.count}'
+
+    with registry.lock:
+        lines = [
+            '# HELP movies_request_duration_seconds Request latency by view.',
+            '# TYPE movies_request_duration_seconds histogram',
+            *histogram_lines('movies_request_duration_seconds', 'view', registry.requests),
+            '# HELP movies_stage_duration_seconds Time per call in db, csv_sync, c_engine, py_engine, template.',
+            '# TYPE movies_stage_duration_seconds histogram',
+            *histogram_lines('movies_stage_duration_seconds', 'stage', registry.stages),
+            '# HELP movies_requests_total Responses by view and status code.',
+            '# TYPE movies_requests_total counter',
+            *(f'movies_requests_total{{view="{escape(view)}",status="{status}"}} {n}'
+              for (view, status), n in sorted(registry.responses.items())),
+            '# HELP movies_db_queries_total Database queries issued by view.',
+            '# TYPE movies_db_queries_total counter',
+            *(f'movies_db_queries_total{{view="{escape(view)}"}} {n}'
+              for view, n in sorted(registry.queries.items())),
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def stage_summary():
+    """One line per stage, for management command output"""
+    with registry.lock:
+        return [
+            f'{stage}: {h.count} calls, {h.total * 1000:.1f} ms total'
+            for stage, h in sorted(registry.stages.items())
+        ]
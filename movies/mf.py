@@ -0,0 +1,215 @@
+"""
+Matrix factorization
+Learns user and movie latent factors from the ratings with alternating
+least squares (weighted-lambda regularization, so heavy raters are not
+under-regularized): rating ~ global mean + user factors . movie factors.
+
+`manage.py train_model` saves each model as a versioned .npz file in
+MF_MODEL_DIR and points current.json at it. Scoring a user is one
+matrix-vector product over the movie factors plus argpartition. Users are
+folded in from their current ratings with a single least-squares solve
+against the fixed movie factors, so users who joined and ratings given
+since training count straight away.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from .c_engine import atomic_write
+
+CURRENT = 'current.json'
+
+
+def solve_side(ratings, fixed, regularization):
+    """
+    Least-squares factors for every row of `ratings` (CSR, residuals)
+    against the factors of the other side held `fixed`
+    """
+    factors = fixed.shape[1]
+    solved = np.zeros((ratings.shape[0], factors))
+    identity = np.eye(factors)
+    for i in range(ratings.shape[0]):
+        start, stop = ratings.indptr[i], ratings.indptr[i + 1]
+        if start == stop:
+            continue
+        cols = ratings.indices[start:stop]
+        other = fixed[cols]
+        gram = other.T @ other + regularization * (stop - start) * identity
+        solved[i] = np.linalg.solve(gram, other.T @ ratings.data[start:stop])
+    return solved
+
+
+def rmse(model_mean, user_factors, movie_factors, rows, cols, values):
+    if len(values) == 0:
+        return None
+    predictions = model_mean + np.einsum('ij,ij->i', user_factors[rows], movie_factors[cols])
+    return float(np.sqrt(np.mean((np.clip(predictions, 1.0, 5.0) - values) ** 2)))
+
+
+def train(matrix, factors=None, regularization=None, iterations=None, validation=0.0, seed=42,
+          report=None):
+    """
+    Fit factors to a RatingMatrix, holding out a `validation` fraction of
+    the ratings to report RMSE on. Returns an MFModel.
+    """
+    from scipy import sparse
+
+    factors = factors or settings.MF_FACTORS
+    regularization = settings.MF_REGULARIZATION if regularization is None else regularization
+    iterations = iterations or settings.MF_ITERATIONS
+    report = report or (lambda message: None)
+    rng = np.random.default_rng(seed)
+
+    coo = matrix.ratings.tocoo()
+    held_out = rng.random(len(coo.data)) < validation
+    train_rows, train_cols, train_values = coo.row[~held_out], coo.col[~held_out], coo.data[~held_out]
+    mean = float(train_values.mean()) if len(train_values) else 3.0
+
+    shape = matrix.ratings.shape
+    by_user = sparse.csr_matrix((train_values - mean, (train_rows, train_cols)), shape=shape)
+    by_movie = by_user.T.tocsr()
+
+    user_factors = np.zeros((shape[0], factors))
+    movie_factors = rng.normal(0.0, 0.1, (shape[1], factors))
+    history = []
+    for iteration in range(1, iterations + 1):
+        started = time.monotonic()
+        user_factors = solve_side(by_user, movie_factors, regularization)
+        movie_factors = solve_side(by_movie, user_factors, regularization)
+        train_error = rmse(mean, user_factors, movie_factors, train_rows, train_cols, train_values)
+        validation_error = rmse(
+            mean, user_factors, movie_factors, coo.row[held_out], coo.col[held_out], coo.data[held_out]
+        )
+        history.append({'iteration': iteration, 'train_rmse': train_error, 'validation_rmse': validation_error})
+        detail = f', validation RMSE {validation_error:.4f}' if validation_error is not None else ''
+        report(f'  iteration {iteration}/{iterations}: train RMSE {train_error:.4f}{detail} '
+               f'({time.monotonic() - started:.1f}s)')
+
+    return MFModel(
+        matrix.user_ids, matrix.movie_ids, user_factors, movie_factors, mean,
+        params={
+            'factors': factors,
+            'regularization': regularization,
+            'iterations': iterations,
+            'validation': validation,
+            'seed': seed,
+            'ratings': int(len(coo.data)),
+            'history': history,
+        },
+    )
+
+
+class MFModel:
+    """Trained factors keyed by C engine ids"""
+
+    def __init__(self, user_ids, movie_ids, user_factors, movie_factors, global_mean, params=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.user_index = {int(u): i for i, u in enumerate(self.user_ids)}
+        self.movie_index = {int(m): j for j, m in enumerate(self.movie_ids)}
+        self.user_factors = np.asarray(user_factors, dtype=np.float64)
+        self.movie_factors = np.asarray(movie_factors, dtype=np.float64)
+        self.global_mean = float(global_mean)
+        self.params = params or {}
+        self.version = self.params.get('version')
+        norms = np.linalg.norm(self.movie_factors, axis=1)
+        self.movie_directions = self.movie_factors / np.where(norms > 0, norms, 1.0)[:, None]
+
+    def save(self, directory, keep=3):
+        """Write a new version and make it current. Returns its path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        self.version = version
+        self.params['version'] = version
+        path = directory / f'mf-{version}.npz'
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                user_ids=self.user_ids,
+                movie_ids=self.movie_ids,
+                user_factors=self.user_factors,
+                movie_factors=self.movie_factors,
+                global_mean=np.array(self.global_mean),
+                params=np.array(json.dumps(self.params)),
+            )
+        with atomic_write(directory / CURRENT) as f:
+            json.dump({'version': version, 'file': path.name}, f)
+        # Older versions beyond `keep` are removed
+        for old in sorted(directory.glob('mf-*.npz'))[:-keep]:
+            old.unlink()
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['user_ids'], data['movie_ids'], data['user_factors'], data['movie_factors'],
+                float(data['global_mean']), params=json.loads(str(data['params'])),
+            )
+
+    def fold_in(self, ratings):
+        """Factors for a user from {movie_id: rating}, with the movie factors fixed"""
+        known = [(self.movie_index[m], r) for m, r in ratings.items() if m in self.movie_index]
+        if not known:
+            return None
+        cols = np.array([j for j, _ in known])
+        values = np.array([r for _, r in known]) - self.global_mean
+        other = self.movie_factors[cols]
+        gram = other.T @ other + self.params['regularization'] * len(cols) * np.eye(other.shape[1])
+        return np.linalg.solve(gram, other.T @ values)
+
+    def recommend(self, user_vector, rated, count):
+        """
+        Top-N (movie index, predicted rating) for a factor vector, skipping
+        the movie indexes in `rated`: one product over all movie factors and
+        argpartition for the top `count`
+        """
+        scores = self.movie_factors @ user_vector + self.global_mean
+        if rated:
+            scores[list(rated)] = -np.inf
+        count = min(count, len(scores) - len(rated))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(j), float(min(5.0, max(1.0, scores[j])))) for j in top]
+
+    def closest_rated(self, candidate, liked):
+        """The movie index in `liked` whose factors point most like `candidate`'s"""
+        liked = list(liked)
+        if not liked:
+            return None
+        similarity = self.movie_directions[liked] @ self.movie_directions[candidate]
+        return liked[int(np.argmax(similarity))]
+
+
+_model_cache = {'key': None, 'model': None}
+_model_lock = threading.Lock()
+
+
+def model_path(directory=None):
+    """Path of the current model version, or None before the first training"""
+    directory = Path(directory or settings.MF_MODEL_DIR)
+    try:
+        with open(directory / CURRENT, 'r', encoding='utf-8') as f:
+            return directory / json.load(f)['file']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_model():
+    """Process-wide current model, reloaded when train_model publishes a new version"""
+    path = model_path()
+    if path is None or not path.exists():
+        raise Exception(f'No trained model in {settings.MF_MODEL_DIR}: run manage.py train_model')
+    key = (str(path), os.stat(path).st_mtime_ns)
+    with _model_lock:
+        if _model_cache['key'] != key:
+            _model_cache['model'] = MFModel.load(path)
+            _model_cache['key'] = key
+        return _model_cache['model']
@@ -0,0 +1,89 @@
+"""
+MF Engine - recommendations from the trained matrix-factorization model
+Each request folds the user's current ratings into the model (one small
+least-squares solve) and scores every movie with one matrix-vector product,
+so the cost depends on factors x movies, not on how many users there are.
+"""
+from .metrics import timed
+from .mf import get_model
+from .models import Movie, Rating
+
+# Rated movies that can be named as the reason for a recommendation
+LIKED_RATING = 3.5
+
+
+class MFRecommendationEngine:
+    """Matrix-factorization engine with the same interface as CRecommendationEngine"""
+
+    uses_csv_files = False
+
+    def user_ratings(self, user_ids):
+        """{c_user_id: {movie_id: rating}}"""
+        ratings = {int(user_id): {} for user_id in user_ids}
+        rows = Rating.objects.filter(user__profile__c_user_id__in=ratings.keys()).values_list(
+            'user__profile__c_user_id', 'movie__movie_id', 'rating'
+        )
+        for c_user_id, movie_id, rating in rows.iterator(chunk_size=10000):
+            ratings[c_user_id][movie_id] = rating
+        return ratings
+
+    def recommend(self, model, own, count):
+        """Top-N (movie_id, predicted rating, liked movie_id or None) for {movie_id: rating}"""
+        vector = model.fold_in(own)
+        if vector is None:
+            return []
+        rated = {model.movie_index[m] for m in own if m in model.movie_index}
+        liked = [model.movie_index[m] for m, r in own.items() if r >= LIKED_RATING and m in model.movie_index]
+        results = []
+        for j, score in model.recommend(vector, rated, count):
+            closest = model.closest_rated(j, liked)
+            results.append((
+                int(model.movie_ids[j]), score, int(model.movie_ids[closest]) if closest is not None else None
+            ))
+        return results
+
+    def format_results(self, results):
+        """Turn recommend() tuples into the C engine's dict format"""
+        ids = {movie_id for movie_id, _, _ in results} | {liked for _, _, liked in results if liked is not None}
+        movies = Movie.objects.in_bulk(ids, field_name='movie_id')
+        recommendations = []
+        for movie_id, score, liked_id in results:
+            movie = movies.get(movie_id)
+            if movie is None:
+                continue
+            liked = movies.get(liked_id)
+            recommendations.append({
+                'movie_id': movie.movie_id,
+                'title': movie.title,
+                'genre': movie.genre,
+                'year': movie.year,
+                'predicted_rating': round(score, 2),
+                'reason': f"Because you liked {liked.title}" if liked else 'Matches your taste profile',
+            })
+        return recommendations
+
+    @timed('mf_engine')
+    def get_recommendations(self, user_id, count=10):
+        """
+        Get movie recommendations for a user
+        Returns: list of dicts with movie info and predicted rating
+        """
+        model = get_model()
+        own = self.user_ratings([user_id])[int(user_id)]
+        return self.format_results(self.recommend(model, own, count))
+
+    @timed('mf_engine')
+    def get_recommendations_batch(self, user_ids, count=10):
+        """
+        Recommendations for many users against one loaded model
+        Returns: {user_id: list of dicts}
+        """
+        model = get_model()
+        return {
+            user_id: self.format_results(self.recommend(model, own, count))
+            for user_id, own in self.user_ratings(user_ids).items()
+        }
+
+    def add_rating(self, user_id, movie_id, rating):
+        """Ratings are read straight from the database and folded in per request"""
+        return True
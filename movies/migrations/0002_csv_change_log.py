@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CSVChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.CharField(choices=[('movies', 'movies.csv'), ('users', 'users.csv'), ('ratings', 'ratings.csv')], max_length=10)),
+                ('key', models.CharField(max_length=32)),
+                ('created', models.BooleanField(default=False)),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
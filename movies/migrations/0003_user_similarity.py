@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_csv_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('other_id', models.IntegerField(db_index=True)),
+                ('similarity', models.FloatField()),
+            ],
+            options={
+                'unique_together': {('user_id', 'other_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_user_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('neighbour_id', models.IntegerField(db_index=True)),
+                ('similarity', models.FloatField()),
+                ('rank', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['user_id', 'rank'],
+                'unique_together': {('user_id', 'neighbour_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_user_neighbour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('rank', models.IntegerField()),
+                ('predicted_rating', models.FloatField()),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['user_id', 'rank'],
+                'unique_together': {('user_id', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_rating_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title'], name='movies_movi_title_652549_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['genre', 'title'], name='movies_movi_genre_8e21ef_idx'),
+        ),
+    ]
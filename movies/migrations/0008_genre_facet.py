@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_genres(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    GenreFacet = apps.get_model('movies', 'GenreFacet')
+    counts = {}
+    for row in Movie.objects.values('genre').annotate(count=Count('id')):
+        genre = row['genre'].strip()
+        if genre:
+            counts[genre] = counts.get(genre, 0) + row['count']
+    GenreFacet.objects.bulk_create([
+        GenreFacet(genre=genre, movie_count=count) for genre, count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_movie_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=50, unique=True)),
+                ('movie_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['genre'],
+            },
+        ),
+        migrations.RunPython(count_genres, migrations.RunPython.noop),
+    ]
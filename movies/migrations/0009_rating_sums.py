@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Count, Sum, Avg, FloatField
+from django.db.models.functions import Coalesce
+
+
+def fill_aggregates(apps, schema_editor):
+    Rating = apps.get_model('movies', 'Rating')
+    for model, group_field, outer_field, fields in (
+        (apps.get_model('movies', 'Movie'), 'movie', 'pk', ('rating_count', 'rating_sum', 'avg_rating')),
+        (apps.get_model('movies', 'UserProfile'), 'user', 'user', ('ratings_count', 'ratings_sum', 'avg_rating_given')),
+    ):
+        stats = Rating.objects.filter(**{group_field: OuterRef(outer_field)}).order_by().values(group_field)
+        count_field, sum_field, avg_field = fields
+        model.objects.update(**{
+            count_field: Coalesce(Subquery(stats.annotate(n=Count('id')).values('n')), 0),
+            sum_field: Coalesce(Subquery(stats.annotate(s=Sum('rating')).values('s')), 0.0,
+                                output_field=FloatField()),
+            avg_field: Coalesce(Subquery(stats.annotate(a=Avg('rating')).values('a')), 0.0,
+                                output_field=FloatField()),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_genre_facet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='ratings_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_rating_sums'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='poster_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
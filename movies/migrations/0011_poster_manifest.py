@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_movie_poster_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosterManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_id', models.IntegerField(unique=True)),
+                ('path', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('modified', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['movie_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_poster_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='neighbours_stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='MovieNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_id', models.IntegerField(db_index=True)),
+                ('neighbour_id', models.IntegerField(db_index=True)),
+                ('similarity', models.FloatField()),
+                ('co_raters', models.IntegerField()),
+                ('rank', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['movie_id', 'rank'],
+                'unique_together': {('movie_id', 'neighbour_id')},
+            },
+        ),
+    ]
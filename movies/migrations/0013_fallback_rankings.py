@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_movie_neighbours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FallbackRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('overall', 'Overall'), ('genre', 'Genre'), ('age', 'Age bucket')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('rank', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('rating_count', models.IntegerField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['scope', 'key', 'rank'],
+                'unique_together': {('scope', 'key', 'rank')},
+            },
+        ),
+    ]
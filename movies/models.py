@@ -12,9 +12,18 @@ class Movie(models.Model):
     poster = models.ImageField(upload_to='posters/', blank=True, null=True)
     avg_rating = models.FloatField(default=0.0)
     rating_count = models.IntegerField(default=0)
+    rating_sum = models.FloatField(default=0.0)  # running total behind avg_rating
+    # {'source': poster name, 'sizes': {size: thumbnail name}}, see movies.thumbnails
+    poster_thumbnails = models.JSONField(default=dict, blank=True)
+    # Ratings changed since its MovieNeighbour rows were computed
+    neighbours_stale = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title']),
+            models.Index(fields=['genre', 'title']),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.year})"
@@ -27,6 +36,7 @@ class UserProfile(models.Model):
     age = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(120)])
     ratings_count = models.IntegerField(default=0)
     avg_rating_given = models.FloatField(default=0.0)
+    ratings_sum = models.FloatField(default=0.0)  # running total behind avg_rating_given
     
     def __str__(self):
         return f"{self.user.username} (ID: {self.c_user_id})"
@@ -46,3 +56,163 @@ class Rating(models.Model):
     
     def __str__(self):
         return f"{self.user.username} rated {self.movie.title}: {self.rating}"
+
+
+class CSVChange(models.Model):
+    """Pending row change for the C engine CSV files, consumed by CSVSync.sync_changes()"""
+    FILE_CHOICES = [
+        ('movies', 'movies.csv'),
+        ('users', 'users.csv'),
+        ('ratings', 'ratings.csv'),
+    ]
+    
+    file = models.CharField(max_length=10, choices=FILE_CHOICES)
+    key = models.CharField(max_length=32)  # movie_id, c_user_id or "c_user_id,movie_id"
+    created = models.BooleanField(default=False)
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        action = 'delete' if self.deleted else ('insert' if self.created else 'update')
+        return f"{action} {self.file} {self.key}"
+
+
+class UserSimilarity(models.Model):
+    """Precomputed user-user cosine similarity, stored once per pair (user_id < other_id)"""
+    user_id = models.IntegerField(db_index=True)  # c_user_id
+    other_id = models.IntegerField(db_index=True)  # c_user_id
+    similarity = models.FloatField()
+    
+    class Meta:
+        unique_together = ('user_id', 'other_id')
+    
+    def __str__(self):
+        return f"{self.user_id} ~ {self.other_id}: {self.similarity:.3f}"
+
+
+class UserNeighbour(models.Model):
+    """A user's top-K most similar users, derived from UserSimilarity"""
+    user_id = models.IntegerField(db_index=True)  # c_user_id
+    neighbour_id = models.IntegerField(db_index=True)  # c_user_id
+    similarity = models.FloatField()
+    rank = models.IntegerField()
+    
+    class Meta:
+        unique_together = ('user_id', 'neighbour_id')
+        ordering = ['user_id', 'rank']
+    
+    def __str__(self):
+        return f"{self.user_id} #{self.rank}: {self.neighbour_id} ({self.similarity:.3f})"
+
+
+class MovieNeighbour(models.Model):
+    """A movie's top-N most similar movies by co-ratings, see movies.item_similarity"""
+    movie_id = models.IntegerField(db_index=True)  # Movie.movie_id
+    neighbour_id = models.IntegerField(db_index=True)  # Movie.movie_id
+    similarity = models.FloatField()
+    co_raters = models.IntegerField()
+    rank = models.IntegerField()
+    
+    class Meta:
+        unique_together = ('movie_id', 'neighbour_id')
+        ordering = ['movie_id', 'rank']
+    
+    def __str__(self):
+        return f"{self.movie_id} #{self.rank}: {self.neighbour_id} ({self.similarity:.3f})"
+
+
+class PrecomputedRecommendation(models.Model):
+    """Recommendation filled in ahead of time by the precompute_recommendations command"""
+    user_id = models.IntegerField(db_index=True)  # c_user_id
+    rank = models.IntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    predicted_rating = models.FloatField()
+    reason = models.CharField(max_length=200, blank=True)
+    computed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('user_id', 'rank')
+        ordering = ['user_id', 'rank']
+    
+    def __str__(self):
+        return f"{self.user_id} #{self.rank}: {self.movie_id} ({self.predicted_rating:.2f})"
+
+
+class FallbackRanking(models.Model):
+    """Bayesian-averaged top movies for users without collaborative signal, see movies.fallback"""
+    SCOPE_CHOICES = [
+        ('overall', 'Overall'),
+        ('genre', 'Genre'),
+        ('age', 'Age bucket'),
+    ]
+    
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=50, blank=True)  # genre or age bucket label; '' overall
+    rank = models.IntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()  # Bayesian average rating
+    rating_count = models.IntegerField()  # ratings within the scope
+    
+    class Meta:
+        unique_together = ('scope', 'key', 'rank')
+        ordering = ['scope', 'key', 'rank']
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key} #{self.rank}: {self.movie_id} ({self.score:.2f})"
+
+
+class RatingOutbox(models.Model):
+    """Rating submitted by a user, waiting for the process_ratings worker to apply it"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    rating = models.FloatField(validators=[MinValueValidator(1.0), MaxValueValidator(5.0)])
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.movie_id}: {self.rating} (pending)"
+
+
+class PendingRefresh(models.Model):
+    """
+    User whose queued ratings are applied but whose derived state (similarity
+    store, item neighbours, CSV files) has not been refreshed yet; written in
+    the same transaction as the ratings and removed once the refresh succeeds
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='+')
+    attempts = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user_id} (refresh pending, {self.attempts} failed attempts)"
+
+
+class GenreFacet(models.Model):
+    """Number of movies per genre, kept current by the Movie signals"""
+    genre = models.CharField(max_length=50, unique=True)
+    movie_count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['genre']
+    
+    def __str__(self):
+        return f"{self.genre} ({self.movie_count})"
+
+
+class PosterManifest(models.Model):
+    """Poster file found in media storage for a movie, refreshed by set_poster_paths"""
+    movie_id = models.IntegerField(unique=True)  # Movie.movie_id
+    path = models.CharField(max_length=255)  # storage name, e.g. posters/28.png
+    size = models.BigIntegerField()
+    content_hash = models.CharField(max_length=64)  # sha256 locally, ETag on S3
+    modified = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['movie_id']
+    
+    def __str__(self):
+        return f"{self.movie_id}: {self.path} ({self.size} bytes)"
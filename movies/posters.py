@@ -0,0 +1,217 @@
+"""
+TMDB poster fetcher
+Searches TMDB and downloads posters from a thread pool sharing one
+requests.Session (a pooled keep-alive connection per worker). API calls go
+through a token bucket sized to TMDB's limit; image downloads come from the
+CDN and are not limited.
+
+Search responses are cached on disk, one file per (title, year), and every
+finished movie is recorded in a JSON checkpoint, so an interrupted run
+resumes where it stopped without repeating searches. Poster paths are
+written to the database once at the end with bulk_update, including those
+recorded by earlier interrupted runs.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from . import thumbnails
+from .c_engine import atomic_write
+from .models import Movie
+
+DOWNLOADED = 'downloaded'
+MISSING = 'missing'
+FAILED = 'failed'
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, in bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size):
+    """Session with a connection pool per host and retries on 429/5xx (honouring Retry-After)"""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET',),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class SearchCache:
+    """TMDB search results on disk, one JSON file per (title, year); misses are cached too"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, title, year):
+        digest = hashlib.sha1(f'{title}\0{year}'.encode('utf-8')).hexdigest()
+        return self.directory / f'{digest}.json'
+
+    def get(self, title, year):
+        """(hit, result)"""
+        try:
+            with open(self.path(title, year), 'r', encoding='utf-8') as f:
+                return True, json.load(f)['result']
+        except (OSError, ValueError, KeyError):
+            return False, None
+
+    def set(self, title, year, result):
+        with atomic_write(self.path(title, year)) as f:
+            json.dump({'title': title, 'year': year, 'result': result}, f)
+
+
+class Checkpoint:
+    """{movie_id: {'status', 'poster'}} for every movie finished so far, saved atomically"""
+
+    def __init__(self, path, save_every=50):
+        self.path = Path(path)
+        self.save_every = save_every
+        self.unsaved = 0
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = {int(k): v for k, v in json.load(f).items()}
+
+    def done(self, movie_id):
+        entry = self.entries.get(movie_id)
+        return entry is not None and entry['status'] != FAILED
+
+    def record(self, movie_id, status, poster=None):
+        self.entries[movie_id] = {'status': status, 'poster': poster}
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.path) as f:
+            json.dump({str(k): v for k, v in self.entries.items()}, f)
+        self.unsaved = 0
+
+    def posters(self):
+        return {movie_id: e['poster'] for movie_id, e in self.entries.items() if e['status'] == DOWNLOADED}
+
+
+class PosterFetcher:
+    def __init__(self, api_key, api_base=None, image_base=None, workers=None, rate=None,
+                 cache_dir=None, report=None):
+        self.api_key = api_key
+        self.api_base = (api_base or settings.TMDB_API_BASE).rstrip('/')
+        self.image_base = (image_base or settings.TMDB_IMAGE_BASE).rstrip('/')
+        self.workers = workers or settings.POSTER_FETCH_WORKERS
+        self.bucket = TokenBucket(rate or settings.TMDB_REQUESTS_PER_SECOND)
+        self.session = make_session(self.workers)
+        cache_dir = Path(cache_dir or settings.POSTER_CACHE_DIR)
+        self.search_cache = SearchCache(cache_dir / 'search')
+        self.checkpoint = Checkpoint(cache_dir / 'checkpoint.json')
+        self.report = report or (lambda message: None)
+
+    def search(self, title, year):
+        """First TMDB match for a title and year (None if there is none)"""
+        hit, result = self.search_cache.get(title, year)
+        if hit:
+            return result
+        self.bucket.acquire()
+        response = self.session.get(
+            f'{self.api_base}/search/movie',
+            params={'api_key': self.api_key, 'query': title, 'year': year},
+            timeout=10,
+        )
+        response.raise_for_status()
+        results = response.json().get('results') or []
+        result = results[0] if results else None
+        self.search_cache.set(title, year, result)
+        return result
+
+    def download(self, poster_path, name):
+        response = self.session.get(f'{self.image_base}{poster_path}', timeout=30)
+        response.raise_for_status()
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        return default_storage.save(name, ContentFile(response.content))
+
+    def fetch(self, movie_id, title, year):
+        """(status, stored poster name or None, error or None) for one movie"""
+        try:
+            match = self.search(title, year)
+            if not match or not match.get('poster_path'):
+                return MISSING, None, None
+            return DOWNLOADED, self.download(match['poster_path'], f'posters/{movie_id}.jpg'), None
+        except (requests.RequestException, ValueError, OSError) as e:
+            return FAILED, None, str(e)
+
+    def run(self, movies, force=False):
+        """
+        Fetch posters for (movie_id, title, year) rows not already finished
+        in the checkpoint (all of them with `force`). Returns counts per status.
+        """
+        todo = [m for m in movies if force or not self.checkpoint.done(m[0])]
+        counts = {DOWNLOADED: 0, MISSING: 0, FAILED: 0, 'resumed': len(movies) - len(todo)}
+        self.report(f'Fetching posters for {len(todo)} movies ({counts["resumed"]} already done)...')
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch, *movie): movie for movie in todo}
+            try:
+                for i, future in enumerate(as_completed(futures), 1):
+                    movie_id, title, year = futures[future]
+                    status, poster, error = future.result()
+                    self.checkpoint.record(movie_id, status, poster)
+                    counts[status] += 1
+                    detail = f': {error}' if error else ''
+                    self.report(f'[{i}/{len(todo)}] {title} ({year}) {status}{detail}')
+            finally:
+                for future in futures:
+                    future.cancel()
+                self.checkpoint.save()
+        return counts
+
+    def save_posters(self):
+        """
+        Write every downloaded poster in the checkpoint to its Movie and build
+        their thumbnails (bulk_update sends no post_save); returns the number changed
+        """
+        posters = self.checkpoint.posters()
+        movies = [
+            movie for movie in Movie.objects.only('id', 'movie_id', 'poster', 'poster_thumbnails').iterator(chunk_size=2000)
+            if movie.movie_id in posters and movie.poster.name != posters[movie.movie_id]
+        ]
+        for movie in movies:
+            movie.poster = posters[movie.movie_id]
+        Movie.objects.bulk_update(movies, ['poster'], batch_size=500)
+        thumbnails.refresh_many(movies, workers=self.workers)
+        return len(movies)
@@ -0,0 +1,248 @@
+"""
+Python Engine - in-process port of the C user-user algorithm
+Builds a sparse user x movie matrix from the Rating model and computes the
+same cosine similarity as calculate_user_similarity() in recommendation.c,
+vectorized over all users at once.
+"""
+import threading
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db.models import Count, Max
+from .metrics import timed
+
+# Same constants as generate_recommendations() in recommendation.c
+SIMILARITY_THRESHOLD = 0.3
+MIN_NEIGHBOUR_RATING = 3.5
+
+
+class RatingMatrix:
+    """Sparse user x movie rating matrix keyed by C engine ids"""
+
+    def __init__(self, user_ids, movie_ids, rows, cols, values):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.user_index = {int(u): i for i, u in enumerate(self.user_ids)}
+        self.movie_index = {int(m): j for j, m in enumerate(self.movie_ids)}
+
+        shape = (len(self.user_ids), len(self.movie_ids))
+        self.ratings = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float64), (rows, cols)), shape=shape
+        )
+        self.ratings.sum_duplicates()
+        self.squared = self.ratings.multiply(self.ratings).tocsr()
+        self.rated = (self.ratings > 0).astype(np.float64).tocsr()
+        # Only ratings of 3.5+ from neighbours count towards candidates
+        self.high = self.ratings.multiply(self.ratings >= MIN_NEIGHBOUR_RATING).tocsr()
+
+    @classmethod
+    def from_database(cls):
+        """Load every rating whose user has a profile"""
+        from movies.models import Rating, UserProfile, Movie
+
+        user_ids = list(UserProfile.objects.order_by('c_user_id').values_list('c_user_id', flat=True))
+        movie_ids = list(Movie.objects.order_by('movie_id').values_list('movie_id', flat=True))
+        user_index = {u: i for i, u in enumerate(user_ids)}
+        movie_index = {m: j for j, m in enumerate(movie_ids)}
+
+        rows, cols, values = [], [], []
+        triples = Rating.objects.filter(user__profile__isnull=False).values_list(
+            'user__profile__c_user_id', 'movie__movie_id', 'rating'
+        )
+        for c_user_id, movie_id, rating in triples.iterator(chunk_size=10000):
+            rows.append(user_index[c_user_id])
+            cols.append(movie_index[movie_id])
+            values.append(rating)
+
+        return cls(user_ids, movie_ids, rows, cols, values)
+
+    def user_vector(self, c_user_id):
+        """Dense rating row for one user, or None if unknown"""
+        i = self.user_index.get(int(c_user_id))
+        if i is None:
+            return None
+        return self.ratings.getrow(i).toarray().ravel()
+
+    def similarities(self, vector, exclude=None, rows=None):
+        """
+        Cosine similarity of `vector` against every user, computed only over
+        movies both sides rated (matches calculate_user_similarity). With
+        `rows`, only those users are compared and the rest are left at 0.
+        """
+        rated = (vector > 0).astype(np.float64)
+        ratings, rated_rows, squared = self.ratings, self.rated, self.squared
+        if rows is not None:
+            # One row slice; its indicator and squares are derived from it
+            ratings = ratings[rows]
+            rated_rows = ratings.copy()
+            rated_rows.data = np.ones_like(ratings.data)
+            squared = ratings.copy()
+            squared.data = ratings.data ** 2
+        dot = ratings @ vector
+        target_sq = rated_rows @ (vector * vector)
+        other_sq = squared @ rated
+
+        denominator = np.sqrt(target_sq) * np.sqrt(other_sq)
+        partial = np.zeros(len(dot))
+        np.divide(dot, denominator, out=partial, where=denominator > 0)
+        if rows is None:
+            sims = partial
+        else:
+            sims = np.zeros(len(self.user_ids))
+            sims[rows] = partial
+        if exclude is not None:
+            sims[exclude] = 0.0
+        return sims
+
+
+_matrix_cache = {'key': None, 'matrix': None}
+_matrix_lock = threading.Lock()
+
+
+def get_rating_matrix():
+    """
+    Process-wide RatingMatrix, rebuilt only when the ratings or the set of
+    users/movies change (one aggregate query per call to check)
+    """
+    from movies.models import Rating, UserProfile, Movie
+
+    stats = Rating.objects.aggregate(count=Count('id'), last=Max('updated_at'), top=Max('id'))
+    key = (
+        stats['count'], stats['last'], stats['top'],
+        UserProfile.objects.count(), Movie.objects.count(),
+    )
+    with _matrix_lock:
+        if _matrix_cache['key'] != key:
+            _matrix_cache['matrix'] = RatingMatrix.from_database()
+            _matrix_cache['key'] = key
+        return _matrix_cache['matrix']
+
+
+class PyRecommendationEngine:
+    """In-process recommendation engine with the same interface as CRecommendationEngine"""
+
+    uses_csv_files = False
+
+    def score_candidates(self, matrix, vector, neighbours, weights):
+        """
+        Sum rating x similarity over the given neighbour rows for every movie
+        the target has not rated. Returns (scores, contributed) arrays.
+        """
+        high = matrix.high[neighbours]
+        scores = high.T @ weights
+        contributed = (high.getnnz(axis=0) > 0) & (vector == 0)
+        scores[~contributed] = 0.0
+        return scores, contributed
+
+    def recommend_from_vector(self, matrix, vector, count, exclude=None, sims=None,
+                              threshold=SIMILARITY_THRESHOLD):
+        """
+        Top-N (movie_index, score, reason) for an arbitrary rating vector.
+        `sims` may supply precomputed similarities along the user axis; users
+        above `threshold` count as neighbours.
+        """
+        if vector is None or not vector.any():
+            return []
+
+        if sims is None:
+            sims = matrix.similarities(vector, exclude=exclude)
+        neighbours = np.flatnonzero(sims > threshold)
+        if len(neighbours) == 0:
+            return []
+
+        weights = sims[neighbours]
+        scores, contributed = self.score_candidates(matrix, vector, neighbours, weights)
+        candidates = np.flatnonzero(contributed)
+        if len(candidates) == 0:
+            return []
+
+        order = candidates[np.argsort(-scores[candidates], kind='stable')][:count]
+
+        # Reason: rating given by the most similar neighbour who liked the movie
+        high = matrix.high[neighbours][:, order].toarray()
+        results = []
+        for k, j in enumerate(order):
+            raters = np.flatnonzero(high[:, k])
+            best = raters[np.argmax(weights[raters])]
+            results.append((j, float(scores[j]), f"Similar users rated this {high[best, k]:.1f}/5"))
+        return results
+
+    def format_results(self, matrix, results):
+        """Turn (movie_index, score, reason) tuples into the C engine's dict format"""
+        from movies.models import Movie
+
+        movie_ids = [int(matrix.movie_ids[j]) for j, _, _ in results]
+        movies = Movie.objects.in_bulk(movie_ids, field_name='movie_id')
+        recommendations = []
+        for j, score, reason in results:
+            movie = movies.get(int(matrix.movie_ids[j]))
+            if movie is None:
+                continue
+            recommendations.append({
+                'movie_id': movie.movie_id,
+                'title': movie.title,
+                'genre': movie.genre,
+                'year': movie.year,
+                'predicted_rating': round(score, 2),
+                'reason': reason,
+            })
+        return recommendations
+
+    def neighbour_similarities(self, matrix, user_id, vector, exclude):
+        """
+        (similarities along the user axis, neighbour threshold) for a user:
+        their stored neighbour list, the ANN index's candidates only, or
+        (sims=None) the full scan in recommend_from_vector
+        """
+        if settings.RECOMMENDATION_SIMILARITY_STORE:
+            # Stored lists are already cut to K and the minimum similarity
+            from movies.similarity import neighbour_vector
+            return neighbour_vector(matrix, user_id), 0.0
+        if settings.RECOMMENDATION_ANN_INDEX and vector is not None:
+            from movies.ann import get_index, candidate_rows
+            rows = candidate_rows(get_index(), matrix, vector)
+            return matrix.similarities(vector, exclude=exclude, rows=rows), SIMILARITY_THRESHOLD
+        return None, SIMILARITY_THRESHOLD
+
+    @timed('py_engine')
+    def get_recommendations(self, user_id, count=10):
+        """
+        Get movie recommendations for a user
+        Returns: list of dicts with movie info and predicted rating
+        """
+        try:
+            matrix = get_rating_matrix()
+            vector = matrix.user_vector(user_id)
+            exclude = matrix.user_index.get(int(user_id))
+            sims, threshold = self.neighbour_similarities(matrix, user_id, vector, exclude)
+            results = self.recommend_from_vector(
+                matrix, vector, count, exclude=exclude, sims=sims, threshold=threshold
+            )
+            return self.format_results(matrix, results)
+        except Exception as e:
+            raise Exception(f"Recommendation engine error: {e}")
+
+    @timed('py_engine')
+    def get_recommendations_batch(self, user_ids, count=10):
+        """
+        Recommendations for many users against one loaded matrix
+        Returns: {user_id: list of dicts}
+        """
+        try:
+            matrix = get_rating_matrix()
+            batch = {}
+            for user_id in user_ids:
+                vector = matrix.user_vector(user_id)
+                exclude = matrix.user_index.get(int(user_id))
+                sims, threshold = self.neighbour_similarities(matrix, user_id, vector, exclude)
+                results = self.recommend_from_vector(
+                    matrix, vector, count, exclude=exclude, sims=sims, threshold=threshold
+                )
+                batch[int(user_id)] = self.format_results(matrix, results)
+            return batch
+        except Exception as e:
+            raise Exception(f"Recommendation engine error: {e}")
+
+    def add_rating(self, user_id, movie_id, rating):
+        """Ratings are read straight from the database; nothing to push"""
+        return True
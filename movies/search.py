@@ -0,0 +1,199 @@
+"""
+Movie search
+Full-text, ranked movie search backed by the database's own text index:
+an FTS5 table on SQLite and a GIN tsvector index on PostgreSQL. Both are
+maintained by the database itself (triggers / expression index), so every
+Movie write, including bulk ones, is searchable immediately.
+
+Results are a lazy sequence that Django's Paginator slices one page at a
+time; any other database falls back to the old icontains filter.
+"""
+import re
+from django.db import connection, OperationalError, ProgrammingError
+from .models import Movie
+
+FTS_TABLE = 'movies_movie_fts'
+PG_INDEX = 'movies_movie_search_idx'
+# Must match the indexed expression exactly for PostgreSQL to use the index
+PG_DOCUMENT = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(genre, ''))"
+
+SQLITE_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, genre, content='movies_movie', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, genre) VALUES (new.id, new.title, new.genre);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, genre) VALUES ('delete', old.id, old.title, old.genre);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, genre ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, genre) VALUES ('delete', old.id, old.title, old.genre);
+        INSERT INTO {FTS_TABLE}(rowid, title, genre) VALUES (new.id, new.title, new.genre);
+    END""",
+]
+
+
+def install(using_connection=None):
+    """
+    Create the search index for the current database if it is missing.
+    Runs after every migrate: SQLite migrations that rebuild movies_movie
+    drop its triggers, so they are recreated and the index rebuilt.
+    """
+    conn = using_connection or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_a_']
+            )
+            complete = cursor.fetchone()[0] == 3
+            try:
+                for statement in SQLITE_SCHEMA:
+                    cursor.execute(statement)
+            except OperationalError:
+                return False  # SQLite built without FTS5
+            if not complete:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            return True
+        if conn.vendor == 'postgresql':
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON movies_movie USING GIN ({PG_DOCUMENT})")
+            return True
+    return False
+
+
+def terms(query):
+    """Words in the query; punctuation is never passed to the match syntax"""
+    return re.findall(r'\w+', query.lower())
+
+
+class SearchResults:
+    """
+    Ranked matches, fetched lazily: count() and slicing each run one query,
+    so a Paginator only ever loads the page it shows
+    """
+
+    def __init__(self, match_sql, params, order_sql, order_params=(), genre=None):
+        self.match_sql = match_sql
+        self.params = list(params)
+        self.order_sql = order_sql
+        self.order_params = list(order_params)
+        self.genre = genre
+        self._count = None
+
+    def where(self):
+        sql, params = self.match_sql, list(self.params)
+        if self.genre:
+            sql += " AND m.genre = %s"
+            params.append(self.genre)
+        return sql, params
+
+    def count(self):
+        if self._count is None:
+            where, params = self.where()
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT count(*) {where}", params)
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def genre_counts(self):
+        """[(genre, matches)] across all genres, ignoring the genre filter"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT m.genre, count(*) {self.match_sql} GROUP BY m.genre ORDER BY m.genre",
+                self.params
+            )
+            return [(genre, count) for genre, count in cursor.fetchall()]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        limit = (index.stop - start) if index.stop is not None else -1
+        where, params = self.where()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT m.id {where} ORDER BY {self.order_sql}, m.title LIMIT %s OFFSET %s",
+                params + self.order_params + [limit if limit >= 0 else 2 ** 31, start]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        movies = Movie.objects.in_bulk(ids)
+        return [movies[pk] for pk in ids if pk in movies]
+
+
+class SQLiteFTSBackend:
+    def search(self, query, genre=None):
+        words = terms(query)
+        if not words:
+            return None
+        # Every word must match; the last one also as a prefix (search as you type)
+        match = ' '.join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+        return SearchResults(
+            f"FROM {FTS_TABLE} JOIN movies_movie m ON m.id = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH %s",
+            [match.strip()],
+            # Title hits outrank genre hits
+            f"bm25({FTS_TABLE}, 10.0, 1.0)",
+            genre=genre,
+        )
+
+
+class PostgresSearchBackend:
+    def search(self, query, genre=None):
+        words = terms(query)
+        if not words:
+            return None
+        tsquery = ' & '.join(words[:-1] + [f'{words[-1]}:*'])
+        return SearchResults(
+            f"FROM movies_movie m WHERE {PG_DOCUMENT} @@ to_tsquery('english', %s)",
+            [tsquery],
+            f"ts_rank({PG_DOCUMENT}, to_tsquery('english', %s)) DESC",
+            [tsquery],
+            genre=genre,
+        )
+
+
+class BasicSearchBackend:
+    """Unindexed substring match, for databases without a text index"""
+
+    def search(self, query, genre=None):
+        from django.db.models import Q
+
+        if not query.strip():
+            return None
+        movies = Movie.objects.filter(Q(title__icontains=query) | Q(genre__icontains=query))
+        if genre:
+            movies = movies.filter(genre=genre)
+        return movies
+
+
+_fts_available = None
+
+
+def get_search_backend():
+    """Search backend for the configured database"""
+    global _fts_available
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        if _fts_available is None:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+                    _fts_available = cursor.fetchone() is not None
+            except (OperationalError, ProgrammingError):
+                _fts_available = False
+        if _fts_available:
+            return SQLiteFTSBackend()
+    return BasicSearchBackend()
+
+
+def search_movies(query, genre=None):
+    """
+    Ranked movies matching `query` (optionally within one genre) as a
+    sliceable, countable sequence; None when the query has no words
+    """
+    return get_search_backend().search(query, genre=genre)
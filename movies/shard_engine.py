@@ -0,0 +1,313 @@
+"""
+Sharded Engine - the Python user-user algorithm scattered over worker processes
+The users of the RatingMatrix are split into RECOMMENDATION_SHARDS
+contiguous ranges holding about the same number of ratings. Each shard
+lives in its own worker process (a one-process ProcessPoolExecutor, so its
+data is loaded once and every task for it lands in the same process).
+
+A request sends the target's rating vector to every shard. Each shard finds
+the neighbours among its own users and returns, for every movie they
+contribute, the partial score (sum of rating x similarity) and its most
+similar neighbour's rating. The parent adds the partial scores up and ranks
+them, which gives the same recommendations as the 'python' backend.
+
+Shards are given plain arrays and never touch the database, so a shard
+could as well be answered by another machine. After a rating change only
+the rows that changed are sent, each to the shard that owns it; a full
+reload happens only when users or movies other than new ones at the end of
+the id order appear or disappear. Each web process has its own set of
+shards, each holding its share of the ratings.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from .metrics import timed
+from .py_engine import PyRecommendationEngine, RatingMatrix, SIMILARITY_THRESHOLD, get_rating_matrix
+
+# Target vectors sent to the shards per task by get_recommendations_batch
+SCATTER_BATCH = 100
+
+
+def partition(ratings, shards):
+    """[(start, stop)] row ranges of a user x movie matrix with about equal rating counts"""
+    users = ratings.shape[0]
+    cumulative = np.cumsum(ratings.getnnz(axis=1))
+    total = cumulative[-1] if users else 0
+    cuts = np.searchsorted(cumulative, total * np.arange(1, shards) / shards, side='right')
+    bounds = [0, *np.minimum(cuts, users).tolist(), users]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def partial_scores(matrix, vector, exclude, threshold):
+    """
+    One shard's share of recommend_from_vector: (movie indexes, summed
+    rating x similarity, best neighbour's similarity, best neighbour's
+    rating) for the unrated movies its neighbours rated 3.5+
+    """
+    sims = matrix.similarities(vector, exclude=exclude)
+    neighbours = np.flatnonzero(sims > threshold)
+    # Most similar first (lower rows first on ties, as np.argmax), so each
+    # movie's first rater in column order is its best neighbour
+    neighbours = neighbours[np.argsort(-sims[neighbours], kind='stable')]
+    weights = sims[neighbours]
+    high = matrix.high[neighbours].tocsc()
+    high.sort_indices()
+    scores = high.T @ weights
+    starts, stops = high.indptr[:-1], high.indptr[1:]
+    movies = np.flatnonzero((stops > starts) & (vector == 0))
+    first = starts[movies]
+    return movies, scores[movies], weights[high.indices[first]], high.data[first]
+
+
+def changed_rows(old, new):
+    """
+    Rows of `new` (a ratings csr matrix) that differ from `old`, whose users
+    and movies are a prefix of new's. Rows of new users are included.
+    """
+    rows, cols = old.shape
+    indptr = np.concatenate((old.indptr, np.full(new.shape[0] - rows, old.indptr[-1])))
+    padded = sparse.csr_matrix((old.data, old.indices, indptr), shape=new.shape)
+    diff = (new - padded).tocsr()
+    diff.eliminate_zeros()
+    return np.flatnonzero(np.diff(diff.indptr))
+
+
+def extends(old_ids, new_ids):
+    """Whether new_ids is old_ids with ids appended (new users or movies at the end)"""
+    return len(new_ids) >= len(old_ids) and np.array_equal(new_ids[:len(old_ids)], old_ids)
+
+
+def merge(partials, movie_count, count):
+    """Top-N (movie_index, score, reason) from every shard's partial_scores, in shard order"""
+    scores = np.zeros(movie_count)
+    contributed = np.zeros(movie_count, dtype=bool)
+    best_weight = np.full(movie_count, -np.inf)
+    best_rating = np.zeros(movie_count)
+    for movies, shard_scores, weights, ratings in partials:
+        scores[movies] += shard_scores
+        contributed[movies] = True
+        # Strictly better only, so earlier shards (lower rows) win ties
+        better = weights > best_weight[movies]
+        best_weight[movies[better]] = weights[better]
+        best_rating[movies[better]] = ratings[better]
+
+    candidates = np.flatnonzero(contributed)
+    order = candidates[np.argsort(-scores[candidates], kind='stable')][:count]
+    return [(j, float(scores[j]), f"Similar users rated this {best_rating[j]:.1f}/5") for j in order]
+
+
+# Worker side: the shard held by this process
+_shard = None
+
+
+def load_shard(version, start, user_ids, movie_ids, rows, cols, values):
+    global _shard
+    _shard = (version, start, RatingMatrix(user_ids, movie_ids, rows, cols, values))
+    return len(user_ids)
+
+
+def update_shard(version, previous, rows, cols, values, changed, new_user_ids, new_movie_ids):
+    """
+    Move the shard from matrix `previous` to `version`: append the new
+    users and movies, and replace the rows listed in `changed` (local
+    indexes) with the given COO entries
+    """
+    global _shard
+    shard_version, start, matrix = _shard
+    if shard_version != previous:
+        raise Exception(f"Shard holds matrix version {shard_version}, cannot update from {previous}")
+    current = matrix.ratings.tocoo()
+    keep = ~np.isin(current.row, changed)
+    _shard = (version, start, RatingMatrix(
+        np.concatenate((matrix.user_ids, new_user_ids)),
+        np.concatenate((matrix.movie_ids, new_movie_ids)),
+        np.concatenate((current.row[keep], rows)),
+        np.concatenate((current.col[keep], cols)),
+        np.concatenate((current.data[keep], values)),
+    ))
+    return len(changed)
+
+
+def score_shard(version, vectors, excludes, threshold):
+    """partial_scores for each target vector; `excludes` are global rows (or None)"""
+    shard_version, start, matrix = _shard
+    if shard_version != version:
+        raise Exception(f"Shard holds matrix version {shard_version}, asked for {version}")
+    stop = start + len(matrix.user_ids)
+    return [
+        partial_scores(
+            matrix, vector, exclude - start if exclude is not None and start <= exclude < stop else None, threshold
+        )
+        for vector, exclude in zip(vectors, excludes)
+    ]
+
+
+class ShardPool:
+    """One single-process executor per shard"""
+
+    def __init__(self, shards):
+        self.shards = shards
+        # Workers start from a fresh interpreter rather than a fork of a threaded server
+        context = multiprocessing.get_context('spawn')
+        self.executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(shards)]
+        self.matrix = None
+        self.bounds = []
+        self.version = 0
+
+    def load(self, matrix):
+        """
+        Bring the shards to `matrix`: only the changed rows when it extends
+        the loaded one, otherwise a full reload
+        """
+        old = self.matrix
+        # Cleared first, so a failure part-way forces a full reload next time
+        self.matrix = None
+        self.version += 1
+        if old is not None and extends(old.user_ids, matrix.user_ids) and extends(old.movie_ids, matrix.movie_ids):
+            futures = self.update(old, matrix)
+        else:
+            self.bounds = partition(matrix.ratings, self.shards)
+            futures = []
+            for executor, (start, stop) in zip(self.executors, self.bounds):
+                block = matrix.ratings[start:stop].tocoo()
+                futures.append(executor.submit(
+                    load_shard, self.version, start, matrix.user_ids[start:stop], matrix.movie_ids,
+                    block.row, block.col, block.data,
+                ))
+        for future in futures:
+            future.result()
+        self.matrix = matrix
+
+    def update(self, old, matrix):
+        """Send each shard the rows of its users that changed; new users go to the last shard"""
+        changed = changed_rows(old.ratings, matrix.ratings)
+        self.bounds[-1] = (self.bounds[-1][0], len(matrix.user_ids))
+        new_movie_ids = matrix.movie_ids[len(old.movie_ids):]
+        futures = []
+        for executor, (start, stop) in zip(self.executors, self.bounds):
+            rows = changed[(changed >= start) & (changed < stop)]
+            block = matrix.ratings[rows].tocoo()
+            new_user_ids = matrix.user_ids[len(old.user_ids):] if stop == len(matrix.user_ids) else []
+            futures.append(executor.submit(
+                update_shard, self.version, self.version - 1, rows[block.row] - start, block.col, block.data,
+                rows - start, np.asarray(new_user_ids, dtype=np.int64), new_movie_ids,
+            ))
+        return futures
+
+    def scatter(self, vectors, excludes, threshold):
+        """Submit the targets to every shard. Returns one future per shard."""
+        return [
+            executor.submit(score_shard, self.version, vectors, excludes, threshold)
+            for executor in self.executors
+        ]
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = {'pool': None}
+_pool_lock = threading.Lock()
+
+
+def scatter(matrix, vectors, excludes, threshold=SIMILARITY_THRESHOLD):
+    """
+    Send target vectors to the process-wide shard pool, reloading the shards
+    first if the matrix was rebuilt. Returns one future per shard.
+    """
+    shards = settings.RECOMMENDATION_SHARDS or os.cpu_count() or 1
+    # Loading and submitting under the lock keeps every task behind the load it belongs to
+    with _pool_lock:
+        pool = _pool['pool']
+        if pool is None or pool.shards != shards:
+            if pool is not None:
+                pool.shutdown()
+            pool = _pool['pool'] = ShardPool(shards)
+        try:
+            if pool.matrix is not matrix:
+                pool.load(matrix)
+            return pool.scatter(vectors, excludes, threshold)
+        except BrokenProcessPool:
+            reset_pool()
+            raise
+
+
+def reset_pool():
+    """Drop the pool so the next request starts fresh workers"""
+    pool, _pool['pool'] = _pool['pool'], None
+    if pool is not None:
+        pool.shutdown()
+
+
+class ShardedRecommendationEngine(PyRecommendationEngine):
+    """Python engine whose similarity scan runs on every shard in parallel"""
+
+    def recommend_users(self, matrix, user_ids, count):
+        """
+        {user_id: [(movie_index, score, reason)]}. Users whose neighbours come
+        from the similarity store or the ANN index (neighbour_similarities)
+        are scored here, as those need no full scan; the rest are scattered
+        to the shards SCATTER_BATCH at a time.
+        """
+        results = {int(user_id): [] for user_id in user_ids}
+        targets = []
+        for user_id in results:
+            vector = matrix.user_vector(user_id)
+            if vector is None or not vector.any():
+                continue
+            row = matrix.user_index[user_id]
+            sims, threshold = self.neighbour_similarities(matrix, user_id, vector, row)
+            if sims is not None:
+                results[user_id] = self.recommend_from_vector(
+                    matrix, vector, count, exclude=row, sims=sims, threshold=threshold
+                )
+            else:
+                targets.append((user_id, vector, row))
+
+        for start in range(0, len(targets), SCATTER_BATCH):
+            batch = targets[start:start + SCATTER_BATCH]
+            futures = scatter(matrix, [vector for _, vector, _ in batch], [row for _, _, row in batch])
+            try:
+                shard_partials = [future.result() for future in futures]
+            except BrokenProcessPool:
+                with _pool_lock:
+                    reset_pool()
+                raise
+            for k, (user_id, _, _) in enumerate(batch):
+                results[user_id] = merge(
+                    [partials[k] for partials in shard_partials], len(matrix.movie_ids), count
+                )
+        return results
+
+    @timed('shard_engine')
+    def get_recommendations(self, user_id, count=10):
+        """
+        Get movie recommendations for a user
+        Returns: list of dicts with movie info and predicted rating
+        """
+        try:
+            matrix = get_rating_matrix()
+            results = self.recommend_users(matrix, [user_id], count)[int(user_id)]
+            return self.format_results(matrix, results)
+        except Exception as e:
+            raise Exception(f"Recommendation engine error: {e}")
+
+    @timed('shard_engine')
+    def get_recommendations_batch(self, user_ids, count=10):
+        """
+        Recommendations for many users, each shard scoring a batch per task
+        Returns: {user_id: list of dicts}
+        """
+        try:
+            matrix = get_rating_matrix()
+            return {
+                user_id: self.format_results(matrix, results)
+                for user_id, results in self.recommend_users(matrix, user_ids, count).items()
+            }
+        except Exception as e:
+            raise Exception(f"Recommendation engine error: {e}")
@@ -0,0 +1,148 @@
+"""
+Model signal handlers
+Record row-level changes so the CSV files can be patched incrementally (only
+for a backend that reads them; nothing else drains the log), keep
+the rating aggregates and genre facets current, and invalidate cached
+recommendations and item neighbour lists when ratings change.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from .models import Movie, UserProfile, Rating, CSVChange, UserNeighbour
+from .backends import uses_csv_files
+from .cache import drop_recommendations
+from . import facets, aggregates, thumbnails, item_similarity
+
+
+def log_csv_change(file, key, **fields):
+    """Queue a CSVChange for sync_changes() when the backend reads the CSV files"""
+    if uses_csv_files():
+        CSVChange.objects.create(file=file, key=key, **fields)
+
+
+def rating_key(rating):
+    """CSV key for a rating, or None when the rater has no profile"""
+    c_user_id = UserProfile.objects.filter(user_id=rating.user_id).values_list('c_user_id', flat=True).first()
+    if c_user_id is None:
+        return None
+    movie_id = Movie.objects.filter(pk=rating.movie_id).values_list('movie_id', flat=True).first()
+    return f"{c_user_id},{movie_id}"
+
+
+@receiver(pre_save, sender=Movie)
+def movie_saving(sender, instance, **kwargs):
+    # Remember the stored genre/title so facets only change when they do,
+    # and the poster so thumbnails are only rebuilt for a new one
+    instance._stored_facet = None
+    instance._stored_poster = None
+    if instance.pk is not None:
+        stored = Movie.objects.filter(pk=instance.pk).values_list('genre', 'title', 'poster').first()
+        if stored is not None:
+            instance._stored_facet = stored[:2]
+            instance._stored_poster = stored[2] or None
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, created, **kwargs):
+    log_csv_change('movies', str(instance.movie_id), created=created)
+    if (instance.poster.name or None) != getattr(instance, '_stored_poster', None):
+        transaction.on_commit(lambda: thumbnails.refresh(instance))
+    stored = getattr(instance, '_stored_facet', None)
+    if stored == (instance.genre, instance.title):
+        return
+    if stored is not None and stored[0] != instance.genre:
+        facets.adjust(stored[0], -1)
+    if stored is None or stored[0] != instance.genre:
+        facets.adjust(instance.genre, 1)
+    # Titles feed the per-query facets too
+    transaction.on_commit(facets.invalidate)
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    log_csv_change('movies', str(instance.movie_id), deleted=True)
+    item_similarity.movie_removed(instance.movie_id)
+    facets.adjust(instance.genre, -1)
+    transaction.on_commit(facets.invalidate)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, created, **kwargs):
+    log_csv_change('users', str(instance.c_user_id), created=created)
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    log_csv_change('users', str(instance.c_user_id), deleted=True)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # users.csv carries the username; logins only touch last_login
+    if created or (update_fields and set(update_fields) <= {'last_login'}) or not uses_csv_files():
+        return
+    c_user_id = UserProfile.objects.filter(user=instance).values_list('c_user_id', flat=True).first()
+    if c_user_id is not None:
+        log_csv_change('users', str(c_user_id))
+
+
+def invalidate_recommendations(rating):
+    """
+    Drop cached and precomputed recommendations affected by a rating change:
+    the rater's, and with RECOMMENDATION_CACHE_INVALIDATE_NEIGHBOURS those of
+    users whose stored neighbour list holds the rater (lists the rater now
+    enters are handled by similarity.update_user). Without the similarity
+    store nothing records who they are, and their entries age out instead.
+    """
+    c_user_id = UserProfile.objects.filter(user_id=rating.user_id).values_list('c_user_id', flat=True).first()
+    if c_user_id is None:
+        return
+    c_user_ids = [c_user_id]
+    if settings.RECOMMENDATION_CACHE_INVALIDATE_NEIGHBOURS and settings.RECOMMENDATION_SIMILARITY_STORE:
+        c_user_ids += UserNeighbour.objects.filter(neighbour_id=c_user_id).values_list('user_id', flat=True)
+    drop_recommendations(c_user_ids)
+
+
+@receiver(pre_save, sender=Rating)
+def rating_saving(sender, instance, **kwargs):
+    # Previous value, so the aggregates can apply just the difference
+    instance._stored_rating = None
+    if instance.pk is not None:
+        instance._stored_rating = Rating.objects.filter(pk=instance.pk).values_list(
+            'user_id', 'movie_id', 'rating'
+        ).first()
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_rating', None)
+    if stored is not None and stored[:2] == (instance.user_id, instance.movie_id):
+        aggregates.rating_changed(instance.user_id, instance.movie_id, 0, float(instance.rating) - stored[2])
+    else:
+        if stored is not None:
+            aggregates.rating_changed(stored[0], stored[1], -1, -stored[2])
+            item_similarity.mark_stale(stored[1])
+        aggregates.rating_changed(instance.user_id, instance.movie_id, 1, float(instance.rating))
+    item_similarity.mark_stale(instance.movie_id)
+    
+    key = rating_key(instance) if uses_csv_files() else None
+    if key is not None:
+        log_csv_change('ratings', key, created=created)
+    invalidate_recommendations(instance)
+
+
+@receiver(pre_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    # pre_delete: the rater's profile may be removed in the same cascade
+    key = rating_key(instance) if uses_csv_files() else None
+    if key is not None:
+        log_csv_change('ratings', key, deleted=True)
+    invalidate_recommendations(instance)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_removed(sender, instance, **kwargs):
+    aggregates.rating_changed(instance.user_id, instance.movie_id, -1, -float(instance.rating))
+    item_similarity.mark_stale(instance.movie_id)
@@ -0,0 +1,221 @@
+"""
+User similarity store
+Pairwise cosine similarities (same formula as calculate_user_similarity in
+recommendation.c) computed once by the compute_similarities command and
+kept current one user at a time as ratings arrive.
+
+From the pairs, each user keeps a top-K neighbour list (K and the minimum
+similarity come from settings); the engines only ever scan those K users.
+"""
+import math
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from .models import Rating, UserSimilarity, UserNeighbour
+from .c_engine import CSVSync
+from .cache import drop_recommendations
+
+
+# Stored precision; also keeps batch and incremental results identical so
+# top-K ties resolve the same way
+PRECISION = 6
+
+
+def store_enabled():
+    return settings.RECOMMENDATION_SIMILARITY_STORE
+
+
+def top_neighbours(similarities):
+    """
+    Cut {other_id: similarity} down to the configured top-K above the
+    minimum similarity, as a ranked list of (other_id, similarity)
+    """
+    k = settings.RECOMMENDATION_NEIGHBOURS_K
+    min_similarity = settings.RECOMMENDATION_MIN_SIMILARITY
+    ranked = sorted(
+        ((other_id, s) for other_id, s in similarities.items() if s > min_similarity),
+        key=lambda pair: (-pair[1], pair[0])
+    )
+    return ranked[:k]
+
+
+def similarity_blocks(matrix, block_size=1000):
+    """
+    Yield (start, csr_matrix) blocks of full similarity rows, so that
+    rows [start, start + block rows) are complete against every user
+    """
+    ratings, squared, rated = matrix.ratings, matrix.squared, matrix.rated
+    n_users = ratings.shape[0]
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        # All three share the sparsity pattern of "rated a movie in common"
+        dot = ratings[start:stop] @ ratings.T
+        target_sq = squared[start:stop] @ rated.T
+        other_sq = rated[start:stop] @ squared.T
+        sims = dot.multiply(target_sq.power(-0.5)).multiply(other_sq.power(-0.5)).tocsr()
+        yield start, sims
+
+
+def rebuild_store(batch_size=5000):
+    """
+    Recompute every pair and every neighbour list from scratch.
+    Returns (pairs stored, neighbour rows stored).
+    """
+    from .py_engine import RatingMatrix
+
+    matrix = RatingMatrix.from_database()
+    user_ids = matrix.user_ids
+    pairs = []
+    neighbours = []
+    pair_total = neighbour_total = 0
+
+    with transaction.atomic():
+        UserSimilarity.objects.all().delete()
+        UserNeighbour.objects.all().delete()
+
+        for start, sims in similarity_blocks(matrix):
+            for row in range(sims.shape[0]):
+                i = start + row
+                cols = sims.indices[sims.indptr[row]:sims.indptr[row + 1]]
+                values = sims.data[sims.indptr[row]:sims.indptr[row + 1]]
+                user_id = int(user_ids[i])
+                row_sims = {
+                    int(user_ids[j]): round(float(v), PRECISION) for j, v in zip(cols, values) if j != i
+                }
+
+                for other_id, similarity in row_sims.items():
+                    if other_id > user_id:
+                        pairs.append(UserSimilarity(user_id=user_id, other_id=other_id, similarity=similarity))
+                for rank, (other_id, similarity) in enumerate(top_neighbours(row_sims), 1):
+                    neighbours.append(UserNeighbour(
+                        user_id=user_id, neighbour_id=other_id, similarity=similarity, rank=rank
+                    ))
+
+                if len(pairs) >= batch_size:
+                    UserSimilarity.objects.bulk_create(pairs)
+                    pair_total += len(pairs)
+                    pairs = []
+                if len(neighbours) >= batch_size:
+                    UserNeighbour.objects.bulk_create(neighbours)
+                    neighbour_total += len(neighbours)
+                    neighbours = []
+
+        UserSimilarity.objects.bulk_create(pairs)
+        UserNeighbour.objects.bulk_create(neighbours)
+        pair_total += len(pairs)
+        neighbour_total += len(neighbours)
+
+    if store_enabled():
+        CSVSync.export_neighbours()
+    return pair_total, neighbour_total
+
+
+def user_similarities(c_user_id):
+    """
+    Similarity of one user to everyone sharing a rated movie, computed from
+    the co-ratings alone: {other_c_user_id: similarity}
+    """
+    own = dict(
+        Rating.objects.filter(user__profile__c_user_id=c_user_id).values_list('movie_id', 'rating')
+    )
+    if not own:
+        return {}
+
+    sums = {}
+    co_ratings = Rating.objects.filter(
+        movie_id__in=own.keys(), user__profile__isnull=False
+    ).exclude(
+        user__profile__c_user_id=c_user_id
+    ).values_list('user__profile__c_user_id', 'movie_id', 'rating')
+
+    for other_id, movie_id, rating in co_ratings.iterator(chunk_size=10000):
+        mine = own[movie_id]
+        dot, mine_sq, other_sq = sums.get(other_id, (0.0, 0.0, 0.0))
+        sums[other_id] = (dot + mine * rating, mine_sq + mine * mine, other_sq + rating * rating)
+
+    return {
+        other_id: round(dot / (math.sqrt(mine_sq) * math.sqrt(other_sq)), PRECISION)
+        for other_id, (dot, mine_sq, other_sq) in sums.items()
+        if mine_sq > 0 and other_sq > 0
+    }
+
+
+def stored_similarities(c_user_id):
+    """{other_c_user_id: similarity} from the pair store"""
+    pairs = UserSimilarity.objects.filter(
+        Q(user_id=c_user_id) | Q(other_id=c_user_id)
+    ).values_list('user_id', 'other_id', 'similarity')
+    return {
+        (other if user == c_user_id else user): similarity
+        for user, other, similarity in pairs
+    }
+
+
+def rebuild_neighbours(c_user_ids):
+    """Recompute the top-K lists of the given users from the pair store"""
+    rows = []
+    for c_user_id in c_user_ids:
+        for rank, (other_id, similarity) in enumerate(top_neighbours(stored_similarities(c_user_id)), 1):
+            rows.append(UserNeighbour(
+                user_id=c_user_id, neighbour_id=other_id, similarity=similarity, rank=rank
+            ))
+    UserNeighbour.objects.filter(user_id__in=c_user_ids).delete()
+    UserNeighbour.objects.bulk_create(rows)
+    return [(r.user_id, r.neighbour_id, r.similarity) for r in rows]
+
+
+def update_user(c_user_id):
+    """
+    Replace only the stored pairs that involve this user, then refresh the
+    neighbour lists that can have changed: the user's own, and those of
+    users the user enters, leaves or moves within
+    """
+    c_user_id = int(c_user_id)
+    k = settings.RECOMMENDATION_NEIGHBOURS_K
+    min_similarity = settings.RECOMMENDATION_MIN_SIMILARITY
+    similarities = user_similarities(c_user_id)
+
+    with transaction.atomic():
+        UserSimilarity.objects.filter(Q(user_id=c_user_id) | Q(other_id=c_user_id)).delete()
+        UserSimilarity.objects.bulk_create([
+            UserSimilarity(
+                user_id=min(c_user_id, other_id), other_id=max(c_user_id, other_id), similarity=s
+            )
+            for other_id, s in similarities.items()
+        ])
+
+        # Users whose list holds this user, or who might now admit them
+        affected = {c_user_id}
+        affected.update(
+            UserNeighbour.objects.filter(neighbour_id=c_user_id).values_list('user_id', flat=True)
+        )
+        candidates = [other for other, s in similarities.items() if s > min_similarity]
+        # Rank keys as in top_neighbours(): higher similarity, then lower id
+        lists = {}
+        for user_id, neighbour_id, similarity in UserNeighbour.objects.filter(
+            user_id__in=candidates
+        ).values_list('user_id', 'neighbour_id', 'similarity'):
+            lists.setdefault(user_id, []).append((-similarity, neighbour_id))
+        for other_id in candidates:
+            current = lists.get(other_id, [])
+            if len(current) < k or (-similarities[other_id], c_user_id) < max(current):
+                affected.add(other_id)
+
+        rows = rebuild_neighbours(sorted(affected))
+        if settings.RECOMMENDATION_CACHE_INVALIDATE_NEIGHBOURS:
+            drop_recommendations(affected - {c_user_id})
+
+    CSVSync.replace_neighbour_rows(affected, rows)
+
+
+def neighbour_vector(matrix, c_user_id):
+    """A user's stored top-K similarities laid out along a RatingMatrix's user axis"""
+    sims = np.zeros(len(matrix.user_ids))
+    neighbours = UserNeighbour.objects.filter(user_id=int(c_user_id)).values_list('neighbour_id', 'similarity')
+    for other_id, similarity in neighbours:
+        i = matrix.user_index.get(other_id)
+        if i is not None:
+            sims[i] = similarity
+    return sims
@@ -0,0 +1,103 @@
+"""
+Synthetic rating generator
+Skewed, production-like rating data for load tests: movie popularity
+follows a Zipf law over a random popularity ranking, the number of ratings
+per user follows a truncated power law, and each rating is movie quality +
+user bias + noise, rounded to half stars.
+
+Users are generated in fixed-size blocks, each from its own child seed, so
+a run is reproducible for a given seed whatever the number of worker
+processes. Pure numpy: workers never touch the database.
+"""
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+RATING_MEAN = 3.6
+
+
+class PopularityModel:
+    """Movie sampling weights, quality and rating-count law shared by every block"""
+
+    def __init__(self, movie_count, popularity_exponent=1.0, activity_exponent=1.5,
+                 min_ratings=5, max_ratings=500, seed=0):
+        rng = np.random.default_rng(np.random.SeedSequence([seed, 0]))
+        self.movie_count = movie_count
+        self.min_ratings = max(1, min(min_ratings, movie_count))
+        self.max_ratings = max(self.min_ratings, min(max_ratings, movie_count))
+
+        # Movie at popularity rank k (0-based) is drawn with weight 1 / (k + 1)^a
+        ranking = rng.permutation(movie_count)
+        weights = np.empty(movie_count)
+        weights[ranking] = 1.0 / np.arange(1, movie_count + 1) ** popularity_exponent
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.cdf[-1] = 1.0
+        self.quality = np.clip(rng.normal(RATING_MEAN, 0.5, size=movie_count), 1.5, 4.8)
+
+        counts = np.arange(self.min_ratings, self.max_ratings + 1)
+        activity = counts.astype(float) ** -activity_exponent
+        self.activity_counts = counts
+        self.activity_p = activity / activity.sum()
+
+    def sample_movies(self, rng, n):
+        """n distinct movie indices drawn by popularity (successive sampling)"""
+        if n * 2 > self.movie_count:
+            p = np.diff(self.cdf, prepend=0.0)
+            return rng.choice(self.movie_count, size=n, replace=False, p=p)
+        chosen = np.empty(0, dtype=np.int64)
+        while len(chosen) < n:
+            draws = np.searchsorted(self.cdf, rng.random(2 * (n - len(chosen)) + 8), side='right')
+            combined = np.concatenate([chosen, np.minimum(draws, self.movie_count - 1)])
+            _, first = np.unique(combined, return_index=True)
+            chosen = combined[np.sort(first)][:n]
+        return chosen
+
+
+def generate_block(model, user_count, seed_sequence):
+    """
+    Ratings for one block of users: (user offsets within the block,
+    movie indices, ratings) as parallel arrays, plus each user's age
+    """
+    rng = np.random.default_rng(seed_sequence)
+    ages = rng.integers(18, 66, size=user_count)
+    counts = rng.choice(model.activity_counts, size=user_count, p=model.activity_p)
+    bias = rng.normal(0.0, 0.4, size=user_count)
+
+    users = np.repeat(np.arange(user_count), counts)
+    movies = np.concatenate([model.sample_movies(rng, int(n)) for n in counts])
+    scores = model.quality[movies] + bias[users] + rng.normal(0.0, 0.8, size=len(movies))
+    ratings = np.clip(np.round(scores * 2) / 2, 1.0, 5.0)
+    return users.astype(np.int32), movies.astype(np.int32), ratings.astype(np.float32), ages
+
+
+def generate(model, user_count, block_size=5000, workers=None, seed=0):
+    """
+    Yield (first user index, ages, users, movies, ratings) per block, in
+    order. Blocks are generated by a pool of `workers` processes (1 =
+    in-process) with at most two per worker in flight, so a slow consumer
+    never lets finished blocks pile up in memory.
+    """
+    blocks = [(start, min(block_size, user_count - start)) for start in range(0, user_count, block_size)]
+    seeds = np.random.SeedSequence([seed, 1]).spawn(len(blocks))
+
+    if workers == 1:
+        for (start, size), block_seed in zip(blocks, seeds):
+            users, movies, ratings, ages = generate_block(model, size, block_seed)
+            yield start, ages, users, movies, ratings
+        return
+
+    workers = workers or os.cpu_count() or 1
+    window = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        jobs = iter(zip(blocks, seeds))
+        for (start, size), block_seed in itertools.islice(jobs, window):
+            pending.append((start, pool.submit(generate_block, model, size, block_seed)))
+        while pending:
+            start, future = pending.popleft()
+            users, movies, ratings, ages = future.result()
+            for (next_start, size), block_seed in itertools.islice(jobs, 1):
+                pending.append((next_start, pool.submit(generate_block, model, size, block_seed)))
+            yield start, ages, users, movies, ratings
@@ -0,0 +1,16 @@
+from django import template
+from movies import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def poster_url(movie, size='medium'):
+    """URL of the movie's poster thumbnail at `size` (small, medium, large)"""
+    return thumbnails.url(movie, size)
+
+
+@register.simple_tag
+def poster_srcset(movie, size='medium', retina='large'):
+    """srcset pairing `size` with a sharper `retina` thumbnail for 2x screens"""
+    return f'{thumbnails.url(movie, size)} 1x, {thumbnails.url(movie, retina)} 2x'
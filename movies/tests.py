@@ -1,3 +1,557 @@
-from django.test import TestCase
+import csv
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from movies import aggregates, c_engine, fallback, importer, ingestion, item_similarity, search
+from movies.c_engine import CRecommendationEngine, CSVSync
+from movies.cache import RecommendationCache
+from movies.models import (
+    CSVChange, Movie, PendingRefresh, PrecomputedRecommendation, Rating, RatingOutbox, UserNeighbour, UserProfile
+)
+from movies.py_engine import PyRecommendationEngine
 
-# Create your tests here.
+
+class RatingSyncTests(TestCase):
+    """The sync rating path writes each rating to ratings.csv once"""
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        # The engine runs against the scratch files when it has been built (make c_interface)
+        executable = Path(settings.BASE_DIR) / 'c_interface'
+        if executable.exists():
+            shutil.copy2(executable, self.data_dir / 'c_interface')
+
+        settings_override = override_settings(
+            BASE_DIR=self.data_dir,
+            RECOMMENDATION_BACKEND='c',
+            C_ENGINE_MODE='subprocess',
+            C_ENGINE_RATINGS_SNAPSHOT=False,
+            RATING_INGESTION_ASYNC=False,
+            RECOMMENDATION_SIMILARITY_STORE=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.movie = Movie.objects.create(movie_id=28, title='Test Movie', genre='Drama', year=2000)
+        self.user = User.objects.create_user('rater', password='secret-pass-123')
+        UserProfile.objects.create(user=self.user, c_user_id=9003, age=30)
+        CSVSync.sync_all()
+
+    def rating_rows(self, user_id, movie_id):
+        with open(self.data_dir / 'ratings.csv', newline='', encoding='utf-8') as f:
+            return [row for row in csv.reader(f) if row[:2] == [str(user_id), str(movie_id)]]
+
+    def test_rating_written_once(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('movie_detail', args=[self.movie.movie_id]), {'rating': '4'})
+
+        self.assertEqual(response.status_code, 302)
+        rows = self.rating_rows(9003, 28)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(float(rows[0][2]), 4.0)
+
+    def test_updated_rating_appends_row(self):
+        self.client.force_login(self.user)
+        url = reverse('movie_detail', args=[self.movie.movie_id])
+        self.client.post(url, {'rating': '4'})
+        self.client.post(url, {'rating': '2'})
+
+        # The engine keeps the last row of a pair
+        rows = self.rating_rows(9003, 28)
+        self.assertEqual([float(row[2]) for row in rows], [4.0, 2.0])
+
+    def test_deleted_rating_appends_tombstone(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('movie_detail', args=[self.movie.movie_id]), {'rating': '4'})
+        Rating.objects.filter(user=self.user, movie=self.movie).delete()
+        CSVSync.sync_changes()
+
+        rows = self.rating_rows(9003, 28)
+        self.assertEqual(float(rows[-1][2]), CSVSync.RATING_TOMBSTONE)
+
+    def test_superseded_rows_compacted(self):
+        self.client.force_login(self.user)
+        url = reverse('movie_detail', args=[self.movie.movie_id])
+        with mock.patch.object(CSVSync, 'RATINGS_COMPACT_SLACK', 0):
+            for rating in ('4', '3', '2'):
+                self.client.post(url, {'rating': rating})
+
+        rows = self.rating_rows(9003, 28)
+        self.assertEqual([float(row[2]) for row in rows], [2.0])
+
+
+class CSVChangeLogTests(TestCase):
+    """Row changes are only logged for a backend that reads the CSV files"""
+
+    def setUp(self):
+        self.movie = Movie.objects.create(movie_id=28, title='Test Movie', genre='Drama', year=2000)
+        self.user = User.objects.create_user('rater')
+        UserProfile.objects.create(user=self.user, c_user_id=9003, age=30)
+
+    @override_settings(RECOMMENDATION_BACKEND='python')
+    def test_not_logged_for_python_backend(self):
+        CSVChange.objects.all().delete()
+        rating = Rating.objects.create(user=self.user, movie=self.movie, rating=4)
+        rating.delete()
+        self.assertFalse(CSVChange.objects.exists())
+
+    @override_settings(RECOMMENDATION_BACKEND='c')
+    def test_logged_for_c_backend(self):
+        CSVChange.objects.all().delete()
+        Rating.objects.create(user=self.user, movie=self.movie, rating=4)
+        self.assertEqual(list(CSVChange.objects.values_list('file', 'key')), [('ratings', '9003,28')])
+
+
+class ItemStaleFlagTests(TestCase):
+    """A rating saved while item lists are computed leaves its movie stale"""
+
+    def setUp(self):
+        self.movies = [Movie.objects.create(movie_id=i, title=f'Movie {i}', genre='Drama', year=2000)
+                       for i in (1, 2, 3)]
+        self.users = []
+        for n in range(3):
+            user = User.objects.create_user(f'rater{n}')
+            UserProfile.objects.create(user=user, c_user_id=9000 + n, age=30)
+            self.users.append(user)
+        for user in self.users[:2]:
+            for movie in self.movies[:2]:
+                Rating.objects.create(user=user, movie=movie, rating=4)
+        item_similarity.rebuild_index()
+
+    def test_rating_during_refresh(self):
+        rating = Rating.objects.create(user=self.users[2], movie=self.movies[0], rating=5)
+        original = item_similarity.load_matrix
+
+        def load_then_rate():
+            # Movie 1 is already stale; this change is not in the loaded matrix
+            item_matrix = original()
+            rating.rating = 1
+            rating.save()
+            return item_matrix
+
+        with mock.patch.object(item_similarity, 'load_matrix', load_then_rate):
+            item_similarity.refresh_stale()
+
+        self.assertTrue(Movie.objects.get(movie_id=1).neighbours_stale)
+
+    def test_failed_refresh_keeps_flags(self):
+        Rating.objects.create(user=self.users[2], movie=self.movies[0], rating=5)
+        with mock.patch.object(item_similarity, 'load_matrix', side_effect=Exception('boom')):
+            with self.assertRaises(Exception):
+                item_similarity.refresh_stale()
+        self.assertTrue(Movie.objects.get(movie_id=1).neighbours_stale)
+
+
+@override_settings(
+    RECOMMENDATION_BACKEND='python',
+    RECOMMENDATION_SIMILARITY_STORE=True,
+    RECOMMENDATION_CACHE_INVALIDATE_NEIGHBOURS=True,
+)
+class CacheInvalidationTests(TestCase):
+    """A rating change drops the rater's recommendations and those of users whose list holds them"""
+
+    def setUp(self):
+        self.movie = Movie.objects.create(movie_id=28, title='Test Movie', genre='Drama', year=2000)
+        self.users = []
+        for n in range(3):
+            user = User.objects.create_user(f'rater{n}')
+            UserProfile.objects.create(user=user, c_user_id=9000 + n, age=30)
+            self.users.append(user)
+            PrecomputedRecommendation.objects.create(user_id=9000 + n, rank=1, movie=self.movie, predicted_rating=4)
+        # 9001 lists the rater as a neighbour; 9002 only rated the same movie
+        UserNeighbour.objects.create(user_id=9001, neighbour_id=9000, similarity=0.9, rank=1)
+        Rating.objects.create(user=self.users[2], movie=self.movie, rating=3)
+        PrecomputedRecommendation.objects.get_or_create(
+            user_id=9002, rank=1, defaults={'movie': self.movie, 'predicted_rating': 4}
+        )
+        self.cache = RecommendationCache()
+
+    def assert_dropped(self, expected):
+        remaining = set(PrecomputedRecommendation.objects.values_list('user_id', flat=True))
+        self.assertEqual({9000, 9001, 9002} - remaining, expected)
+
+    def test_rating_saved(self):
+        versions = {u: self.cache.version(u) for u in (9000, 9001, 9002)}
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(user=self.users[0], movie=self.movie, rating=4)
+
+        self.assert_dropped({9000, 9001})
+        self.assertEqual([self.cache.version(u) != versions[u] for u in (9000, 9001, 9002)], [True, True, False])
+
+    def test_rating_deleted(self):
+        rating = Rating.objects.create(user=self.users[0], movie=self.movie, rating=4)
+        PrecomputedRecommendation.objects.bulk_create([
+            PrecomputedRecommendation(user_id=u, rank=1, movie=self.movie, predicted_rating=4) for u in (9000, 9001)
+        ])
+        rating.delete()
+        self.assert_dropped({9000, 9001})
+
+    @override_settings(RECOMMENDATION_SIMILARITY_STORE=False)
+    def test_only_rater_without_store(self):
+        Rating.objects.create(user=self.users[0], movie=self.movie, rating=4)
+        self.assert_dropped({9000})
+
+
+@override_settings(METRICS_TOKEN='scrape-secret', METRICS_ALLOWED_IPS=[])
+class MetricsAccessTests(TestCase):
+    """/metrics needs staff or the bearer token, whatever the client address"""
+
+    def test_loopback_without_token_refused(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_bearer_token(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_never_matches(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
+
+
+class CSVLockTests(TransactionTestCase):
+    """An append made while another writer rewrites ratings.csv is not lost"""
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        settings_override = override_settings(
+            BASE_DIR=self.data_dir,
+            RECOMMENDATION_BACKEND='c',
+            C_ENGINE_RATINGS_SNAPSHOT=False,
+            RECOMMENDATION_SIMILARITY_STORE=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.movies = [Movie.objects.create(movie_id=i, title=f'Movie {i}', genre='Drama', year=2000)
+                       for i in (1, 2)]
+        self.user = User.objects.create_user('rater')
+        UserProfile.objects.create(user=self.user, c_user_id=9003, age=30)
+        Rating.objects.create(user=self.user, movie=self.movies[0], rating=4)
+        CSVSync.sync_all()
+
+    def test_append_during_rewrite(self):
+        rewriting, finish = threading.Event(), threading.Event()
+        original = c_engine.atomic_write
+
+        @contextmanager
+        def slow_write(path, binary=False):
+            # Hold the rewritten ratings.csv back from its rename until told to
+            with original(path, binary) as f:
+                yield f
+                if Path(path).name == 'ratings.csv':
+                    rewriting.set()
+                    finish.wait(10)
+
+        def run(target):
+            try:
+                target()
+            finally:
+                connection.close()
+
+        with mock.patch.object(c_engine, 'atomic_write', slow_write):
+            rewrite = threading.Thread(target=run, args=(CSVSync.sync_all,))
+            rewrite.start()
+            self.assertTrue(rewriting.wait(10))
+
+            Rating.objects.create(user=self.user, movie=self.movies[1], rating=5)
+            append = threading.Thread(target=run, args=(CSVSync.sync_changes,))
+            append.start()
+            time.sleep(0.3)
+            finish.set()
+            rewrite.join(10)
+            append.join(10)
+
+        CSVSync.sync_changes()
+        with open(self.data_dir / 'ratings.csv', newline='', encoding='utf-8') as f:
+            rows = [row[:2] for row in csv.reader(f)]
+        self.assertIn(['9003', '2'], rows)
+
+
+def create_rater(c_user_id, age=30):
+    user = User.objects.create_user(f'rater{c_user_id}')
+    UserProfile.objects.create(user=user, c_user_id=c_user_id, age=age)
+    return user
+
+
+class EngineParityTests(TestCase):
+    """The python backend recommends what the C engine does from the same ratings"""
+
+    RATINGS = {
+        9000: {1: 5, 2: 4, 3: 2},
+        9001: {1: 5, 2: 4, 4: 5, 5: 4},
+        9002: {1: 4, 3: 2, 5: 5, 6: 4},
+        9003: {2: 5, 4: 4, 6: 5},
+        9004: {1: 3, 4: 2, 6: 5},
+    }
+
+    def setUp(self):
+        executable = Path(settings.BASE_DIR) / 'c_interface'
+        if not executable.exists():
+            self.skipTest('c_interface is not built (make c_interface)')
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        shutil.copy2(executable, self.data_dir / 'c_interface')
+
+        settings_override = override_settings(
+            BASE_DIR=self.data_dir,
+            C_ENGINE_MODE='subprocess',
+            C_ENGINE_RATINGS_SNAPSHOT=False,
+            RECOMMENDATION_SIMILARITY_STORE=False,
+            RECOMMENDATION_ANN_INDEX=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        movies = {i: Movie.objects.create(movie_id=i, title=f'Movie {i}', genre='Drama', year=2000)
+                  for i in range(1, 7)}
+        for c_user_id, ratings in self.RATINGS.items():
+            user = create_rater(c_user_id)
+            for movie_id, rating in ratings.items():
+                Rating.objects.create(user=user, movie=movies[movie_id], rating=rating)
+        CSVSync.sync_all()
+
+    def test_same_recommendations(self):
+        python_engine, c_engine_ = PyRecommendationEngine(), CRecommendationEngine()
+        for c_user_id in self.RATINGS:
+            expected = [(r['movie_id'], r['predicted_rating']) for r in c_engine_.get_recommendations(c_user_id)]
+            actual = [(r['movie_id'], r['predicted_rating']) for r in python_engine.get_recommendations(c_user_id)]
+            self.assertEqual(actual, expected, f'user {c_user_id}')
+
+    def test_same_batch(self):
+        user_ids = list(self.RATINGS)
+        expected = CRecommendationEngine().get_recommendations_batch(user_ids)
+        actual = PyRecommendationEngine().get_recommendations_batch(user_ids)
+        for c_user_id in user_ids:
+            self.assertEqual([r['movie_id'] for r in actual[c_user_id]],
+                             [r['movie_id'] for r in expected[c_user_id]])
+
+
+class AggregateTests(TestCase):
+    """The running aggregates match a full recompute after every kind of rating change"""
+
+    def setUp(self):
+        self.movies = [Movie.objects.create(movie_id=i, title=f'Movie {i}', genre='Drama', year=2000)
+                       for i in (1, 2)]
+        self.users = [create_rater(9000 + n) for n in range(2)]
+        self.rating = Rating.objects.create(user=self.users[0], movie=self.movies[0], rating=4)
+        Rating.objects.create(user=self.users[1], movie=self.movies[0], rating=2)
+
+    def stored(self):
+        return (
+            list(Movie.objects.order_by('pk').values_list('rating_count', 'rating_sum', 'avg_rating')),
+            list(UserProfile.objects.order_by('pk').values_list('ratings_count', 'ratings_sum', 'avg_rating_given')),
+        )
+
+    def assert_matches_recompute(self):
+        incremental = self.stored()
+        self.assertEqual(aggregates.recompute_all(), (0, 0))
+        self.assertEqual(self.stored(), incremental)
+
+    def test_update(self):
+        self.rating.rating = 1
+        self.rating.save()
+        self.assertEqual(Movie.objects.get(movie_id=1).avg_rating, 1.5)
+        self.assert_matches_recompute()
+
+    def test_move(self):
+        self.rating.movie = self.movies[1]
+        self.rating.user = self.users[1]
+        self.rating.save()
+        self.assertEqual(UserProfile.objects.get(c_user_id=9000).ratings_count, 0)
+        self.assert_matches_recompute()
+
+    def test_delete(self):
+        self.rating.delete()
+        Rating.objects.filter(user=self.users[1]).delete()
+        self.assertEqual(Movie.objects.get(movie_id=1).avg_rating, 0.0)
+        self.assert_matches_recompute()
+
+
+class ImporterTests(TestCase):
+    """The importer upserts, clamps ratings to 1-5 and reads every supported layout"""
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def write(self, name, text, encoding='utf-8'):
+        path = self.data_dir / name
+        path.write_text(text, encoding=encoding)
+        return path
+
+    def test_native_layout_upserts(self):
+        movies = self.write('movies.csv', 'movie_id,title,genre,year\n1,Heat,Crime,1995\n')
+        importer.import_movies(movies)
+        self.write('movies.csv', 'movie_id,title,genre,year\n1,Heat (remastered),Crime,1995\n2,Up,Animation,2009\n')
+        importer.import_movies(movies)
+        importer.import_users(self.write('users.csv', 'user_id,name,age\n7,Ann,40\n'))
+        ratings = self.write('ratings.csv', 'user_id,movie_id,rating\n7,1,4\n7,2,3\n')
+        importer.import_ratings(ratings)
+        self.write('ratings.csv', 'user_id,movie_id,rating\n7,1,2\n')
+        progress, rated = importer.import_ratings(ratings)
+
+        self.assertEqual(Movie.objects.get(movie_id=1).title, 'Heat (remastered)')
+        self.assertEqual(UserProfile.objects.get(c_user_id=7).age, 40)
+        self.assertEqual(Rating.objects.count(), 2)
+        self.assertEqual(Rating.objects.get(movie__movie_id=1).rating, 2)
+        self.assertEqual(rated, {7})
+
+    def test_movielens_csv(self):
+        importer.import_movies(self.write(
+            'movies.csv', 'movieId,title,genres\n1,Toy Story (1995),Adventure|Animation\n2,Untitled,(no genres listed)\n'
+        ))
+        progress, rated = importer.import_ratings(self.write(
+            'ratings.csv', 'userId,movieId,rating,timestamp\n3,1,0.5,964982703\n3,2,5.0,964982703\n3,99,4.0,0\n'
+        ))
+
+        movie = Movie.objects.get(movie_id=1)
+        self.assertEqual((movie.title, movie.genre, movie.year), ('Toy Story', 'Adventure', 1995))
+        self.assertEqual(Movie.objects.get(movie_id=2).genre, '')
+        # 0.5 is clamped up to 1; the unknown movie is skipped and a profile made for the rater
+        self.assertEqual(Rating.objects.get(movie__movie_id=1).rating, 1)
+        self.assertEqual(progress.skipped, 1)
+        self.assertEqual(UserProfile.objects.get(c_user_id=3).age, importer.DEFAULT_AGE)
+
+    def test_movielens_dat(self):
+        importer.import_movies(self.write('movies.dat', '1::Amélie (2001)::Comedy|Romance\n', encoding='latin-1'))
+        importer.import_users(self.write('users.dat', '5::F::25::10::48067\n'))
+        importer.import_ratings(self.write('ratings.dat', '5::1::6::978300760\n'), user_id_offset=100)
+
+        self.assertEqual(Movie.objects.get(movie_id=1).title, 'Amélie')
+        self.assertEqual(UserProfile.objects.get(c_user_id=5).age, 25)
+        self.assertEqual(Rating.objects.get(user__profile__c_user_id=105).rating, 5)
+
+
+@override_settings(RECOMMENDATION_BACKEND='python', RECOMMENDATION_SIMILARITY_STORE=False)
+class IngestionTests(TestCase):
+    """The worker applies queued ratings in batches and retries failed refreshes"""
+
+    def setUp(self):
+        self.movies = [Movie.objects.create(movie_id=i, title=f'Movie {i}', genre='Drama', year=2000)
+                       for i in (1, 2)]
+        self.user = create_rater(9000)
+
+    def test_batches(self):
+        ingestion.enqueue_rating(self.user, self.movies[0], 2)
+        ingestion.enqueue_rating(self.user, self.movies[0], 5)
+        ingestion.enqueue_rating(self.user, self.movies[1], 3)
+
+        self.assertEqual(ingestion.process_batch(batch_size=2), 2)
+        self.assertEqual(list(Rating.objects.values_list('movie__movie_id', 'rating')), [(1, 5)])
+        self.assertEqual(ingestion.process_batch(batch_size=2), 1)
+        self.assertEqual(ingestion.process_batch(batch_size=2), 0)
+
+        self.assertEqual(Rating.objects.count(), 2)
+        self.assertEqual(UserProfile.objects.get(c_user_id=9000).ratings_count, 2)
+        self.assertFalse(RatingOutbox.objects.exists())
+        self.assertFalse(PendingRefresh.objects.exists())
+
+    @override_settings(RECOMMENDATION_BACKEND='c')
+    def test_failed_refresh_retried(self):
+        ingestion.enqueue_rating(self.user, self.movies[0], 4)
+        with mock.patch.object(CSVSync, 'sync_changes', side_effect=Exception('disk full')):
+            with self.assertRaises(Exception):
+                ingestion.process_batch()
+
+        # The rating is applied; only its refresh waits
+        self.assertTrue(Rating.objects.filter(user=self.user, rating=4).exists())
+        self.assertEqual(PendingRefresh.objects.get(user=self.user).attempts, 1)
+
+        with mock.patch.object(CSVSync, 'sync_all') as sync_all:
+            self.assertEqual(ingestion.process_batch(), 0)
+        sync_all.assert_called_once()
+        self.assertFalse(PendingRefresh.objects.exists())
+
+
+class FallbackTests(TestCase):
+    """Bayesian fallback rankings and the recommendations page for users without ratings"""
+
+    def setUp(self):
+        self.movies = {
+            i: Movie.objects.create(movie_id=i, title=f'Movie {i}', genre=genre, year=2000)
+            for i, genre in ((1, 'Drama'), (2, 'Drama'), (3, 'Comedy'), (4, 'Comedy'))
+        }
+        raters = [create_rater(9000 + n, age=20) for n in range(12)]
+        # Movie 1: a single 5; movie 2: twelve 5s; movie 3: six 3s; movie 4: three 5s from 60-year-olds
+        Rating.objects.create(user=raters[0], movie=self.movies[1], rating=5)
+        for rater in raters:
+            Rating.objects.create(user=rater, movie=self.movies[2], rating=5)
+        for rater in raters[:6]:
+            Rating.objects.create(user=rater, movie=self.movies[3], rating=3)
+        for n in range(3):
+            Rating.objects.create(user=create_rater(9100 + n, age=60), movie=self.movies[4], rating=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            fallback.rebuild()
+
+    def ranked(self, scope, key=''):
+        return [entry['movie_id'] for entry in fallback.ranking(scope, key)]
+
+    def test_ordering(self):
+        # More ratings at the same score rank higher
+        self.assertEqual(self.ranked('overall'), [2, 4, 1, 3])
+        self.assertEqual(self.ranked('genre', 'Drama'), [2, 1])
+        self.assertEqual(self.ranked('age', '18-24'), [2, 1, 3])
+        self.assertEqual(self.ranked('age', '55+'), [4])
+
+    def test_liked_genre_first_and_rated_skipped(self):
+        user = create_rater(9200, age=60)
+        Rating.objects.create(user=user, movie=self.movies[3], rating=5)
+        recommendations = fallback.recommend(user, count=3)
+
+        self.assertEqual([r['movie_id'] for r in recommendations], [4, 2, 1])
+        self.assertEqual(recommendations[0]['reason'], 'Top rated in Comedy')
+        # The age ranking only holds movie 4, so the overall one fills in
+        self.assertEqual(recommendations[1]['reason'], 'Top rated overall')
+
+    def test_cold_start_skips_engine(self):
+        user = create_rater(9300, age=20)
+        self.client.force_login(user)
+        with mock.patch('movies.views.get_engine') as get_engine:
+            response = self.client.get(reverse('recommendations'))
+
+        get_engine.assert_not_called()
+        self.assertTrue(response.context['is_fallback'])
+        self.assertEqual([r['movie_id'] for r in response.context['recommendations']], [2, 4, 1, 3])
+
+
+class SearchTests(TestCase):
+    """Ranked full-text search, and the substring fallback without a text index"""
+
+    def setUp(self):
+        Movie.objects.create(movie_id=1, title='Comedy of Errors', genre='Drama', year=2000)
+        Movie.objects.create(movie_id=2, title='Heat', genre='Comedy', year=1995)
+        Movie.objects.create(movie_id=3, title='The Comedian', genre='Drama', year=2016)
+
+    def test_title_hits_rank_first(self):
+        results = search.search_movies('comedy')
+        self.assertIsInstance(search.get_search_backend(), search.SQLiteFTSBackend)
+        self.assertEqual([m.movie_id for m in results[:10]], [1, 2])
+        self.assertEqual(len(results), 2)
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual({m.movie_id for m in search.search_movies('comed')[:10]}, {1, 2, 3})
+        self.assertEqual([m.movie_id for m in search.search_movies('comedy', genre='Drama')[:10]], [1])
+        self.assertIsNone(search.search_movies('  !! '))
+
+    def test_basic_fallback(self):
+        with mock.patch.object(search, '_fts_available', False):
+            self.assertIsInstance(search.get_search_backend(), search.BasicSearchBackend)
+            results = search.search_movies('Comed')
+            self.assertEqual(sorted(m.movie_id for m in results), [1, 2, 3])
+            self.assertEqual([m.movie_id for m in search.search_movies('Comed', genre='Comedy')], [2])
+            self.assertIsNone(search.search_movies(' '))
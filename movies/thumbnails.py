@@ -0,0 +1,144 @@
+"""
+Poster thumbnails
+Resized WebP copies of each poster in a few widths, named after a hash of
+their content (thumbs/<movie_id>.<size>.<hash>.webp). A new poster gives new
+names, so the files can be cached forever: S3 uploads carry an immutable
+Cache-Control, and serve_thumbnail adds the same header to local files.
+
+Movie.poster_thumbnails records the names for the poster they were made
+from. They are built when a poster is saved, after the bulk poster updates
+of fetch_posters and set_poster_paths, in bulk by `manage.py
+generate_thumbnails`, and on first use by the {% poster_url %} tag only
+with POSTER_THUMBNAILS_ON_DEMAND.
+"""
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.views.static import serve
+from .models import Movie
+
+# Width in pixels; cards show 'medium' (and 'large' on high-DPI screens)
+SIZES = {
+    'small': 92,
+    'medium': 185,
+    'large': 342,
+}
+QUALITY = 75
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_storage = None
+
+
+def thumbnail_storage():
+    """Default storage; on S3 a copy whose uploads are marked immutable"""
+    global _storage
+    if _storage is None:
+        if getattr(settings, 'USE_S3', False):
+            from storages.backends.s3boto3 import S3Boto3Storage
+            _storage = S3Boto3Storage(object_parameters={'CacheControl': CACHE_CONTROL})
+        else:
+            _storage = default_storage
+    return _storage
+
+
+def render(image, width):
+    """WebP bytes of `image` scaled down to `width` (never up)"""
+    from PIL import Image
+
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def generate(movie):
+    """
+    Build every size for the movie's current poster, store them and record
+    the names on the movie. Returns the new poster_thumbnails value.
+    """
+    from PIL import Image
+
+    if not movie.poster:
+        thumbnails = {}
+    else:
+        storage = thumbnail_storage()
+        with movie.poster.open('rb') as f:
+            image = Image.open(f)
+            image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+
+        names = {}
+        for size, width in SIZES.items():
+            data = render(image, width)
+            digest = hashlib.sha1(data).hexdigest()[:12]
+            name = f'thumbs/{movie.movie_id}.{size}.{digest}.webp'
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(data))
+            names[size] = name
+        thumbnails = {'source': movie.poster.name, 'sizes': names}
+
+    previous = (movie.poster_thumbnails or {}).get('sizes', {})
+    stale = set(previous.values()) - set(thumbnails.get('sizes', {}).values())
+    for name in stale:
+        thumbnail_storage().delete(name)
+
+    Movie.objects.filter(pk=movie.pk).update(poster_thumbnails=thumbnails)
+    movie.poster_thumbnails = thumbnails
+    return thumbnails
+
+
+def refresh(movie):
+    """
+    generate(), except that a poster which cannot be read or resized is
+    recorded with no sizes, so pages use the original without retrying
+    """
+    try:
+        generate(movie)
+        return True
+    except Exception:
+        if movie.poster:
+            movie.poster_thumbnails = {'source': movie.poster.name, 'sizes': {}}
+            Movie.objects.filter(pk=movie.pk).update(poster_thumbnails=movie.poster_thumbnails)
+        return False
+
+
+def refresh_many(movies, workers=4):
+    """refresh() each movie on a thread pool; returns how many succeeded"""
+    if not movies:
+        return 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(refresh, movies))
+
+
+def is_current(movie):
+    thumbnails = movie.poster_thumbnails or {}
+    return bool(movie.poster) and thumbnails.get('source') == movie.poster.name
+
+
+def url(movie, size):
+    """
+    URL of the movie's poster at `size`, building the thumbnails on first
+    use (POSTER_THUMBNAILS_ON_DEMAND). Falls back to the original poster
+    when they are missing or cannot be made; '' when there is no poster.
+    """
+    if not movie.poster:
+        return ''
+    if not is_current(movie) and settings.POSTER_THUMBNAILS_ON_DEMAND:
+        refresh(movie)
+    if is_current(movie) and size in movie.poster_thumbnails['sizes']:
+        return thumbnail_storage().url(movie.poster_thumbnails['sizes'][size])
+    return movie.poster.url
+
+
+def serve_thumbnail(request, path):
+    """Serve a local thumbnail with a far-future Cache-Control (names change with content)"""
+    response = serve(request, path, document_root=Path(settings.MEDIA_ROOT) / 'thumbs')
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -6,7 +6,9 @@ urlpatterns = [
     path('movies/', views.movie_list, name='movie_list'),
     path('movies/<int:movie_id>/', views.movie_detail, name='movie_detail'),
     path('recommendations/', views.recommendations, name='recommendations'),
+    path('recommendations/cache-stats/', views.recommendation_cache_stats, name='recommendation_cache_stats'),
     path('my-ratings/', views.my_ratings, name='my_ratings'),
     path('register/', views.register, name='register'),
     path('complete-profile/', views.complete_profile, name='complete_profile'),
+    path('metrics', views.metrics_endpoint, name='metrics'),
 ]
@@ -1,12 +1,24 @@
+import hmac
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.db.models import Q, Max
-from .models import Movie, Rating, UserProfile
-from .c_engine import CRecommendationEngine, CSVSync
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, HttpResponse, Http404
+from django.core.paginator import Paginator
+from django.db.models import Max
+from .models import Movie, Rating, UserProfile, PrecomputedRecommendation
+from .c_engine import CSVSync
+from .backends import get_engine, uses_csv_files
+from .cache import RecommendationCache
+from . import similarity, item_similarity, fallback, ingestion, facets, metrics
 from .forms import RatingForm, UserProfileForm
+from .search import search_movies
+
+MOVIES_PER_PAGE = 48
+SIMILAR_MOVIES = 6
 
 
 def home(request):
@@ -16,27 +28,25 @@ def home(request):
 
 
 def movie_list(request):
-    """Display all movies with search"""
+    """Display movies a page at a time, with ranked full-text search"""
     query = request.GET.get('q', '')
     genre = request.GET.get('genre', '')
     
-    movies = Movie.objects.all()
-    
-    if query:
-        movies = movies.filter(
-            Q(title__icontains=query) | Q(genre__icontains=query)
-        )
+    movies = search_movies(query, genre=genre or None)
+    if movies is None:
+        movies = Movie.objects.all()
+        if genre:
+            movies = movies.filter(genre=genre)
     
-    if genre:
-        movies = movies.filter(genre=genre)
+    page_obj = Paginator(movies, MOVIES_PER_PAGE).get_page(request.GET.get('page'))
     
-    # Get unique genres - use a set to eliminate duplicates and sort alphabetically
-    all_genres = Movie.objects.values_list('genre', flat=True)
-    unique_genres = sorted(set(g.strip() for g in all_genres if g))
+    # (genre, count) pairs, counted within the search results when searching
+    genres = facets.query_facets(query) if query.strip() else facets.genre_facets()
     
     return render(request, 'movies/movie_list.html', {
-        'movies': movies,
-        'genres': unique_genres,
+        'movies': page_obj,
+        'page_obj': page_obj,
+        'genres': genres,
         'query': query,
         'selected_genre': genre
     })
@@ -48,13 +58,21 @@ def movie_detail(request, movie_id):
     user_rating = None
     
     if request.user.is_authenticated:
-        user_rating = Rating.objects.filter(user=request.user, movie=movie).first()
+        # A queued rating is shown as the user's rating until the worker applies it
+        user_rating = (ingestion.pending_rating(request.user, movie)
+                       or Rating.objects.filter(user=request.user, movie=movie).first())
     
     if request.method == 'POST' and request.user.is_authenticated:
         form = RatingForm(request.POST)
         if form.is_valid():
             rating_value = form.cleaned_data['rating']
             
+            if settings.RATING_INGESTION_ASYNC:
+                # The process_ratings worker applies it and updates the engine
+                ingestion.enqueue_rating(request.user, movie, rating_value)
+                messages.success(request, 'Rating submitted successfully!')
+                return redirect('movie_detail', movie_id=movie_id)
+            
             # Update or create rating in Django
             rating_obj, created = Rating.objects.update_or_create(
                 user=request.user,
@@ -64,13 +82,19 @@ def movie_detail(request, movie_id):
             
             # Sync to CSV and call C engine
             try:
-                CSVSync.sync_all()
-                engine = CRecommendationEngine()
-                engine.add_rating(
-                    request.user.profile.c_user_id,
-                    movie.movie_id,
-                    rating_value
-                )
+                if similarity.store_enabled():
+                    similarity.update_user(request.user.profile.c_user_id)
+                engine = get_engine()
+                if engine.uses_csv_files:
+                    # sync_changes writes the rating to ratings.csv; the engine
+                    # reads it from there, so add_rating would append it twice
+                    CSVSync.sync_changes()
+                else:
+                    engine.add_rating(
+                        request.user.profile.c_user_id,
+                        movie.movie_id,
+                        rating_value
+                    )
                 messages.success(request, 'Rating submitted successfully!')
             except Exception as e:
                 messages.error(request, f'Error syncing rating: {e}')
@@ -81,12 +105,14 @@ def movie_detail(request, movie_id):
         form = RatingForm(initial={'rating': initial_rating})
     
     recent_ratings = Rating.objects.filter(movie=movie).select_related('user')[:5]
+    similar_movies = item_similarity.similar_movies(movie, count=SIMILAR_MOVIES)
     
     return render(request, 'movies/movie_detail.html', {
         'movie': movie,
         'form': form,
         'user_rating': user_rating,
-        'recent_ratings': recent_ratings
+        'recent_ratings': recent_ratings,
+        'similar_movies': similar_movies
     })
 
 
@@ -99,18 +125,50 @@ def recommendations(request):
             messages.warning(request, 'Please complete your profile first.')
             return redirect('complete_profile')
         
-        # Sync data to CSV
-        CSVSync.sync_all()
+        # Serve from the precompute_recommendations table when it has rows
+        # for this user; rating anything clears them
+        precomputed = PrecomputedRecommendation.objects.filter(
+            user_id=request.user.profile.c_user_id
+        ).select_related('movie')[:10]
+        recommended_movies = [
+            {
+                'movie_id': rec.movie.movie_id,
+                'title': rec.movie.title,
+                'genre': rec.movie.genre,
+                'year': rec.movie.year,
+                'predicted_rating': rec.predicted_rating,
+                'reason': rec.reason,
+                'movie_obj': rec.movie,
+            }
+            for rec in precomputed
+        ]
+        
+        # Users without ratings go straight to the fallback rankings
+        if not recommended_movies and request.user.profile.ratings_count > 0:
+            # Call recommendation engine, syncing CSV files first if it reads them
+            engine = get_engine()
+            if engine.uses_csv_files:
+                CSVSync.sync_changes()
+            
+            try:
+                recommended_movies = engine.get_recommendations(
+                    request.user.profile.c_user_id,
+                    count=10
+                )
+            except Exception as e:
+                # Report it, but still show the fallback picks below
+                messages.error(request, f'Error generating recommendations: {e}')
+                recommended_movies = []
         
-        # Call C engine
-        engine = CRecommendationEngine()
-        recommended_movies = engine.get_recommendations(
-            request.user.profile.c_user_id,
-            count=10
-        )
+        # No similar users (or no ratings): top movies for their tastes and age
+        is_fallback = not recommended_movies
+        if is_fallback:
+            recommended_movies = fallback.recommend(request.user, count=10)
         
         # Enrich with Django model data
         for rec in recommended_movies:
+            if 'movie_obj' in rec:
+                continue
             try:
                 movie = Movie.objects.get(movie_id=rec['movie_id'])
                 rec['movie_obj'] = movie
@@ -118,7 +176,8 @@ def recommendations(request):
                 pass
         
         return render(request, 'movies/recommendations.html', {
-            'recommendations': recommended_movies
+            'recommendations': recommended_movies,
+            'is_fallback': is_fallback
         })
         
     except Exception as e:
@@ -129,6 +188,32 @@ def recommendations(request):
         })
 
 
+@staff_member_required
+def recommendation_cache_stats(request):
+    """Hit/miss/invalidation counters for sizing the recommendation cache"""
+    return JsonResponse(RecommendationCache().stats())
+
+
+def metrics_allowed(request):
+    """Staff, a scraper with the METRICS_TOKEN bearer token, or a METRICS_ALLOWED_IPS address"""
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip(), token):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_endpoint(request):
+    """Stage timings and per-view latency for a Prometheus scraper (or ?format=json)"""
+    if not metrics_allowed(request):
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse(metrics.snapshot())
+    return HttpResponse(metrics.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def my_ratings(request):
     """Display user's ratings"""
@@ -155,7 +240,8 @@ def register(request):
             profile.save()
             
             # Sync to CSV
-            CSVSync.export_users()
+            if uses_csv_files():
+                CSVSync.sync_changes()
             
             login(request, user)
             messages.success(request, 'Account created successfully!')
@@ -187,7 +273,8 @@ def complete_profile(request):
             profile.c_user_id = (max_id or 100) + 1
             profile.save()
             
-            CSVSync.export_users()
+            if uses_csv_files():
+                CSVSync.sync_changes()
             messages.success(request, 'Profile completed!')
             return redirect('home')
     else:
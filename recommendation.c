@@ -50,53 +50,28 @@ int compare_movie_scores(const void* a, const void* b) {
     return 0;
 }
 
-RecommendationList* generate_recommendations(Graph* graph, HashTable* user_table, 
-                                             HashTable* movie_table, int target_user_id, int top_n) {
-    EdgeNode* target_edges = get_edges(graph, target_user_id);
-    if (target_edges == NULL) {
-        printf("User has no ratings yet.\n");
-        return NULL;
-    }
-    
-    int* watched_movies = (int*)calloc(10000, sizeof(int));
+typedef struct SimilarUser {
+    int user_id;
+    float similarity;
+} SimilarUser;
+
+// Score movies the target has not watched from the neighbours' 3.5+ ratings
+static RecommendationList* score_candidates(Graph* graph, EdgeNode* target_edges,
+                                            SimilarUser* similar_users, int similar_count, int top_n) {
+    // Sized by the target's highest movie id; any larger id is unwatched
+    int max_watched = 0;
     EdgeNode* edge = target_edges;
     while (edge != NULL) {
-        watched_movies[edge->target_id] = 1;
+        if (edge->target_id > max_watched) max_watched = edge->target_id;
         edge = edge->next;
     }
-    
-    typedef struct {
-        int user_id;
-        float similarity;
-    } SimilarUser;
-    
-    SimilarUser* similar_users = (SimilarUser*)malloc(sizeof(SimilarUser) * 1000);
-    int similar_count = 0;
-    
-    for (int i = 0; i < HASH_SIZE; i++) {
-        HashNode* current = user_table->buckets[i];
-        while (current != NULL) {
-            User* user = (User*)current->data;
-            if (user->user_id != target_user_id) {
-                float similarity = calculate_user_similarity(graph, target_user_id, user->user_id);
-                if (similarity > 0.3) {
-                    similar_users[similar_count].user_id = user->user_id;
-                    similar_users[similar_count].similarity = similarity;
-                    similar_count++;
-                }
-            }
-            current = current->next;
-        }
-    }
-    
-    if (similar_count == 0) {
-        printf("No similar users found.\n");
-        free(watched_movies);
-        free(similar_users);
-        return NULL;
+    char* watched_movies = (char*)calloc(max_watched + 1, sizeof(char));
+    for (edge = target_edges; edge != NULL; edge = edge->next) {
+        if (edge->target_id >= 0) watched_movies[edge->target_id] = 1;
     }
     
-    MovieScore* candidate_movies = (MovieScore*)malloc(sizeof(MovieScore) * 1000);
+    int candidate_capacity = 256;
+    MovieScore* candidate_movies = (MovieScore*)malloc(sizeof(MovieScore) * candidate_capacity);
     int candidate_count = 0;
     
     for (int i = 0; i < similar_count; i++) {
@@ -104,7 +79,9 @@ RecommendationList* generate_recommendations(Graph* graph, HashTable* user_table
         EdgeNode* movie_edge = similar_user_edges;
         
         while (movie_edge != NULL) {
-            if (!watched_movies[movie_edge->target_id] && movie_edge->rating >= 3.5) {
+            int movie_id = movie_edge->target_id;
+            int watched = movie_id >= 0 && movie_id <= max_watched && watched_movies[movie_id];
+            if (!watched && movie_edge->rating >= 3.5) {
                 int found = 0;
                 for (int j = 0; j < candidate_count; j++) {
                     if (candidate_movies[j].movie_id == movie_edge->target_id) {
@@ -115,6 +92,11 @@ RecommendationList* generate_recommendations(Graph* graph, HashTable* user_table
                     }
                 }
                 if (!found) {
+                    if (candidate_count == candidate_capacity) {
+                        candidate_capacity *= 2;
+                        candidate_movies = (MovieScore*)realloc(candidate_movies,
+                                                                sizeof(MovieScore) * candidate_capacity);
+                    }
                     candidate_movies[candidate_count].movie_id = movie_edge->target_id;
                     candidate_movies[candidate_count].predicted_rating = 
                         movie_edge->rating * similar_users[i].similarity;
@@ -138,12 +120,280 @@ RecommendationList* generate_recommendations(Graph* graph, HashTable* user_table
     }
     
     free(watched_movies);
-    free(similar_users);
     free(candidate_movies);
     
     return rec_list;
 }
 
+RecommendationList* generate_recommendations(Graph* graph, HashTable* user_table, 
+                                             HashTable* movie_table, int target_user_id, int top_n) {
+    EdgeNode* target_edges = get_edges(graph, target_user_id);
+    if (target_edges == NULL) {
+        fprintf(stderr, "User has no ratings yet.\n");
+        return NULL;
+    }
+    
+    int capacity = 64;
+    SimilarUser* similar_users = (SimilarUser*)malloc(sizeof(SimilarUser) * capacity);
+    int similar_count = 0;
+    
+    for (int i = 0; i < HASH_SIZE; i++) {
+        HashNode* current = user_table->buckets[i];
+        while (current != NULL) {
+            User* user = (User*)current->data;
+            if (user->user_id != target_user_id) {
+                float similarity = calculate_user_similarity(graph, target_user_id, user->user_id);
+                if (similarity > 0.3) {
+                    if (similar_count == capacity) {
+                        capacity *= 2;
+                        similar_users = (SimilarUser*)realloc(similar_users, sizeof(SimilarUser) * capacity);
+                    }
+                    similar_users[similar_count].user_id = user->user_id;
+                    similar_users[similar_count].similarity = similarity;
+                    similar_count++;
+                }
+            }
+            current = current->next;
+        }
+    }
+    
+    if (similar_count == 0) {
+        fprintf(stderr, "No similar users found.\n");
+        free(similar_users);
+        return NULL;
+    }
+    
+    RecommendationList* rec_list = score_candidates(graph, target_edges, similar_users, similar_count, top_n);
+    free(similar_users);
+    return rec_list;
+}
+
+void add_similarity(HashTable* similarity_table, int user_id, int other_id, float similarity) {
+    SimilarityEdge* edge = (SimilarityEdge*)malloc(sizeof(SimilarityEdge));
+    edge->user_id = other_id;
+    edge->similarity = similarity;
+    edge->next = (SimilarityEdge*)hash_search(similarity_table, user_id);
+    hash_insert(similarity_table, user_id, edge);
+}
+
+// Drop a user's list, so rows that follow start it again
+void clear_similarities(HashTable* similarity_table, int user_id) {
+    SimilarityEdge* edge = (SimilarityEdge*)hash_search(similarity_table, user_id);
+    while (edge != NULL) {
+        SimilarityEdge* temp = edge;
+        edge = edge->next;
+        free(temp);
+    }
+    if (hash_search(similarity_table, user_id) != NULL) {
+        hash_insert(similarity_table, user_id, NULL);
+    }
+}
+
+void free_similarities(HashTable* similarity_table) {
+    for (int i = 0; i < HASH_SIZE; i++) {
+        HashNode* current = similarity_table->buckets[i];
+        while (current != NULL) {
+            SimilarityEdge* edge = (SimilarityEdge*)current->data;
+            while (edge != NULL) {
+                SimilarityEdge* temp = edge;
+                edge = edge->next;
+                free(temp);
+            }
+            current = current->next;
+        }
+    }
+    free_hash_table(similarity_table);
+}
+
+// Same as generate_recommendations, but neighbours come from the precomputed
+// top-K neighbour list (already cut to K and the minimum similarity), so only
+// those K users' edges are scanned
+RecommendationList* generate_recommendations_from_store(Graph* graph, HashTable* similarity_table,
+                                                        int target_user_id, int top_n) {
+    EdgeNode* target_edges = get_edges(graph, target_user_id);
+    if (target_edges == NULL) {
+        fprintf(stderr, "User has no ratings yet.\n");
+        return NULL;
+    }
+    
+    int capacity = 64;
+    SimilarUser* similar_users = (SimilarUser*)malloc(sizeof(SimilarUser) * capacity);
+    int similar_count = 0;
+    
+    SimilarityEdge* edge = (SimilarityEdge*)hash_search(similarity_table, target_user_id);
+    while (edge != NULL) {
+        if (similar_count == capacity) {
+            capacity *= 2;
+            similar_users = (SimilarUser*)realloc(similar_users, sizeof(SimilarUser) * capacity);
+        }
+        similar_users[similar_count].user_id = edge->user_id;
+        similar_users[similar_count].similarity = edge->similarity;
+        similar_count++;
+        edge = edge->next;
+    }
+    
+    if (similar_count == 0) {
+        fprintf(stderr, "No similar users found.\n");
+        free(similar_users);
+        return NULL;
+    }
+    
+    RecommendationList* rec_list = score_candidates(graph, target_edges, similar_users, similar_count, top_n);
+    free(similar_users);
+    return rec_list;
+}
+
+// Ties broken by movie id so snapshot results do not depend on qsort order
+static int compare_movie_scores_by_id(const void* a, const void* b) {
+    int order = compare_movie_scores(a, b);
+    if (order != 0) return order;
+    return ((MovieScore*)a)->movie_id - ((MovieScore*)b)->movie_id;
+}
+
+// score_candidates over the snapshot arrays: scores are kept per movie
+// position instead of searching a candidate list
+static RecommendationList* score_snapshot_candidates(const RatingsSnapshot* snapshot, int target_index,
+                                                     SimilarUser* similar_users, int similar_count, int top_n) {
+    int movie_count = (int)snapshot->header->movie_count;
+    char* watched = (char*)calloc(movie_count + 1, sizeof(char));
+    float* scores = (float*)calloc(movie_count + 1, sizeof(float));
+    float* first_rating = (float*)calloc(movie_count + 1, sizeof(float));
+    int* candidates = (int*)malloc(sizeof(int) * (movie_count + 1));
+    int candidate_count = 0;
+
+    for (uint32_t r = snapshot->user_offsets[target_index]; r < snapshot->user_offsets[target_index + 1]; r++) {
+        int m = snapshot_movie_index(snapshot, snapshot->by_user[r].id);
+        if (m >= 0) watched[m] = 1;
+    }
+
+    for (int i = 0; i < similar_count; i++) {
+        int u = snapshot_user_index(snapshot, similar_users[i].user_id);
+        if (u < 0) continue;
+
+        for (uint32_t r = snapshot->user_offsets[u]; r < snapshot->user_offsets[u + 1]; r++) {
+            const RatingRecord* record = &snapshot->by_user[r];
+            if (record->rating < 3.5) continue;
+            int m = snapshot_movie_index(snapshot, record->id);
+            if (m < 0 || watched[m]) continue;
+
+            if (first_rating[m] == 0) {
+                first_rating[m] = record->rating;
+                candidates[candidate_count++] = m;
+            }
+            scores[m] += record->rating * similar_users[i].similarity;
+        }
+    }
+
+    MovieScore* candidate_movies = (MovieScore*)malloc(sizeof(MovieScore) * (candidate_count + 1));
+    for (int i = 0; i < candidate_count; i++) {
+        int m = candidates[i];
+        candidate_movies[i].movie_id = snapshot->movie_ids[m];
+        candidate_movies[i].predicted_rating = scores[m];
+        snprintf(candidate_movies[i].reason, 200, "Similar users rated this %.1f/5", first_rating[m]);
+    }
+    qsort(candidate_movies, candidate_count, sizeof(MovieScore), compare_movie_scores_by_id);
+
+    RecommendationList* rec_list = (RecommendationList*)malloc(sizeof(RecommendationList));
+    rec_list->count = (candidate_count < top_n) ? candidate_count : top_n;
+    rec_list->movies = (MovieScore*)malloc(sizeof(MovieScore) * (rec_list->count + 1));
+    for (int i = 0; i < rec_list->count; i++) {
+        rec_list->movies[i] = candidate_movies[i];
+    }
+
+    free(watched);
+    free(scores);
+    free(first_rating);
+    free(candidates);
+    free(candidate_movies);
+
+    return rec_list;
+}
+
+// Same algorithm as generate_recommendations (or the _from_store variant when
+// similarity_table is given), reading a memory-mapped ratings snapshot.
+// Similarities are accumulated only for users who share a movie with the
+// target, walking the target's movies through the by-movie index.
+RecommendationList* generate_recommendations_from_snapshot(const RatingsSnapshot* snapshot, HashTable* user_table,
+                                                           HashTable* similarity_table, int target_user_id, int top_n) {
+    int target = snapshot_user_index(snapshot, target_user_id);
+    if (target < 0) {
+        fprintf(stderr, "User has no ratings yet.\n");
+        return NULL;
+    }
+
+    int capacity = 64;
+    SimilarUser* similar_users = (SimilarUser*)malloc(sizeof(SimilarUser) * capacity);
+    int similar_count = 0;
+
+    if (similarity_table != NULL) {
+        SimilarityEdge* edge = (SimilarityEdge*)hash_search(similarity_table, target_user_id);
+        while (edge != NULL) {
+            if (similar_count == capacity) {
+                capacity *= 2;
+                similar_users = (SimilarUser*)realloc(similar_users, sizeof(SimilarUser) * capacity);
+            }
+            similar_users[similar_count].user_id = edge->user_id;
+            similar_users[similar_count].similarity = edge->similarity;
+            similar_count++;
+            edge = edge->next;
+        }
+    } else {
+        int user_count = (int)snapshot->header->user_count;
+        float* sum_product = (float*)calloc(user_count, sizeof(float));
+        float* sum1_squared = (float*)calloc(user_count, sizeof(float));
+        float* sum2_squared = (float*)calloc(user_count, sizeof(float));
+
+        for (uint32_t r = snapshot->user_offsets[target]; r < snapshot->user_offsets[target + 1]; r++) {
+            float own = snapshot->by_user[r].rating;
+            int m = snapshot_movie_index(snapshot, snapshot->by_user[r].id);
+            if (m < 0) continue;
+            for (uint32_t k = snapshot->movie_offsets[m]; k < snapshot->movie_offsets[m + 1]; k++) {
+                int u = snapshot_user_index(snapshot, snapshot->by_movie[k].id);
+                if (u < 0 || u == target) continue;
+                float other = snapshot->by_movie[k].rating;
+                sum_product[u] += own * other;
+                sum1_squared[u] += own * own;
+                sum2_squared[u] += other * other;
+            }
+        }
+
+        // Same neighbour order as generate_recommendations: user table order
+        for (int i = 0; i < HASH_SIZE; i++) {
+            HashNode* current = user_table->buckets[i];
+            while (current != NULL) {
+                int u = snapshot_user_index(snapshot, current->key);
+                if (u >= 0 && u != target && sum1_squared[u] > 0 && sum2_squared[u] > 0) {
+                    float similarity = sum_product[u] / (sqrt(sum1_squared[u]) * sqrt(sum2_squared[u]));
+                    if (similarity > 0.3) {
+                        if (similar_count == capacity) {
+                            capacity *= 2;
+                            similar_users = (SimilarUser*)realloc(similar_users, sizeof(SimilarUser) * capacity);
+                        }
+                        similar_users[similar_count].user_id = current->key;
+                        similar_users[similar_count].similarity = similarity;
+                        similar_count++;
+                    }
+                }
+                current = current->next;
+            }
+        }
+
+        free(sum_product);
+        free(sum1_squared);
+        free(sum2_squared);
+    }
+
+    if (similar_count == 0) {
+        fprintf(stderr, "No similar users found.\n");
+        free(similar_users);
+        return NULL;
+    }
+
+    RecommendationList* rec_list = score_snapshot_candidates(snapshot, target, similar_users, similar_count, top_n);
+    free(similar_users);
+    return rec_list;
+}
+
 void print_recommendations(RecommendationList* rec_list, HashTable* movie_table) {
     if (rec_list == NULL || rec_list->count == 0) {
         printf("No recommendations available.\n");
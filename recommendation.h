@@ -3,6 +3,7 @@
 
 #include "hash_table.h"  // Add this line
 #include "graph.h"       // Add this line
+#include "snapshot.h"
 
 typedef struct MovieScore {
     int movie_id;
@@ -15,9 +16,23 @@ typedef struct RecommendationList {
     int count;
 } RecommendationList;
 
+// Precomputed neighbour, chained per user in a similarity HashTable
+typedef struct SimilarityEdge {
+    int user_id;
+    float similarity;
+    struct SimilarityEdge* next;
+} SimilarityEdge;
+
 float calculate_user_similarity(Graph* graph, int user1_id, int user2_id);
 RecommendationList* generate_recommendations(Graph* graph, HashTable* user_table, 
                                              HashTable* movie_table, int target_user_id, int top_n);
+void add_similarity(HashTable* similarity_table, int user_id, int other_id, float similarity);
+void clear_similarities(HashTable* similarity_table, int user_id);
+void free_similarities(HashTable* similarity_table);
+RecommendationList* generate_recommendations_from_store(Graph* graph, HashTable* similarity_table,
+                                                        int target_user_id, int top_n);
+RecommendationList* generate_recommendations_from_snapshot(const RatingsSnapshot* snapshot, HashTable* user_table,
+                                                           HashTable* similarity_table, int target_user_id, int top_n);
 void print_recommendations(RecommendationList* rec_list, HashTable* movie_table);
 void free_recommendations(RecommendationList* rec_list);
 
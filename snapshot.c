@@ -0,0 +1,180 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include "snapshot.h"
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#endif
+
+// Map the whole file read-only; returns 0 on failure
+static int map_file(const char* filename, RatingsSnapshot* snapshot) {
+#ifdef _WIN32
+    HANDLE file = CreateFileA(filename, GENERIC_READ, FILE_SHARE_READ | FILE_SHARE_DELETE, NULL,
+                              OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    if (file == INVALID_HANDLE_VALUE) return 0;
+
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(file, &size) || size.QuadPart == 0) {
+        CloseHandle(file);
+        return 0;
+    }
+
+    HANDLE mapping = CreateFileMappingA(file, NULL, PAGE_READONLY, 0, 0, NULL);
+    if (mapping == NULL) {
+        CloseHandle(file);
+        return 0;
+    }
+
+    void* base = MapViewOfFile(mapping, FILE_MAP_READ, 0, 0, 0);
+    if (base == NULL) {
+        CloseHandle(mapping);
+        CloseHandle(file);
+        return 0;
+    }
+
+    snapshot->base = base;
+    snapshot->length = (size_t)size.QuadPart;
+    snapshot->file_handle = file;
+    snapshot->mapping_handle = mapping;
+    return 1;
+#else
+    int fd = open(filename, O_RDONLY);
+    if (fd < 0) return 0;
+
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+        close(fd);
+        return 0;
+    }
+
+    // Shared mapping: every engine process reads the same page-cache copy
+    void* base = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+    close(fd);
+    if (base == MAP_FAILED) return 0;
+
+    snapshot->base = base;
+    snapshot->length = (size_t)st.st_size;
+    return 1;
+#endif
+}
+
+static void unmap_file(RatingsSnapshot* snapshot) {
+#ifdef _WIN32
+    UnmapViewOfFile(snapshot->base);
+    CloseHandle((HANDLE)snapshot->mapping_handle);
+    CloseHandle((HANDLE)snapshot->file_handle);
+#else
+    munmap(snapshot->base, snapshot->length);
+#endif
+}
+
+// The snapshot is only valid for the exact ratings.csv it was built from
+// (stamped as CSVSync.snapshot_stamp() does)
+static int source_matches(const SnapshotHeader* header, const char* source_filename) {
+    struct stat st;
+    if (stat(source_filename, &st) != 0) return 0;
+#if defined(_WIN32)
+    int64_t mtime = (int64_t)st.st_mtime * 1000000000LL;
+    int64_t inode = 0;
+#elif defined(__APPLE__)
+    int64_t mtime = (int64_t)st.st_mtimespec.tv_sec * 1000000000LL + st.st_mtimespec.tv_nsec;
+    int64_t inode = (int64_t)st.st_ino;
+#else
+    int64_t mtime = (int64_t)st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec;
+    int64_t inode = (int64_t)st.st_ino;
+#endif
+    return header->source_size == (int64_t)st.st_size &&
+           header->source_mtime == mtime &&
+           header->source_inode == inode;
+}
+
+// Map a ratings snapshot. Returns NULL when the file is missing, malformed
+// or older than ratings.csv, so the caller can fall back to parsing the CSV.
+RatingsSnapshot* open_snapshot(const char* filename, const char* source_filename) {
+    RatingsSnapshot* snapshot = (RatingsSnapshot*)calloc(1, sizeof(RatingsSnapshot));
+    if (!map_file(filename, snapshot)) {
+        free(snapshot);
+        return NULL;
+    }
+
+    const SnapshotHeader* header = (const SnapshotHeader*)snapshot->base;
+    if (snapshot->length < sizeof(SnapshotHeader) ||
+        memcmp(header->magic, SNAPSHOT_MAGIC, sizeof(SNAPSHOT_MAGIC)) != 0 ||
+        header->version != SNAPSHOT_VERSION ||
+        header->byte_order != SNAPSHOT_BYTE_ORDER) {
+        fprintf(stderr, "Ignoring invalid ratings snapshot %s\n", filename);
+        close_snapshot(snapshot);
+        return NULL;
+    }
+
+    size_t users = header->user_count;
+    size_t movies = header->movie_count;
+    size_t ratings = header->rating_count;
+    size_t expected = sizeof(SnapshotHeader)
+        + sizeof(int32_t) * users + sizeof(uint32_t) * (users + 1) + sizeof(RatingRecord) * ratings
+        + sizeof(int32_t) * movies + sizeof(uint32_t) * (movies + 1) + sizeof(RatingRecord) * ratings;
+    if (snapshot->length != expected) {
+        fprintf(stderr, "Ignoring truncated ratings snapshot %s\n", filename);
+        close_snapshot(snapshot);
+        return NULL;
+    }
+
+    if (!source_matches(header, source_filename)) {
+        fprintf(stderr, "Ratings snapshot is stale, reading %s\n", source_filename);
+        close_snapshot(snapshot);
+        return NULL;
+    }
+
+    const char* cursor = (const char*)snapshot->base + sizeof(SnapshotHeader);
+    snapshot->header = header;
+    snapshot->user_ids = (const int32_t*)cursor;
+    cursor += sizeof(int32_t) * users;
+    snapshot->user_offsets = (const uint32_t*)cursor;
+    cursor += sizeof(uint32_t) * (users + 1);
+    snapshot->by_user = (const RatingRecord*)cursor;
+    cursor += sizeof(RatingRecord) * ratings;
+    snapshot->movie_ids = (const int32_t*)cursor;
+    cursor += sizeof(int32_t) * movies;
+    snapshot->movie_offsets = (const uint32_t*)cursor;
+    cursor += sizeof(uint32_t) * (movies + 1);
+    snapshot->by_movie = (const RatingRecord*)cursor;
+
+    return snapshot;
+}
+
+void close_snapshot(RatingsSnapshot* snapshot) {
+    if (snapshot == NULL) return;
+    unmap_file(snapshot);
+    free(snapshot);
+}
+
+static int find_id(const int32_t* ids, int count, int id) {
+    int low = 0;
+    int high = count - 1;
+    while (low <= high) {
+        int mid = low + (high - low) / 2;
+        if (ids[mid] == id) return mid;
+        if (ids[mid] < id) {
+            low = mid + 1;
+        } else {
+            high = mid - 1;
+        }
+    }
+    return -1;
+}
+
+// Position of a user in user_ids, or -1 if the user has no ratings
+int snapshot_user_index(const RatingsSnapshot* snapshot, int user_id) {
+    return find_id(snapshot->user_ids, (int)snapshot->header->user_count, user_id);
+}
+
+// Position of a movie in movie_ids, or -1 if the movie has no ratings
+int snapshot_movie_index(const RatingsSnapshot* snapshot, int movie_id) {
+    return find_id(snapshot->movie_ids, (int)snapshot->header->movie_count, movie_id);
+}
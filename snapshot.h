@@ -0,0 +1,61 @@
+#ifndef SNAPSHOT_H
+#define SNAPSHOT_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+// Compiled, memory-mapped form of ratings.csv (written by CSVSync.export_ratings_snapshot).
+//
+// Layout, little-endian, every field 4-byte aligned:
+//   SnapshotHeader
+//   int32_t      user_ids[user_count]          ascending
+//   uint32_t     user_offsets[user_count + 1]  into by_user
+//   RatingRecord by_user[rating_count]         movie_id + rating, sorted by (user, movie)
+//   int32_t      movie_ids[movie_count]        ascending
+//   uint32_t     movie_offsets[movie_count + 1] into by_movie
+//   RatingRecord by_movie[rating_count]        user_id + rating, sorted by (movie, user)
+
+#define SNAPSHOT_MAGIC "MRSNAP1"
+#define SNAPSHOT_VERSION 2
+#define SNAPSHOT_BYTE_ORDER 0x01020304
+
+typedef struct SnapshotHeader {
+    char magic[8];
+    uint32_t version;
+    uint32_t byte_order;
+    uint32_t user_count;
+    uint32_t movie_count;
+    uint32_t rating_count;
+    uint32_t reserved;
+    int64_t source_size;   // ratings.csv size, mtime (nanoseconds) and inode it was
+    int64_t source_mtime;  // built from; a same-size rewrite within a second still
+    int64_t source_inode;  // gets a new inode from the rename. Windows: seconds, no inode
+} SnapshotHeader;
+
+typedef struct RatingRecord {
+    int32_t id;
+    float rating;
+} RatingRecord;
+
+typedef struct RatingsSnapshot {
+    void* base;
+    size_t length;
+    const SnapshotHeader* header;
+    const int32_t* user_ids;
+    const uint32_t* user_offsets;
+    const RatingRecord* by_user;
+    const int32_t* movie_ids;
+    const uint32_t* movie_offsets;
+    const RatingRecord* by_movie;
+#ifdef _WIN32
+    void* file_handle;
+    void* mapping_handle;
+#endif
+} RatingsSnapshot;
+
+RatingsSnapshot* open_snapshot(const char* filename, const char* source_filename);
+void close_snapshot(RatingsSnapshot* snapshot);
+int snapshot_user_index(const RatingsSnapshot* snapshot, int user_id);
+int snapshot_movie_index(const RatingsSnapshot* snapshot, int movie_id);
+
+#endif